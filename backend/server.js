@@ -5,6 +5,8 @@ const rateLimit = require('express-rate-limit');
 const multer = require('multer');
 const path = require('path');
 const fs = require('fs');
+const net = require('net');
+const os = require('os');
 const { spawn } = require('child_process');
 require('dotenv').config();
 
@@ -217,8 +219,10 @@ app.post('/api/extract-pdf', upload.single('pdf'), async (req, res) => {
     const pdfPath = req.file.path;
     console.log(`Processing PDF: ${pdfPath}`);
 
-    // Execute Python script
-    const result = await executePythonScript(pdfPath);
+    // Execute Python script, through the job service when one is configured
+    const result = EXTRACTION_JOBS_PORT
+      ? await extractWithJobService(pdfPath)
+      : await executePythonScript(pdfPath);
     
     // Clean up uploaded file
     fs.unlinkSync(pdfPath);
@@ -240,60 +244,280 @@ app.post('/api/extract-pdf', upload.single('pdf'), async (req, res) => {
   }
 });
 
-// Function to execute Python script
-function executePythonScript(pdfPath) {
-  return new Promise((resolve, reject) => {
-    const pythonProcess = spawn('py', [
+// Pool of persistent Python extractor workers.
+// Each worker keeps one warm UniversalPDFExtractor and answers newline-delimited
+// JSON requests, so uploads no longer pay interpreter and PyMuPDF startup.
+// A worker is handed one job at a time, and only once it has answered a ping,
+// so a job's timeout runs from the moment its worker starts on it. Uploads
+// waiting for a free worker sit in extractionQueue with no timer running. A
+// job that hangs or takes its worker down fails alone; the other workers and
+// the queued uploads carry on.
+const PYTHON_JOB_TIMEOUT_MS = 30000;
+// Exit code of a worker restarting itself after a job overran its timeout
+const WORKER_TIMEOUT_EXIT_CODE = 75;
+const EXTRACTOR_WORKERS = Math.max(1, Number(process.env.EXTRACTOR_WORKERS) || Math.min(os.cpus().length, 4));
+const extractorWorkers = [];
+const extractionQueue = [];
+let nextExtractionJobId = 1;
+
+function failQueuedExtractionJobs(error) {
+  for (const job of extractionQueue.splice(0)) {
+    job.reject(error);
+  }
+}
+
+function removeExtractorWorker(worker, error) {
+  const index = extractorWorkers.indexOf(worker);
+  if (index !== -1) {
+    extractorWorkers.splice(index, 1);
+  }
+  if (worker.job) {
+    clearTimeout(worker.job.timer);
+    worker.job.reject(error);
+    worker.job = null;
+  }
+  dispatchExtractionJobs();
+}
+
+function handleExtractorWorkerLine(worker, line) {
+  let message;
+  try {
+    message = JSON.parse(line);
+  } catch (parseError) {
+    // Library noise that slipped onto stdout; not part of the protocol
+    console.log(`Python worker: ${line}`);
+    return;
+  }
+
+  if (!worker.ready && message.id === worker.readyId) {
+    worker.ready = true;
+    dispatchExtractionJobs();
+    return;
+  }
+
+  const job = worker.job;
+  if (!job || message.id !== job.id) {
+    return;
+  }
+  clearTimeout(job.timer);
+  worker.job = null;
+
+  if (message.ok) {
+    job.resolve(message.result);
+  } else {
+    job.reject(new Error(message.error || 'PDF extraction failed'));
+  }
+  dispatchExtractionJobs();
+}
+
+function spawnExtractorWorker() {
+  const worker = {
+    process: spawn('py', [
       path.join(__dirname, '..', 'universal_pdf_extractor.py'),
-      '--pdf_path', pdfPath,
-      '--verbose'
-    ]);
+      '--worker',
+      '--job_timeout', String(PYTHON_JOB_TIMEOUT_MS / 1000),
+      // Re-uploaded PDFs reuse their extracted text instead of re-parsing
+      '--cache_dir', process.env.PDF_TEXT_CACHE_DIR || path.resolve('uploads', '.text-cache')
+    ]),
+    readyId: `ready-${nextExtractionJobId++}`,
+    ready: false,
+    buffer: '',
+    job: null
+  };
 
-    let output = '';
-    let errorOutput = '';
+  worker.process.stdout.on('data', (data) => {
+    worker.buffer += data.toString();
+    let newlineIndex;
+    while ((newlineIndex = worker.buffer.indexOf('\n')) !== -1) {
+      const line = worker.buffer.slice(0, newlineIndex).trim();
+      worker.buffer = worker.buffer.slice(newlineIndex + 1);
+      if (line) {
+        handleExtractorWorkerLine(worker, line);
+      }
+    }
+  });
 
-    pythonProcess.stdout.on('data', (data) => {
-      output += data.toString();
-    });
+  worker.process.stderr.on('data', (data) => {
+    console.error(`Python worker: ${data.toString().trim()}`);
+  });
 
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
+  // Writes to a worker that has just died are reported by its close handler
+  worker.process.stdin.on('error', () => {});
 
-    pythonProcess.on('close', (code) => {
-      if (code === 0) {
+  worker.process.on('close', (code) => {
+    console.warn(`Python extractor worker exited with code ${code}`);
+    if (code === WORKER_TIMEOUT_EXIT_CODE && worker.job) {
+      // It exits right after answering the job that timed out, so it never read this one
+      clearTimeout(worker.job.timer);
+      extractionQueue.unshift(worker.job);
+      worker.job = null;
+    }
+    if (!worker.ready) {
+      // It died before answering its first ping; a replacement would too
+      failQueuedExtractionJobs(new Error(`Python worker exited with code ${code} during startup`));
+    }
+    removeExtractorWorker(worker, new Error(`Python worker exited with code ${code}`));
+  });
+
+  worker.process.on('error', (error) => {
+    // Every worker runs the same command, so no queued upload can be served either
+    failQueuedExtractionJobs(new Error(`Failed to start Python worker: ${error.message}`));
+    removeExtractorWorker(worker, new Error(`Failed to start Python worker: ${error.message}`));
+  });
+
+  worker.process.stdin.write(JSON.stringify({ id: worker.readyId, cmd: 'ping' }) + '\n');
+  extractorWorkers.push(worker);
+  return worker;
+}
+
+function startExtractionJob(worker, job) {
+  worker.job = job;
+  job.timer = setTimeout(() => {
+    // The worker enforces the same timeout itself; one that has not answered is hung
+    console.error(`Python worker ${worker.process.pid} did not finish ${job.pdfPath}; restarting it`);
+    worker.job = null;
+    job.reject(new Error('Python script timeout'));
+    worker.process.kill();
+    removeExtractorWorker(worker, null);
+  }, PYTHON_JOB_TIMEOUT_MS + 5000);
+
+  worker.process.stdin.write(JSON.stringify({
+    id: job.id,
+    cmd: 'extract',
+    pdf_path: job.pdfPath,
+    timeout: PYTHON_JOB_TIMEOUT_MS / 1000
+  }) + '\n');
+}
+
+function dispatchExtractionJobs() {
+  for (const worker of extractorWorkers) {
+    if (extractionQueue.length === 0) {
+      return;
+    }
+    if (worker.ready && !worker.job) {
+      startExtractionJob(worker, extractionQueue.shift());
+    }
+  }
+
+  // Start workers, up to the pool size, for uploads no starting worker will take
+  let starting = extractorWorkers.filter((worker) => !worker.ready).length;
+  while (extractionQueue.length > starting && extractorWorkers.length < EXTRACTOR_WORKERS) {
+    spawnExtractorWorker();
+    starting++;
+  }
+}
+
+// Function to execute Python script
+function executePythonScript(pdfPath) {
+  return new Promise((resolve, reject) => {
+    extractionQueue.push({ id: String(nextExtractionJobId++), pdfPath, resolve, reject, timer: null });
+    dispatchExtractionJobs();
+  });
+}
+
+// Durable extraction job service (extraction_jobs.py), used instead of the
+// worker above when EXTRACTION_JOBS_PORT is set. Jobs are queued by priority
+// with backpressure, retried when their process dies, survive service restarts,
+// and identical PDFs are answered by the job already extracting them.
+const EXTRACTION_JOBS_HOST = process.env.EXTRACTION_JOBS_HOST || '127.0.0.1';
+const EXTRACTION_JOBS_PORT = process.env.EXTRACTION_JOBS_PORT ? Number(process.env.EXTRACTION_JOBS_PORT) : null;
+const EXTRACTION_JOB_WAIT_MS = Number(process.env.EXTRACTION_JOB_WAIT_MS || 120000);
+const EXTRACTION_JOB_POLL_SECONDS = 20;
+
+function connectToJobService() {
+  return new Promise((resolve, reject) => {
+    const socket = net.connect(EXTRACTION_JOBS_PORT, EXTRACTION_JOBS_HOST);
+    const pending = new Map();
+    let buffer = '';
+    let nextRequestId = 1;
+
+    const failPending = (error) => {
+      for (const request of pending.values()) {
+        request.reject(error);
+      }
+      pending.clear();
+    };
+
+    socket.setEncoding('utf8');
+    socket.on('data', (data) => {
+      buffer += data;
+      let newlineIndex;
+      while ((newlineIndex = buffer.indexOf('\n')) !== -1) {
+        const line = buffer.slice(0, newlineIndex).trim();
+        buffer = buffer.slice(newlineIndex + 1);
+        if (!line) {
+          continue;
+        }
+        let message;
         try {
-          const jsonStart = output.indexOf('JSON_RESULT_START');
-          const jsonEnd = output.indexOf('JSON_RESULT_END');
-          
-          if (jsonStart !== -1 && jsonEnd !== -1) {
-            const jsonString = output.substring(jsonStart + 'JSON_RESULT_START'.length, jsonEnd).trim();
-            const result = JSON.parse(jsonString);
-            resolve(result);
-          } else {
-            console.log('No JSON markers found in Python output, using mock result');
-            resolve(createMockResult(pdfPath));
-          }
+          message = JSON.parse(line);
         } catch (parseError) {
-          console.error('JSON parsing error:', parseError);
-          resolve(createMockResult(pdfPath));
+          console.log(`Extraction job service: ${line}`);
+          continue;
+        }
+        const request = pending.get(message.id);
+        if (request) {
+          pending.delete(message.id);
+          request.resolve(message);
         }
-      } else {
-        reject(new Error(`Python script failed with code ${code}: ${errorOutput}`));
       }
     });
-
-    pythonProcess.on('error', (error) => {
-      reject(new Error(`Failed to start Python script: ${error.message}`));
+    socket.on('error', (error) => {
+      failPending(error);
+      reject(new Error(`Extraction job service unavailable: ${error.message}`));
+    });
+    socket.on('close', () => {
+      failPending(new Error('Extraction job service closed the connection'));
+    });
+    socket.on('connect', () => {
+      resolve({
+        send(request) {
+          return new Promise((resolveRequest, rejectRequest) => {
+            const id = String(nextRequestId++);
+            pending.set(id, { resolve: resolveRequest, reject: rejectRequest });
+            socket.write(JSON.stringify({ ...request, id }) + '\n');
+          });
+        },
+        close() {
+          socket.end();
+        }
+      });
     });
-
-    setTimeout(() => {
-      pythonProcess.kill();
-      reject(new Error('Python script timeout'));
-    }, 30000);
   });
 }
 
+async function extractWithJobService(pdfPath) {
+  const connection = await connectToJobService();
+  try {
+    // The service may run from another directory
+    const submitted = await connection.send({ cmd: 'submit', pdf_path: path.resolve(pdfPath) });
+    if (!submitted.ok) {
+      throw new Error(submitted.error || 'Extraction job was not accepted');
+    }
+
+    const deadline = Date.now() + EXTRACTION_JOB_WAIT_MS;
+    while (Date.now() < deadline) {
+      const reply = await connection.send({
+        cmd: 'wait',
+        job_id: submitted.job_id,
+        timeout: Math.min(EXTRACTION_JOB_POLL_SECONDS, Math.max(1, (deadline - Date.now()) / 1000))
+      });
+      if (!reply.ok) {
+        throw new Error(reply.error || 'Extraction job lookup failed');
+      }
+      if (reply.job.status === 'succeeded') {
+        return reply.job.result;
+      }
+      if (reply.job.status === 'failed') {
+        throw new Error(reply.job.error || 'PDF extraction failed');
+      }
+    }
+    throw new Error('Extraction job timeout');
+  } finally {
+    connection.close();
+  }
+}
+
 // Create mock result for testing
 function createMockResult(pdfPath) {
   const filename = path.basename(pdfPath);
@@ -0,0 +1,472 @@
+"""
+Extraction Benchmark Suite
+
+Times the Universal PDF Extractor stage by stage over the sample POs in the
+repository root plus a reproducible synthetic corpus generated with PyMuPDF.
+Results are written as JSON and can be compared against an earlier run, failing
+when a stage slows down past a threshold.
+
+Usage:
+    python benchmark_extractor.py --synthetic 1000 --output bench.json
+    python benchmark_extractor.py --synthetic 1000 --compare bench.json --threshold 0.15
+"""
+
+import io
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import contextlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+from universal_pdf_extractor import EXTRACTOR_VERSION, UniversalPDFExtractor, _percentile
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+SAMPLE_PDFS = [
+    'HRVPOR2526-0106_Ubidecarenone (CO ENZYME Q 10)_300kgs.pdf',
+    'NHGPOR2526-00024_Sumatriptan succinate EP Grad_2kgs (1).pdf',
+    'PO 001-2025 Voriconazole 10 KG.pdf',
+]
+
+STAGES = ['open', 'text_extraction', 'format_detection', 'template', 'field_extraction',
+          'serialization', 'end_to_end']
+
+SYNTHETIC_LAYOUTS = ['labeled', 'buyer_consignee', 'table', 'hrv_template', 'line_items']
+
+# Stages faster than this are too noisy to flag as regressions
+MIN_COMPARABLE_MS = 0.05
+
+# Fixed metadata keeps generated files byte-identical across runs
+SYNTHETIC_METADATA = {
+    'producer': 'HRV benchmark generator',
+    'creationDate': 'D:20250101000000',
+    'modDate': 'D:20250101000000',
+}
+
+MATERIALS = [
+    'Dapsone USP', 'Simethicone Emulsion USP', 'Sumatriptan succinate EP Grade',
+    'Voriconazole BP', 'Ubidecarenone USP', 'Metformin Hydrochloride IP', 'Paracetamol BP'
+]
+COMPANIES = [
+    'Acme Pharma Pvt Ltd', 'MEDIST FZE', 'Orion Drugs Ltd', 'Vertex Healthcare Inc.',
+    'ION GLOBAL RAW MATERIALS TRADING LLC'
+]
+ANNEX_LINES = [
+    'The supplier shall deliver the goods in sealed, labelled containers.',
+    'Certificate of analysis must accompany every batch.',
+    'Invoices must quote the purchase order number and batch numbers.',
+    'Goods are subject to inspection and approval on receipt.',
+    'Any deviation from the agreed specification must be notified in writing.',
+]
+
+
+def _po_values(rng: random.Random, index: int) -> Dict:
+    quantity = rng.choice([2, 10, 14, 25, 120, 300, 1300])
+    unit_price = round(rng.uniform(5, 15000), 2)
+    return {
+        'po_number': f"SYN-{2500 + index:06d}",
+        'company': rng.choice(COMPANIES),
+        'material': rng.choice(MATERIALS),
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'total': round(quantity * unit_price, 2),
+        'phone': f"+91 {rng.randint(7000000000, 9999999999)}",
+        'date': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025",
+    }
+
+
+def _write_lines(page, lines: List[str], x: float = 50, y: float = 60, size: float = 10):
+    for line in lines:
+        page.insert_text((x, y), line, fontsize=size)
+        y += size * 1.5
+    return y
+
+
+def _draw_labeled(page, values: Dict):
+    _write_lines(page, [
+        'PURCHASE ORDER',
+        f"Purchase Order No: {values['po_number']}",
+        f"Date: {values['date']}",
+        f"Company: {values['company']}",
+        'Address: 12 Industrial Estate, Phase II',
+        f"Tel: {values['phone']}",
+        f"Material: {values['material']}",
+        f"Qty: {values['quantity']} Kg",
+        f"Price: USD {values['unit_price']:.2f}/Kg",
+        f"Total: USD {values['total']:.2f}",
+        'Manufacturer: Synthetic Actives Ltd',
+        'Delivery Term: CIF Nhava Sheva',
+        'Payment Condition: 60 days from invoice',
+    ])
+
+
+def _draw_buyer_consignee(page, values: Dict):
+    _write_lines(page, [
+        'PURCHASE ORDER',
+        f"Purchase Order No: {values['po_number']}",
+        'Buyer and Consignee: MEDIST FZE',
+        'Add: Office 1204, Jebel Ali Free Zone',
+        'Dubai, UAE',
+        f"Direct line: {values['phone']}",
+        f"{values['material']}",
+        f"{values['quantity']}",
+        f"Price: USD {values['unit_price']:.2f}/Kg",
+        f"Total Amount: USD {values['total']:.2f}",
+        'Delivery Term: CPT Dubai',
+    ])
+
+
+def _draw_table(page, values: Dict):
+    y = _write_lines(page, [
+        'PURCHASE ORDER',
+        f"PO Number: {values['po_number']}",
+        f"To: {values['company']}",
+    ])
+    columns = [50, 260, 360, 460]
+    y += 10
+    for x, header in zip(columns, ['Material', 'Quantity', 'Unit price', 'Total']):
+        page.insert_text((x, y), header, fontsize=10)
+    y += 18
+    row = [values['material'], f"{values['quantity']} Kg",
+           f"{values['unit_price']:.2f}", f"{values['total']:.2f}"]
+    for x, cell in zip(columns, row):
+        page.insert_text((x, y), cell, fontsize=10)
+
+
+def _draw_line_items(page, values: Dict, rng: random.Random):
+    """Draw a long item table with some two-line descriptions"""
+    y = _write_lines(page, [
+        'PURCHASE ORDER',
+        f"PO Number: {values['po_number']}",
+    ])
+    columns = [('#', 50), ('Item & Description', 70), ('HSN/SAC', 300), ('Qty', 370),
+               ('Rate', 430), ('Amount', 500)]
+    for header, x in columns:
+        page.insert_text((x, y), header, fontsize=8)
+    y += 16
+    for line_no in range(1, rng.randint(20, 28) + 1):
+        quantity = rng.choice([2, 10, 25, 120])
+        rate = round(rng.uniform(5, 5000), 2)
+        cells = [str(line_no), rng.choice(MATERIALS), '29350090', f"{quantity:.2f}",
+                 f"{rate:,.2f}", f"{quantity * rate:,.2f}"]
+        for (_, x), cell in zip(columns, cells):
+            if x >= 370:
+                # Numbers are right-aligned under their headers
+                x = x + 40 - fitz.get_text_length(cell, fontsize=8)
+            page.insert_text((x, y), cell, fontsize=8)
+        if rng.random() < 0.5:
+            page.insert_text((70, y + 10), 'Batch size 25 kg, COA required', fontsize=8)
+            y += 10
+        y += 12
+    page.insert_text((370, y + 10), 'Sub Total', fontsize=8)
+
+
+def _draw_hrv_template(page, values: Dict, labels: Dict):
+    """Draw the HRV layout with labels at their recorded positions"""
+    # Adjacent labels are drawn as one phrase so the words stay separate
+    for phrase in ['Manufacturer', 'Purchase Order#', 'Date', 'Origin', 'Transaction Currency',
+                   'Item', 'HSN/SAC', 'Qty', 'Rate', 'In words', 'Total', 'Phone:']:
+        box = labels[phrase.split()[0]]
+        page.insert_text((box['x'], box['bottom'] - 1.5), phrase, fontsize=8)
+
+    order, purchase = labels['Order#'], labels['Purchase']
+    header_x = purchase['x']
+    _write_lines(page, [
+        'HRV GLOBAL LIFE SCIENCES PRIVATE LIMITED',
+        '12 Road No. 2, Banjara Hills',
+        'Hyderabad Telangana 500034',
+        'GSTIN 36AADCH6322C1Z0',
+    ], x=header_x, y=80, size=8)
+
+    value_x = order['x1'] + 10
+    page.insert_text((value_x, order['bottom'] - 1.5), values['po_number'], fontsize=8)
+    page.insert_text((value_x, labels['Date']['bottom'] - 1.5), values['date'], fontsize=8)
+    page.insert_text((value_x, labels['Date']['bottom'] + 12), '30 days credit from the date of GRN', fontsize=8)
+    page.insert_text((value_x, labels['Currency']['bottom'] - 1.5), 'INR- Indian Rupee', fontsize=8)
+    page.insert_text((value_x, labels['Currency']['bottom'] + 14), 'FREE DELIVERY TO WAREHOUSE', fontsize=8)
+    page.insert_text((labels['Manufacturer']['x'], labels['Manufacturer']['bottom'] + 10),
+                     values['company'], fontsize=8)
+
+    row_y = labels['Item']['bottom'] + 14
+    page.insert_text((labels['Item']['x'], row_y), values['material'], fontsize=8)
+    page.insert_text((labels['HSN/SAC']['x1'] + 10, row_y), f"{values['quantity']:.2f}", fontsize=8)
+    page.insert_text((labels['Qty']['x1'] + 8, row_y), f"{values['unit_price']:,.2f}", fontsize=8)
+    page.insert_text((labels['Total']['x1'] + 10, labels['Total']['bottom'] - 1.5),
+                     f"{values['total']:,.2f}", fontsize=8)
+    page.insert_text((labels['Phone:']['x1'] + 4, labels['Phone:']['bottom'] - 1), '040-23554992', fontsize=6)
+
+
+def generate_synthetic_corpus(output_dir: str, count: int, seed: int = 7, max_pages: int = 5) -> List[str]:
+    """
+    Write count synthetic PO PDFs to output_dir and return their paths.
+
+    Layouts rotate through SYNTHETIC_LAYOUTS and each document gets 1 to
+    max_pages pages, the extra pages being annex text. The same seed always
+    produces the same files, so an existing corpus with a matching manifest
+    is reused as is.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / 'manifest.json'
+    params = {'count': count, 'seed': seed, 'max_pages': max_pages, 'layouts': SYNTHETIC_LAYOUTS}
+
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        paths = [str(output_dir / name) for name in manifest.get('files', [])]
+        if manifest.get('params') == params and all(Path(path).exists() for path in paths):
+            return paths
+
+    with open(REPO_ROOT / 'pdf_coordinates.json', 'r', encoding='utf-8') as f:
+        hrv_coordinates = json.load(f)
+    hrv_labels = hrv_coordinates['all_text_elements']
+    hrv_size = (hrv_coordinates['page_dimensions']['width'], hrv_coordinates['page_dimensions']['height'])
+
+    rng = random.Random(seed)
+    files = []
+    for index in range(count):
+        layout = SYNTHETIC_LAYOUTS[index % len(SYNTHETIC_LAYOUTS)]
+        values = _po_values(rng, index)
+        page_count = rng.randint(1, max_pages)
+
+        doc = fitz.open()
+        if layout == 'hrv_template':
+            page = doc.new_page(width=hrv_size[0], height=hrv_size[1])
+            _draw_hrv_template(page, values, hrv_labels)
+        elif layout == 'line_items':
+            page = doc.new_page()
+            _draw_line_items(page, values, rng)
+        else:
+            page = doc.new_page()
+            {'labeled': _draw_labeled, 'buyer_consignee': _draw_buyer_consignee,
+             'table': _draw_table}[layout](page, values)
+
+        for annex in range(1, page_count):
+            page = doc.new_page(width=doc[0].rect.width, height=doc[0].rect.height)
+            _write_lines(page, [f"Annex {annex}"] + [rng.choice(ANNEX_LINES) for _ in range(30)])
+
+        doc.set_metadata(SYNTHETIC_METADATA)
+        name = f"synthetic_{index:05d}_{layout}.pdf"
+        doc.save(str(output_dir / name), garbage=3, deflate=True, no_new_id=True)
+        doc.close()
+        files.append(name)
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'params': params, 'files': files}, f, indent=2)
+    return [str(output_dir / name) for name in files]
+
+
+def _elapsed_ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
+
+
+def benchmark_document(extractor: UniversalPDFExtractor, pdf_path: str) -> Dict:
+    """Time each extraction stage of one document separately"""
+    timings = {}
+
+    started = time.perf_counter()
+    doc = fitz.open(pdf_path)
+    timings['open'] = _elapsed_ms(started)
+
+    started = time.perf_counter()
+    pages = [page.get_text() for page in doc]
+    timings['text_extraction'] = _elapsed_ms(started)
+    doc.close()
+
+    text = "".join(page_text + "\n" for page_text in pages)
+    first_page = pages[0] if pages else ""
+
+    started = time.perf_counter()
+    extractor.formats.detect(first_page)
+    timings['format_detection'] = _elapsed_ms(started)
+
+    if extractor.layout_templates:
+        started = time.perf_counter()
+        layout = extractor._first_page_layout(pdf_path)
+        if layout is not None:
+            extractor._extract_with_template(layout)
+        timings['template'] = _elapsed_ms(started)
+
+    fields = {}
+    for field, field_extractor in extractor.field_extractors.items():
+        started = time.perf_counter()
+        field_extractor(text)
+        fields[field] = _elapsed_ms(started)
+    timings['field_extraction'] = sum(fields.values())
+
+    result = extractor.extract_from_text(text, first_page=first_page)
+    started = time.perf_counter()
+    json.dumps(result)
+    timings['serialization'] = _elapsed_ms(started)
+
+    started = time.perf_counter()
+    extractor.extract_from_pdf(pdf_path)
+    timings['end_to_end'] = _elapsed_ms(started)
+
+    return {'stages': timings, 'fields': fields, 'pages': len(pages)}
+
+
+def _summarize(values: List[float]) -> Dict:
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'total_ms': round(sum(values), 3),
+        'mean_ms': round(sum(values) / len(values), 4) if values else None,
+        'p50_ms': round(_percentile(values, 50), 4) if values else None,
+        'p95_ms': round(_percentile(values, 95), 4) if values else None,
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process, where the platform reports it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def run_benchmark(pdf_paths: List[str], repeat: int = 1, use_templates: bool = True) -> Dict:
+    """Benchmark every document repeat times and aggregate the stage timings"""
+    extractor = UniversalPDFExtractor(use_templates=use_templates)
+    stage_samples = {stage: [] for stage in STAGES}
+    field_samples = {field: [] for field in extractor.field_extractors}
+    pages = 0
+
+    started = time.perf_counter()
+    # The extractor prints nothing itself, but keep library chatter out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            for pdf_path in pdf_paths:
+                measured = benchmark_document(extractor, pdf_path)
+                pages += measured['pages']
+                for stage, elapsed in measured['stages'].items():
+                    stage_samples[stage].append(elapsed)
+                for field, elapsed in measured['fields'].items():
+                    field_samples[field].append(elapsed)
+    elapsed = time.perf_counter() - started
+
+    end_to_end_s = sum(stage_samples['end_to_end']) / 1000
+    documents = len(pdf_paths) * repeat
+    return {
+        'stages': {stage: _summarize(samples) for stage, samples in stage_samples.items() if samples},
+        'fields': {field: _summarize(samples) for field, samples in field_samples.items()},
+        'documents': documents,
+        'pages': pages,
+        'wall_s': round(elapsed, 3),
+        'throughput': {
+            'docs_per_sec': round(documents / end_to_end_s, 2) if end_to_end_s else None,
+            'pages_per_sec': round(pages / end_to_end_s, 2) if end_to_end_s else None,
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """List every stage, field or throughput figure that regressed past threshold"""
+    regressions = []
+
+    def check(name: str, before: Optional[float], after: Optional[float]):
+        if before is None or after is None or before < MIN_COMPARABLE_MS:
+            return
+        if after > before * (1 + threshold):
+            regressions.append(f"{name}: p50 {before:.4f} ms -> {after:.4f} ms "
+                               f"(+{(after / before - 1) * 100:.1f}%)")
+
+    for group in ('stages', 'fields'):
+        for name, summary in current['results'].get(group, {}).items():
+            before = baseline['results'].get(group, {}).get(name)
+            if before:
+                check(f"{group}.{name}", before['p50_ms'], summary['p50_ms'])
+
+    before = baseline['results']['throughput'].get('docs_per_sec')
+    after = current['results']['throughput'].get('docs_per_sec')
+    if before and after and after < before / (1 + threshold):
+        regressions.append(f"throughput: {before:.2f} -> {after:.2f} docs/sec")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Universal PDF Extractor")
+    parser.add_argument("--synthetic", type=int, default=200,
+                        help="Number of synthetic POs to generate (0 for repository samples only)")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for the synthetic corpus")
+    parser.add_argument("--max_pages", type=int, default=5, help="Maximum pages per synthetic PO")
+    parser.add_argument("--corpus_dir", type=str, default=str(REPO_ROOT / '.bench-corpus'),
+                        help="Directory for the generated corpus (reused when parameters match)")
+    parser.add_argument("--repeat", type=int, default=1, help="Times to run over the corpus")
+    parser.add_argument("--no_templates", action="store_true", help="Benchmark without coordinate templates")
+    parser.add_argument("--output", type=str, help="Save results as JSON to this path")
+    parser.add_argument("--compare", type=str, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown before a stage counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--generate_only", action="store_true", help="Only generate the synthetic corpus")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    pdf_paths = [str(REPO_ROOT / name) for name in SAMPLE_PDFS if (REPO_ROOT / name).exists()]
+    if args.synthetic:
+        pdf_paths += generate_synthetic_corpus(args.corpus_dir, args.synthetic, args.seed, args.max_pages)
+    if args.generate_only:
+        print(f"Corpus ready: {args.synthetic} synthetic POs in {args.corpus_dir}")
+        return 0
+
+    report = {
+        'meta': {
+            'extractor_version': EXTRACTOR_VERSION,
+            'python': platform.python_version(),
+            'pymupdf': fitz.VersionBind,
+            'platform': platform.platform(),
+            'samples': len(SAMPLE_PDFS),
+            'synthetic': args.synthetic,
+            'seed': args.seed,
+            'max_pages': args.max_pages,
+            'repeat': args.repeat,
+            'templates': not args.no_templates,
+        },
+        'results': run_benchmark(pdf_paths, args.repeat, use_templates=not args.no_templates)
+    }
+
+    results = report['results']
+    print(f"{'Stage':<20} {'p50 ms':>10} {'p95 ms':>10} {'total ms':>12}")
+    for stage, summary in results['stages'].items():
+        print(f"{stage:<20} {summary['p50_ms']:>10.4f} {summary['p95_ms']:>10.4f} {summary['total_ms']:>12.1f}")
+    print(f"Documents: {results['documents']}  Pages: {results['pages']}  "
+          f"Throughput: {results['throughput']['docs_per_sec']} docs/sec  "
+          f"Peak RSS: {results['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.threshold)
+        if regressions:
+            print(f"Regressions past {args.threshold * 100:.0f}%:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions past {args.threshold * 100:.0f}% against {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
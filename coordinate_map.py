@@ -0,0 +1,384 @@
+"""
+Compact Coordinate Maps with a Spatial Index
+
+Builds word-coordinate maps straight from a template PDF, keeping every
+occurrence of every word (the JSON maps keep one box per distinct word, the
+last one read). Maps are stored in a small array-backed binary file: one
+float64 array per box edge, a page array, text ids into a string table, and
+a uniform grid over each page stored in CSR form. "What text is in this
+rectangle" touches only the grid cells the rectangle covers, and "where is
+this label" is a dictionary lookup. The JSON shape consumed by
+pdf_coordinates.json readers can be exported from any map.
+
+    python coordinate_map.py --pdf public/NHG_PO_FORMAT.pdf --output nhg.pcmap --json nhg.json
+    python coordinate_map.py --map nhg.pcmap --find Order# --rect 380 180 600 260
+"""
+
+import sys
+import json
+import struct
+import logging
+import argparse
+from array import array
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PCMAP\0\0\0'
+FORMAT_VERSION = 1
+
+# Header: magic, format version, page count, word count, grid cell size, string table bytes
+HEADER = struct.Struct('<8sHHIfI')
+
+# Grid cell edge in points; most labels span one or two cells
+DEFAULT_CELL_SIZE = 32.0
+
+# Words the JSON export reports under detected_fields when present
+DEFAULT_FIELD_LABELS = (
+    'No.', 'Manufacturer', 'Vendor', 'Date', 'Terms', 'Country', 'Origin', 'Freight',
+    'Forwarder', 'Transaction', 'Currency', 'Delivery', 'Item', 'Description', 'HSN/SAC',
+    'Qty', 'Rate', 'Amount', 'words', 'Total', 'GENERATED', 'NOT',
+)
+
+WORD_SOURCES = ('pymupdf', 'pdfplumber')
+
+Word = namedtuple('Word', 'text x0 y0 x1 y1 page')
+
+
+def _to_bytes(values: array) -> bytes:
+    # The file is little-endian whatever the host byte order
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, data: memoryview, count: int, offset: int) -> Tuple[array, int]:
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+def read_pdf_words(pdf_path: str, source: str = 'pymupdf') -> Tuple[List[Tuple[float, float]], List[Word]]:
+    """
+    Return (page sizes, every word box) of a PDF in reading order.
+
+    pymupdf matches the boxes the extractor sees at runtime; pdfplumber
+    matches the boxes the existing JSON maps were recorded with.
+    """
+    sizes, words = [], []
+    if source == 'pdfplumber':
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_num, page in enumerate(pdf.pages):
+                sizes.append((float(page.width), float(page.height)))
+                for word in page.extract_words():
+                    words.append(Word(word['text'], word['x0'], word['top'], word['x1'], word['bottom'], page_num))
+                page.close()
+    elif source == 'pymupdf':
+        from text_engines import open_pdf
+        doc = open_pdf(pdf_path)
+        try:
+            for page in doc:
+                sizes.append((page.rect.width, page.rect.height))
+                for x0, y0, x1, y1, text, *_ in page.get_text('words'):
+                    words.append(Word(text, x0, y0, x1, y1, page.number))
+        finally:
+            doc.close()
+    else:
+        raise ValueError(f"Unknown word source: {source}")
+    return sizes, words
+
+
+class CoordinateMap:
+    """Every word box of a template, with a per-page grid index"""
+
+    def __init__(self, page_sizes: List[Tuple[float, float]], texts: List[str], text_ids: array,
+                 x0: array, y0: array, x1: array, y1: array, pages: array,
+                 cell_size: float = DEFAULT_CELL_SIZE, grid: Optional[Tuple[array, array]] = None):
+        self.page_sizes = page_sizes
+        self.texts = texts
+        self.text_ids = text_ids
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.pages = pages
+        self.cell_size = cell_size
+
+        # Grid cells of page p start at self.page_cells[p]; columns then rows
+        self.page_cells = []
+        cell_count = 0
+        for width, height in page_sizes:
+            self.page_cells.append(cell_count)
+            cell_count += self._columns(width) * self._rows(height)
+        self.cell_starts, self.cell_words = grid if grid is not None else self._build_grid(cell_count)
+
+        # Label lookups go through text ids, not a scan of the boxes
+        self.occurrences = {}
+        for index, text_id in enumerate(text_ids):
+            self.occurrences.setdefault(texts[text_id], []).append(index)
+
+    @classmethod
+    def from_words(cls, page_sizes: List[Tuple[float, float]], words: Iterable[Word],
+                   cell_size: float = DEFAULT_CELL_SIZE) -> 'CoordinateMap':
+        ids, texts = {}, []
+        text_ids, pages = array('I'), array('H')
+        x0, y0, x1, y1 = array('d'), array('d'), array('d'), array('d')
+        for word in words:
+            if word.text not in ids:
+                ids[word.text] = len(texts)
+                texts.append(word.text)
+            text_ids.append(ids[word.text])
+            x0.append(word.x0)
+            y0.append(word.y0)
+            x1.append(word.x1)
+            y1.append(word.y1)
+            pages.append(word.page)
+        return cls(page_sizes, texts, text_ids, x0, y0, x1, y1, pages, cell_size)
+
+    @classmethod
+    def from_pdf(cls, pdf_path: str, source: str = 'pymupdf',
+                 cell_size: float = DEFAULT_CELL_SIZE) -> 'CoordinateMap':
+        page_sizes, words = read_pdf_words(pdf_path, source)
+        return cls.from_words(page_sizes, words, cell_size)
+
+    @classmethod
+    def from_json_map(cls, coordinates: Dict, cell_size: float = DEFAULT_CELL_SIZE) -> 'CoordinateMap':
+        """Convert a legacy single-page JSON map; only its one box per word survives"""
+        dimensions = coordinates['page_dimensions']
+        words = [
+            Word(text, box['x'], box['y'], box['x1'], box['bottom'], 0)
+            for text, box in coordinates['all_text_elements'].items()
+        ]
+        return cls.from_words([(dimensions['width'], dimensions['height'])], words, cell_size)
+
+    def __len__(self) -> int:
+        return len(self.text_ids)
+
+    def word(self, index: int) -> Word:
+        return Word(self.texts[self.text_ids[index]], self.x0[index], self.y0[index],
+                    self.x1[index], self.y1[index], self.pages[index])
+
+    # Grid
+
+    def _columns(self, width: float) -> int:
+        return max(1, int(width // self.cell_size) + 1)
+
+    def _rows(self, height: float) -> int:
+        return max(1, int(height // self.cell_size) + 1)
+
+    def _cell_range(self, page: int, x0: float, y0: float, x1: float, y1: float):
+        """Yield the grid cell numbers a rectangle covers on a page"""
+        width, height = self.page_sizes[page]
+        columns, rows = self._columns(width), self._rows(height)
+        first_column = min(columns - 1, max(0, int(x0 // self.cell_size)))
+        last_column = min(columns - 1, max(0, int(x1 // self.cell_size)))
+        first_row = min(rows - 1, max(0, int(y0 // self.cell_size)))
+        last_row = min(rows - 1, max(0, int(y1 // self.cell_size)))
+        base = self.page_cells[page]
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                yield base + row * columns + column
+
+    def _build_grid(self, cell_count: int) -> Tuple[array, array]:
+        """Bucket every box into the cells it overlaps, as CSR offset and member arrays"""
+        buckets = [[] for _ in range(cell_count)]
+        for index in range(len(self.text_ids)):
+            for cell in self._cell_range(self.pages[index], self.x0[index], self.y0[index],
+                                         self.x1[index], self.y1[index]):
+                buckets[cell].append(index)
+        starts, members = array('I', [0]), array('I')
+        for bucket in buckets:
+            members.extend(bucket)
+            starts.append(len(members))
+        return starts, members
+
+    # Queries
+
+    def in_rect(self, x0: float, y0: float, x1: float, y1: float, page: int = 0,
+                contained: bool = False) -> List[Word]:
+        """
+        Words overlapping a rectangle, top to bottom and left to right.
+
+        With contained, only words whose centre lies inside it are returned,
+        the rule the layout templates use for field regions.
+        """
+        seen, found = set(), []
+        for cell in self._cell_range(page, x0, y0, x1, y1):
+            for index in self.cell_words[self.cell_starts[cell]:self.cell_starts[cell + 1]]:
+                if index in seen:
+                    continue
+                seen.add(index)
+                if contained:
+                    centre_x = (self.x0[index] + self.x1[index]) / 2
+                    centre_y = (self.y0[index] + self.y1[index]) / 2
+                    hit = x0 <= centre_x <= x1 and y0 <= centre_y <= y1
+                else:
+                    hit = self.x0[index] <= x1 and self.x1[index] >= x0 and \
+                        self.y0[index] <= y1 and self.y1[index] >= y0
+                if hit:
+                    found.append(index)
+        found.sort(key=lambda i: (self.y0[i], self.x0[i]))
+        return [self.word(index) for index in found]
+
+    def find(self, label: str, page: Optional[int] = None) -> List[Word]:
+        """Every occurrence of a word, in reading order"""
+        words = [self.word(index) for index in self.occurrences.get(label, ())]
+        return [word for word in words if page is None or word.page == page]
+
+    def nearest(self, label: str, x: float, y: float, page: int = 0) -> Optional[Word]:
+        """The occurrence of a word whose top-left corner is closest to (x, y)"""
+        candidates = self.find(label, page)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda word: (word.x0 - x) ** 2 + (word.y0 - y) ** 2)
+
+    # Binary format
+
+    def to_bytes(self) -> bytes:
+        encoded = [text.encode('utf-8') for text in self.texts]
+        offsets = array('I', [0])
+        for text in encoded:
+            offsets.append(offsets[-1] + len(text))
+        string_table = b''.join(encoded)
+
+        sizes = array('d', [edge for size in self.page_sizes for edge in size])
+        parts = [
+            HEADER.pack(MAGIC, FORMAT_VERSION, len(self.page_sizes), len(self.text_ids),
+                        self.cell_size, len(string_table)),
+            struct.pack('<I', len(self.texts)),
+            _to_bytes(sizes),
+            _to_bytes(self.x0), _to_bytes(self.y0), _to_bytes(self.x1), _to_bytes(self.y1),
+            _to_bytes(self.pages), _to_bytes(self.text_ids),
+            _to_bytes(offsets), string_table,
+            struct.pack('<I', len(self.cell_words)),
+            _to_bytes(self.cell_starts), _to_bytes(self.cell_words),
+        ]
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CoordinateMap':
+        data = memoryview(data)
+        magic, version, page_count, word_count, cell_size, string_bytes = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a coordinate map file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported coordinate map version: {version}")
+        offset = HEADER.size
+        (text_count,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+
+        sizes, offset = _from_bytes('d', data, page_count * 2, offset)
+        x0, offset = _from_bytes('d', data, word_count, offset)
+        y0, offset = _from_bytes('d', data, word_count, offset)
+        x1, offset = _from_bytes('d', data, word_count, offset)
+        y1, offset = _from_bytes('d', data, word_count, offset)
+        pages, offset = _from_bytes('H', data, word_count, offset)
+        text_ids, offset = _from_bytes('I', data, word_count, offset)
+        text_offsets, offset = _from_bytes('I', data, text_count + 1, offset)
+        string_table = bytes(data[offset:offset + string_bytes])
+        offset += string_bytes
+        texts = [string_table[text_offsets[i]:text_offsets[i + 1]].decode('utf-8') for i in range(text_count)]
+
+        page_sizes = [(sizes[2 * p], sizes[2 * p + 1]) for p in range(page_count)]
+        (member_count,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+        cell_count = sum(max(1, int(w // cell_size) + 1) * max(1, int(h // cell_size) + 1) for w, h in page_sizes)
+        cell_starts, offset = _from_bytes('I', data, cell_count + 1, offset)
+        cell_words, offset = _from_bytes('I', data, member_count, offset)
+        return cls(page_sizes, texts, text_ids, x0, y0, x1, y1, pages, cell_size, (cell_starts, cell_words))
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'CoordinateMap':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    # Legacy JSON
+
+    def to_json_map(self, page: int = 0, field_labels: Iterable[str] = DEFAULT_FIELD_LABELS) -> Dict:
+        """
+        The pdf_coordinates.json shape for one page: one box per distinct word
+        (the last occurrence, as the original maps were recorded) and the
+        positions of the given field labels.
+        """
+        elements = {}
+        for index in range(len(self.text_ids)):
+            if self.pages[index] != page:
+                continue
+            x0, y0, x1, y1 = self.x0[index], self.y0[index], self.x1[index], self.y1[index]
+            elements[self.texts[self.text_ids[index]]] = {
+                'x': round(x0, 2), 'y': round(y0, 2), 'bottom': round(y1, 2), 'x1': round(x1, 2),
+                'width': round(x1 - x0, 2), 'height': round(y1 - y0, 2)
+            }
+        width, height = self.page_sizes[page]
+        return {
+            'page_dimensions': {'width': round(width, 5), 'height': round(height, 5)},
+            'all_text_elements': elements,
+            'detected_fields': {
+                label: {'x': elements[label]['x'], 'y': elements[label]['y']}
+                for label in field_labels if label in elements
+            }
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, query and export compact PDF coordinate maps")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pdf", type=str, help="Template PDF to build the map from")
+    source.add_argument("--map", type=str, help="Binary coordinate map to load")
+    source.add_argument("--from_json", type=str, help="Legacy JSON coordinate map to convert")
+    parser.add_argument("--words", choices=WORD_SOURCES, default="pymupdf",
+                        help="Word boxes to record from --pdf (pdfplumber reproduces the existing JSON maps)")
+    parser.add_argument("--cell_size", type=float, default=DEFAULT_CELL_SIZE, help="Grid cell size in points")
+    parser.add_argument("--output", type=str, help="Write the binary map here")
+    parser.add_argument("--json", type=str, help="Export the JSON map shape here")
+    parser.add_argument("--labels_from", type=str,
+                        help="Report the detected_fields labels of this existing JSON map in the export")
+    parser.add_argument("--page", type=int, default=0, help="Page for queries and the JSON export")
+    parser.add_argument("--find", type=str, action="append", default=[], help="Print every occurrence of a word")
+    parser.add_argument("--rect", type=float, nargs=4, metavar=("X0", "Y0", "X1", "Y1"),
+                        help="Print the words inside a rectangle")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    if args.pdf:
+        coordinate_map = CoordinateMap.from_pdf(args.pdf, args.words, args.cell_size)
+    elif args.map:
+        coordinate_map = CoordinateMap.load(args.map)
+    else:
+        with open(args.from_json, 'r', encoding='utf-8') as f:
+            coordinate_map = CoordinateMap.from_json_map(json.load(f), args.cell_size)
+    logger.info(f"{len(coordinate_map)} word boxes, {len(coordinate_map.texts)} distinct words, "
+                f"{len(coordinate_map.page_sizes)} page(s)")
+
+    if args.output:
+        coordinate_map.save(args.output)
+        logger.info(f"Map saved to: {args.output}")
+
+    if args.json:
+        field_labels = DEFAULT_FIELD_LABELS
+        if args.labels_from:
+            with open(args.labels_from, 'r', encoding='utf-8') as f:
+                field_labels = list(json.load(f).get('detected_fields', {}))
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(coordinate_map.to_json_map(args.page, field_labels), f, indent=2, ensure_ascii=False)
+        logger.info(f"JSON map exported to: {args.json}")
+
+    for label in args.find:
+        for word in coordinate_map.find(label, args.page):
+            print(json.dumps(word._asdict()))
+    if args.rect:
+        for word in coordinate_map.in_rect(*args.rect, page=args.page):
+            print(json.dumps(word._asdict()))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
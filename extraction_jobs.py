@@ -0,0 +1,448 @@
+"""
+Durable Extraction Job Service
+
+Runs PO extractions as background jobs instead of inside the HTTP request.
+Clients submit PDF paths with a priority over newline-delimited JSON on a TCP
+socket and poll or long-poll for the result. Jobs run on a bounded set of
+extraction processes, one job per process at a time, so a job that overruns
+its timeout or kills its process affects no other. A submission of a PDF that
+is already queued, running or extracted under the same extractor version,
+rules and options is answered with that job. Every job's status and result
+are kept in a local SQLite store, so a restarted service picks up where the
+previous one stopped.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from extraction_metrics import ExtractionMetrics
+from extraction_rules import DEFAULT_RULES_PATH, RuleSetError, file_stat, load_rule_set
+from universal_pdf_extractor import (
+    EXTRACTOR_VERSION, FIELD_PATTERNS, _dump_compact, _extract_batch_item, _init_batch_worker
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'extraction_jobs.sqlite3'
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# A job whose process died this many times is failed instead of retried
+MAX_ATTEMPTS = 3
+
+# Seconds a job may run before its process is killed and the job failed
+DEFAULT_JOB_TIMEOUT_SECONDS = 120.0
+
+# Upper bound for a single long-poll request
+MAX_WAIT_SECONDS = 60.0
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    pdf_path TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    elapsed_ms REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_digest ON jobs (digest, status);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority);
+"""
+
+
+def file_digest(pdf_path: str, settings: str = '') -> str:
+    """Content address of a PDF under the current extractor version and the given settings"""
+    digest = hashlib.sha256()
+    digest.update(EXTRACTOR_VERSION.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(settings.encode('utf-8'))
+    digest.update(b'\0')
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class JobStore:
+    """SQLite table holding every job's status and result"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        # Autocommit; each statement is its own short transaction
+        self.connection = sqlite3.connect(db_path, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, pdf_path: str, digest: str, priority: int) -> Dict:
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'pdf_path': pdf_path,
+            'digest': digest,
+            'priority': priority,
+            'status': QUEUED,
+            'attempts': 0,
+            'submitted_at': time.time(),
+        }
+        self.connection.execute(
+            'INSERT INTO jobs (job_id, pdf_path, digest, priority, status, attempts, submitted_at) '
+            'VALUES (:job_id, :pdf_path, :digest, :priority, :status, :attempts, :submitted_at)', job)
+        return job
+
+    def get(self, job_id: str, with_result: bool = True) -> Optional[Dict]:
+        row = self.connection.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return self._to_job(row, with_result) if row else None
+
+    def find_by_digest(self, digest: str, statuses) -> Optional[Dict]:
+        """Most recent job for this content in one of the given statuses"""
+        placeholders = ','.join('?' * len(statuses))
+        row = self.connection.execute(
+            f'SELECT * FROM jobs WHERE digest = ? AND status IN ({placeholders}) '
+            f'ORDER BY submitted_at DESC LIMIT 1', (digest, *statuses)).fetchone()
+        return self._to_job(row, with_result=False) if row else None
+
+    def mark_running(self, job_id: str):
+        self.connection.execute(
+            'UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ? WHERE job_id = ?',
+            (RUNNING, time.time(), job_id))
+
+    def requeue(self, job_id: str):
+        self.connection.execute('UPDATE jobs SET status = ? WHERE job_id = ?', (QUEUED, job_id))
+
+    def finish(self, job_id: str, record: Dict):
+        """Store a batch-style extraction record as the job's outcome"""
+        self.connection.execute(
+            'UPDATE jobs SET status = ?, finished_at = ?, elapsed_ms = ?, result = ?, error = ? WHERE job_id = ?',
+            (SUCCEEDED if record['ok'] else FAILED, time.time(), record.get('elapsed_ms'),
+             json.dumps(record['result'], default=str) if record['ok'] else None,
+             record.get('error'), job_id))
+
+    def recover(self, max_attempts: int = MAX_ATTEMPTS) -> List[Dict]:
+        """
+        Requeue jobs a previous service left running and return every queued
+        job, highest priority first. Jobs that already used up their attempts
+        are failed, so a PDF that kills its process cannot loop forever.
+        """
+        self.connection.execute(
+            'UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE status = ? AND attempts >= ?',
+            (FAILED, time.time(), f'Abandoned after {max_attempts} attempts', RUNNING, max_attempts))
+        self.connection.execute('UPDATE jobs SET status = ? WHERE status = ?', (QUEUED, RUNNING))
+        rows = self.connection.execute(
+            'SELECT * FROM jobs WHERE status = ? ORDER BY priority DESC, submitted_at', (QUEUED,)).fetchall()
+        return [self._to_job(row, with_result=False) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        rows = self.connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row, with_result: bool) -> Dict:
+        job = dict(row)
+        result = job.pop('result')
+        if with_result and result is not None:
+            job['result'] = json.loads(result)
+        return job
+
+
+class QueueFullError(Exception):
+    """Raised when a submission would exceed the pending-job limit"""
+
+
+class JobService:
+    """
+    Priority queue of extraction jobs in front of a bounded set of processes.
+
+    Higher priority values run first; equal priorities run in submission
+    order. Submissions are rejected once max_pending jobs are waiting, so a
+    flood of uploads is pushed back to the client instead of piling up.
+    Each dispatcher runs its jobs in a process of its own, so a crash is
+    charged to the one job that was running in the dead process, and a job
+    past job_timeout has its process killed without touching the others.
+    """
+
+    def __init__(self, store: JobStore, workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, extractor_options: Optional[Dict] = None,
+                 job_timeout: Optional[float] = DEFAULT_JOB_TIMEOUT_SECONDS):
+        self.store = store
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 16
+        self.extractor_options = extractor_options or {}
+        self.job_timeout = job_timeout
+        self.metrics = ExtractionMetrics(FIELD_PATTERNS)
+        self.started = time.monotonic()
+        self.queue = None
+        self.executors = []
+        self.dispatchers = []
+        self._sequence = 0
+        # Completion events for jobs that are queued or running in this process
+        self._done = {}
+        # Rule digests the pool processes extract under, read again when the rule file changes
+        self.rules_path = self.extractor_options.get('rules_path') or DEFAULT_RULES_PATH
+        self._rules_stat = None
+        self._rules_digests = None
+
+    async def start(self):
+        self.queue = asyncio.PriorityQueue()
+        resumed = self.store.recover()
+        for job in resumed:
+            self._enqueue(job)
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} unfinished job(s)")
+        self.executors = [self._new_executor() for _ in range(self.workers)]
+        self.dispatchers = [asyncio.create_task(self._dispatch(slot)) for slot in range(self.workers)]
+
+    async def stop(self):
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        # Jobs cut off here are still marked running and are requeued on the next start
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1, initializer=_init_batch_worker,
+                                   initargs=(self.extractor_options,))
+
+    def _replace_executor(self, slot: int, kill: bool = False):
+        """Start a fresh process for a dispatcher, killing the old one first if it is still running a job"""
+        executor = self.executors[slot]
+        if kill:
+            # The pool has no way to cancel a running call; stop its process instead
+            for process in list(getattr(executor, '_processes', {}).values()):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.executors[slot] = self._new_executor()
+
+    def settings(self) -> str:
+        """The extractor version, rules and options a stored result depends on, as a dedupe key part"""
+        stat = file_stat(self.rules_path)
+        if stat != self._rules_stat:
+            self._rules_stat = stat
+            try:
+                self._rules_digests = load_rule_set(self.rules_path).digests
+            except RuleSetError as e:
+                # The pool processes keep their current rules too
+                logger.error(f"Keeping rule digests for job dedupe: {e}")
+        return json.dumps({'rules': self._rules_digests, 'options': self.extractor_options},
+                          sort_keys=True, default=str)
+
+    def _enqueue(self, job: Dict):
+        self._sequence += 1
+        self._done.setdefault(job['job_id'], asyncio.Event())
+        self.queue.put_nowait((-job['priority'], self._sequence, job['job_id'], job['pdf_path']))
+
+    async def submit(self, pdf_path: str, priority: int = 0) -> Dict:
+        """Queue a PDF, or return the job already handling identical content"""
+        if not Path(pdf_path).is_file():
+            raise FileNotFoundError(f"PDF file does not exist: {pdf_path}")
+        digest = await asyncio.get_running_loop().run_in_executor(None, file_digest, pdf_path, self.settings())
+
+        existing = self.store.find_by_digest(digest, ACTIVE_STATUSES) or \
+            self.store.find_by_digest(digest, (SUCCEEDED,))
+        if existing:
+            return {'job_id': existing['job_id'], 'status': existing['status'], 'deduplicated': True}
+
+        if self.queue.qsize() >= self.max_pending:
+            raise QueueFullError(f"{self.queue.qsize()} jobs pending; retry later")
+
+        job = self.store.add(str(pdf_path), digest, int(priority))
+        self._enqueue(job)
+        return {'job_id': job['job_id'], 'status': QUEUED, 'deduplicated': False}
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Long-poll: return the job once it finishes or the timeout passes"""
+        event = self._done.get(job_id)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(timeout, MAX_WAIT_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+        return self.store.get(job_id)
+
+    async def _dispatch(self, slot: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id, pdf_path = await self.queue.get()
+            self.store.mark_running(job_id)
+            try:
+                record = await asyncio.wait_for(
+                    loop.run_in_executor(self.executors[slot], _extract_batch_item, pdf_path),
+                    timeout=self.job_timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Extraction of {pdf_path} exceeded {self.job_timeout}s; restarting its process")
+                self._replace_executor(slot, kill=True)
+                record = {'ok': False, 'error': f"Extraction timed out after {self.job_timeout}s",
+                          'elapsed_ms': round(self.job_timeout * 1000, 3)}
+            except BrokenProcessPool as e:
+                # This dispatcher's process died mid-job; only this job is charged the attempt
+                logger.error(f"Extraction process died on {pdf_path}: {e}")
+                self._replace_executor(slot)
+                job = self.store.get(job_id, with_result=False)
+                if job['attempts'] < MAX_ATTEMPTS:
+                    self.store.requeue(job_id)
+                    self._enqueue(job)
+                    continue
+                record = {'ok': False, 'error': f"{type(e).__name__}: {e}", 'elapsed_ms': 0.0}
+            finally:
+                self.queue.task_done()
+
+            self.store.finish(job_id, record)
+            self.metrics.observe(record.get('result'), record['elapsed_ms'])
+            event = self._done.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    def stats(self) -> Dict:
+        return {
+            'pid': os.getpid(),
+            'uptime_s': round(time.monotonic() - self.started, 3),
+            'workers': self.workers,
+            'pending': self.queue.qsize(),
+            'max_pending': self.max_pending,
+            'jobs': self.store.counts(),
+        }
+
+
+async def handle_request(service: JobService, request: Dict) -> Dict:
+    """
+    Execute one client command.
+
+    {"cmd": "submit", "pdf_path": "/tmp/po.pdf", "priority": 5}
+    {"cmd": "status", "job_id": "..."}
+    {"cmd": "wait", "job_id": "...", "timeout": 20}
+    {"cmd": "stats"} and {"cmd": "metrics"}
+    """
+    request_id = request.get('id')
+    command = request.get('cmd')
+
+    if command == 'submit':
+        try:
+            submitted = await service.submit(request.get('pdf_path') or '', request.get('priority', 0))
+        except QueueFullError as e:
+            return {'id': request_id, 'ok': False, 'error': str(e), 'retry_after_s': 1}
+        except (OSError, ValueError) as e:
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+        return {'id': request_id, 'ok': True, **submitted}
+
+    if command in ('status', 'wait'):
+        job_id = request.get('job_id')
+        if command == 'wait':
+            job = await service.wait(job_id, float(request.get('timeout') or MAX_WAIT_SECONDS))
+        else:
+            job = service.store.get(job_id)
+        if job is None:
+            return {'id': request_id, 'ok': False, 'error': f"Unknown job: {job_id}"}
+        return {'id': request_id, 'ok': True, 'job': job}
+
+    if command == 'stats':
+        return {'id': request_id, 'ok': True, **service.stats()}
+
+    if command == 'metrics':
+        return {'id': request_id, 'ok': True, 'format': 'prometheus', 'metrics': service.metrics.to_prometheus()}
+
+    return {'id': request_id, 'ok': False, 'error': f"Unknown command: {command}"}
+
+
+async def _serve_client(service: JobService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Answer newline-delimited JSON requests from one connection, one line per response"""
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                response = {'id': None, 'ok': False, 'error': f"Invalid request: {e}"}
+            else:
+                response = await handle_request(service, request)
+            writer.write((_dump_compact(response) + '\n').encode('utf-8'))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(store: JobStore, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, **service_options):
+    service = JobService(store, **service_options)
+    await service.start()
+    server = await asyncio.start_server(lambda r, w: _serve_client(service, r, w), host, port)
+    logger.info(f"Extraction job service listening on {host}:{port} "
+                f"({service.workers} workers, db {store.db_path})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable job service for PO extraction")
+    parser.add_argument("--db", type=str, default=os.environ.get("EXTRACTION_JOBS_DB", DEFAULT_DB_PATH),
+                        help="SQLite file holding job status and results")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--workers", type=int, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--max_pending", type=int,
+                        help="Reject submissions beyond this many queued jobs (default: 16 per worker)")
+    parser.add_argument("--job_timeout", type=float, default=DEFAULT_JOB_TIMEOUT_SECONDS,
+                        help="Seconds a job may run before its process is killed and the job failed "
+                             "(0 for no limit)")
+    parser.add_argument("--cache_dir", type=str, default=os.environ.get("PDF_TEXT_CACHE_DIR"),
+                        help="Directory for the extracted-text cache")
+    parser.add_argument("--line_items", action="store_true",
+                        help="Extract every table line item from word geometry")
+    parser.add_argument("--rules", type=str, default=os.environ.get("PDF_EXTRACTION_RULES"),
+                        help="Extraction rule file, reloaded by the pool processes when it changes")
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    extractor_options = {"cache_dir": args.cache_dir, "line_items": args.line_items, "rules_path": args.rules}
+    store = JobStore(args.db)
+    try:
+        asyncio.run(serve(store, args.host, args.port, workers=args.workers,
+                          max_pending=args.max_pending, extractor_options=extractor_options,
+                          job_timeout=args.job_timeout or None))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
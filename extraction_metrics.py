@@ -0,0 +1,121 @@
+"""
+Extraction Metrics
+
+Aggregates the instrumentation carried in extraction results into counters
+that can be exported in the Prometheus text exposition format. Counters are
+fed from result payloads only, so the worker process and the batch parent
+(which receives results from its pool processes) aggregate the same way.
+"""
+
+from typing import Dict, Optional, Tuple
+
+METRIC_PREFIX = 'po_extractor'
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+class ExtractionMetrics:
+    """Cumulative counters over every observed extraction result"""
+
+    def __init__(self, field_patterns: Optional[Dict[str, Tuple[int, list]]] = None):
+        self.documents = {}
+        self.failures = 0
+        self.latency_seconds = 0.0
+        self.stage_seconds = {}
+        self.field_seconds = {}
+        self.field_unmatched = {}
+        self.pattern_hits = {}
+        self.engine_seconds = {}
+        self.engine_pages = {}
+        self.engine_fallbacks = {}
+        self.near_duplicates = 0
+        self.patterns_skipped = {}
+        # Pre-register every pattern so ones that never fire export as zero
+        for field, (_, patterns) in (field_patterns or {}).items():
+            self.field_unmatched.setdefault(field, 0)
+            for index in range(len(patterns)):
+                self.pattern_hits[(field, index)] = 0
+
+    def observe(self, result: Optional[Dict], elapsed_ms: float = 0.0):
+        """Fold one extraction result (or failure, when result is None) into the counters"""
+        self.latency_seconds += elapsed_ms / 1000
+        if not result or "error" in result:
+            self.failures += 1
+            return
+
+        model_info = result.get("model_info", {})
+        detected_format = model_info.get("detected_format", "unknown")
+        self.documents[detected_format] = self.documents.get(detected_format, 0) + 1
+        if result.get("near_duplicate"):
+            self.near_duplicates += 1
+        for skipped in model_info.get("regex_budget", {}).get("skipped_patterns", []):
+            key = (skipped["field"], skipped["reason"])
+            self.patterns_skipped[key] = self.patterns_skipped.get(key, 0) + 1
+
+        instrumentation = model_info.get("instrumentation")
+        if not instrumentation:
+            return
+        for stage, stage_ms in instrumentation.get("stages_ms", {}).items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + stage_ms / 1000
+        for field, trace in instrumentation.get("patterns", {}).items():
+            self.field_seconds[field] = self.field_seconds.get(field, 0.0) + trace["elapsed_ms"] / 1000
+            if trace["matched_index"] is None:
+                self.field_unmatched[field] = self.field_unmatched.get(field, 0) + 1
+            else:
+                key = (field, trace["matched_index"])
+                self.pattern_hits[key] = self.pattern_hits.get(key, 0) + 1
+
+        text_engines = instrumentation.get("text_engines", {})
+        for engine, usage in text_engines.get("engines", {}).items():
+            self.engine_seconds[engine] = self.engine_seconds.get(engine, 0.0) + usage["ms"] / 1000
+            self.engine_pages[engine] = self.engine_pages.get(engine, 0) + usage["pages"]
+        for reason, count in text_engines.get("fallbacks", {}).items():
+            self.engine_fallbacks[reason] = self.engine_fallbacks.get(reason, 0) + count
+
+    def to_prometheus(self) -> str:
+        """Render the counters in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name: str, help_text: str, samples):
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} counter")
+            for labels, value in samples:
+                lines.append(f"{full_name}{labels} {value}")
+
+        metric("documents_total", "Documents extracted successfully, by detected format",
+               [(_labels(format=fmt), count) for fmt, count in sorted(self.documents.items())])
+        metric("failures_total", "Documents that failed extraction", [("", self.failures)])
+        metric("near_duplicates_total", "Documents answered from the result of an indexed near-duplicate",
+               [("", self.near_duplicates)])
+        metric("latency_seconds_total", "Wall time spent on extraction jobs",
+               [("", round(self.latency_seconds, 6))])
+        metric("stage_seconds_total", "Wall time per extraction stage",
+               [(_labels(stage=stage), round(seconds, 6)) for stage, seconds in sorted(self.stage_seconds.items())])
+        metric("field_seconds_total", "Wall time per field extractor",
+               [(_labels(field=field), round(seconds, 6)) for field, seconds in sorted(self.field_seconds.items())])
+        metric("pattern_hits_total", "Field values produced by each pattern, by priority index",
+               [(_labels(field=field, index=index), count)
+                for (field, index), count in sorted(self.pattern_hits.items())])
+        metric("field_unmatched_total", "Field extractions where no pattern produced a value",
+               [(_labels(field=field), count) for field, count in sorted(self.field_unmatched.items())])
+        metric("patterns_skipped_total", "Pattern searches abandoned over a time limit, by limit",
+               [(_labels(field=field, reason=reason), count)
+                for (field, reason), count in sorted(self.patterns_skipped.items())])
+        metric("text_engine_seconds_total", "Wall time per page text engine",
+               [(_labels(engine=engine), round(seconds, 6)) for engine, seconds in sorted(self.engine_seconds.items())])
+        metric("text_engine_pages_total", "Pages read per page text engine",
+               [(_labels(engine=engine), count) for engine, count in sorted(self.engine_pages.items())])
+        metric("text_engine_fallbacks_total", "Pages re-read with the fallback engine, by failed quality check",
+               [(_labels(reason=reason), count) for reason, count in sorted(self.engine_fallbacks.items())])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
@@ -0,0 +1,184 @@
+"""
+Extraction Rule Sets
+
+The field patterns of the Universal PDF Extractor live in a versioned JSON
+file, extraction_rules.json, so supporting a new supplier layout is a rule
+edit that running workers pick up without a redeploy. Each field lists its
+regex flags and its rules in priority order. A rule is a pattern, with an
+optional fixed value reported whenever it matches (known issuers, one-off
+table values) and an optional note. Fields marked "labeled" are reported
+verbatim from the first group of their first match, and only when found.
+
+Each field also gets a digest of its flags and rules. Results record the
+digests they were extracted under, so after a rule change only the fields
+whose digest differs have to be extracted again.
+
+Usage:
+    python extraction_rules.py
+    python extraction_rules.py new_rules.json --against extraction_rules.json
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parent / 'extraction_rules.json'
+
+# Regex flags a field may name
+FLAGS = {
+    'IGNORECASE': re.IGNORECASE,
+    'MULTILINE': re.MULTILINE,
+    'DOTALL': re.DOTALL,
+}
+
+# Hex characters kept from each field's SHA-256 digest
+DIGEST_LENGTH = 12
+
+
+class RuleSetError(ValueError):
+    """A rule file that cannot be loaded, parsed or compiled"""
+
+
+def _field_digest(flags: List[str], labeled: bool, rules: List[Tuple[str, Optional[str]]]) -> str:
+    # Notes are left out: rewording one is not a rule change
+    canonical = json.dumps({'flags': sorted(flags), 'labeled': labeled, 'rules': rules}, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:DIGEST_LENGTH]
+
+
+class RuleSet:
+    """The fields of one rule file, in the shape the extractor compiles"""
+
+    def __init__(self, document: Dict, path: Optional[str] = None,
+                 file_stat: Optional[Tuple[int, int]] = None):
+        self.path = path
+        # (mtime_ns, size) of the file when it was read, to notice later edits
+        self.file_stat = file_stat
+        if not isinstance(document, dict) or not isinstance(document.get('fields'), dict):
+            raise RuleSetError("a rule file is an object with a \"fields\" object")
+        self.version = str(document.get('version', ''))
+        if not self.version:
+            raise RuleSetError("the rule file has no version")
+
+        # field -> (regex flags, patterns), the same shape as FIELD_PATTERNS
+        self.field_patterns: Dict[str, Tuple[int, List[str]]] = {}
+        # field -> fixed value per pattern, None where the match itself is read
+        self.values: Dict[str, List[Optional[str]]] = {}
+        self.labeled_fields: List[str] = []
+        self.digests: Dict[str, str] = {}
+        for field, spec in document['fields'].items():
+            self._add_field(field, spec)
+
+    def _add_field(self, field: str, spec: Dict):
+        if not isinstance(spec, dict) or not isinstance(spec.get('rules'), list) or not spec['rules']:
+            raise RuleSetError(f"{field}: a field needs a non-empty \"rules\" list")
+        flag_names = spec.get('flags', [])
+        unknown = [name for name in flag_names if name not in FLAGS]
+        if unknown:
+            raise RuleSetError(f"{field}: unknown flag(s) {', '.join(map(str, unknown))}")
+
+        rules = []
+        for index, rule in enumerate(spec['rules']):
+            if isinstance(rule, str):
+                rule = {'pattern': rule}
+            if not isinstance(rule, dict) or not isinstance(rule.get('pattern'), str):
+                raise RuleSetError(f"{field} rule {index}: a rule is a pattern string or has a \"pattern\"")
+            value = rule.get('value')
+            if value is not None and not isinstance(value, str):
+                raise RuleSetError(f"{field} rule {index}: a fixed value is a string")
+            rules.append((rule['pattern'], value))
+
+        flags = 0
+        for name in flag_names:
+            flags |= FLAGS[name]
+        labeled = bool(spec.get('labeled', False))
+        self.field_patterns[field] = (flags, [pattern for pattern, _ in rules])
+        self.values[field] = [value for _, value in rules]
+        if labeled:
+            self.labeled_fields.append(field)
+        self.digests[field] = _field_digest(flag_names, labeled, rules)
+
+    def require(self, fields: Sequence[str]):
+        """Fail unless every given field has rules"""
+        missing = [field for field in fields if field not in self.field_patterns]
+        if missing:
+            raise RuleSetError(f"no rules for {', '.join(missing)}")
+
+    def compile_all(self) -> Dict[str, list]:
+        """Compile every pattern, failing with all the patterns that do not compile"""
+        import regex
+        compiled, errors = {}, []
+        for field, (flags, patterns) in self.field_patterns.items():
+            compiled[field] = []
+            for index, pattern in enumerate(patterns):
+                try:
+                    compiled[field].append(regex.compile(pattern, flags))
+                except regex.error as e:
+                    errors.append(f"{field} rule {index}: {e}")
+        if errors:
+            raise RuleSetError("; ".join(errors))
+        return compiled
+
+    def changed_fields(self, digests: Dict[str, str]) -> List[str]:
+        """Fields whose rules differ from the given digests, including fields added or removed since"""
+        fields = list(self.digests) + [field for field in digests if field not in self.digests]
+        return [field for field in fields if self.digests.get(field) != digests.get(field)]
+
+    def describe(self) -> Dict:
+        """The block recorded in each result's model_info"""
+        return {'version': self.version, 'digests': dict(self.digests)}
+
+
+def load_rule_set(path=DEFAULT_RULES_PATH) -> RuleSet:
+    """Read and parse a rule file; patterns are compiled by their users"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            stat = os.fstat(f.fileno())
+            document = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuleSetError(f"cannot read rules from {path}: {e}") from e
+    return RuleSet(document, str(path), (stat.st_mtime_ns, stat.st_size))
+
+
+def file_stat(path) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a rule file, or None if it cannot be read"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate an extraction rule file and list changed fields")
+    parser.add_argument("rules", nargs="?", default=str(DEFAULT_RULES_PATH),
+                        help="Rule file to check (default: the shipped extraction_rules.json)")
+    parser.add_argument("--against", type=str, help="Earlier rule file to compare field digests with")
+    args = parser.parse_args()
+
+    try:
+        rules = load_rule_set(args.rules)
+        rules.compile_all()
+        previous = load_rule_set(args.against) if args.against else None
+    except RuleSetError as e:
+        print(f"Invalid: {e}")
+        return 1
+
+    pattern_count = sum(len(patterns) for _, patterns in rules.field_patterns.values())
+    print(f"{args.rules}: version {rules.version}, {len(rules.digests)} fields, {pattern_count} patterns")
+    if previous is not None:
+        changed = rules.changed_fields(previous.digests)
+        print(f"Changed since version {previous.version}: {', '.join(changed) if changed else 'none'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
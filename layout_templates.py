@@ -0,0 +1,275 @@
+"""
+Coordinate Templates for Known Purchase Order Layouts
+
+Reads the fields of our own HRV and NHG purchase orders straight from their
+page regions, using the word boxes recorded in pdf_coordinates.json and
+nhg_pdf_coordinates.json. Each field region is defined relative to label words
+from those maps; the labels are located on the actual page first, so regions
+follow the layout when blocks above them grow or shrink. Documents that do not
+match a template are left to the regex pipeline.
+"""
+
+import re
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(__file__).resolve().parent
+
+# Page sizes must match the recorded template size within this many points
+PAGE_SIZE_TOLERANCE = 2.0
+
+# Fingerprint labels sit in a fixed label column; other anchors may drift
+LABEL_COLUMN_TOLERANCE = 3.0
+ANCHOR_SEARCH_RADIUS = 80.0
+
+# Words whose centre lies on the same line within this many points are joined
+LINE_TOLERANCE = 3.0
+
+PAGE_RIGHT = ('page', 'width', 0)
+PAGE_TOP = ('page', 'top', 0)
+
+
+def _row(label: str, parse: str = 'text') -> Dict:
+    """Region to the right of a label, on the label's own row"""
+    return {
+        'x0': (label, 'x1', 2), 'y0': (label, 'y', -2),
+        'x1': PAGE_RIGHT, 'y1': (label, 'bottom', 2),
+        'parse': parse
+    }
+
+
+def _region(x0, y0, x1, y1, parse: str = 'text') -> Dict:
+    return {'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1, 'parse': parse}
+
+
+# Field regions of our PO layout. Edges are (word, edge, offset) references into
+# the layout's coordinate file, where edge is one of x, y, x1 or bottom.
+PO_FIELDS = {
+    'PO_NUMBER': _row('Order#'),
+    'PO_ISSUER_NAME': _region(('Purchase', 'x', -2), PAGE_TOP, PAGE_RIGHT, ('Order#', 'y', -2), 'issuer_name'),
+    'PO_ISSUER_ADDRESS': _region(('Purchase', 'x', -2), PAGE_TOP, PAGE_RIGHT, ('Order#', 'y', -2), 'issuer_address'),
+    'GSTIN': _region(('Purchase', 'x', -2), PAGE_TOP, PAGE_RIGHT, ('Order#', 'y', -2), 'gstin'),
+    'CONTACT_NUMBER': _row('Phone:', 'phone'),
+    'MATERIAL': _region(('Item', 'x', -2), ('Item', 'bottom', 2), ('HSN/SAC', 'x', -2), ('words', 'y', -2), 'first_line'),
+    'QUANTITY': _region(('HSN/SAC', 'x1', 2), ('Item', 'bottom', 2), ('Qty', 'x1', 2), ('words', 'y', -2), 'int'),
+    'UNIT_PRICE': _region(('Qty', 'x1', 2), ('Item', 'bottom', 2), ('Rate', 'x1', 2), ('words', 'y', -2), 'amount'),
+    'TOTAL_AMOUNT': _row('Total', 'amount'),
+    'CURRENCY': _row('Currency', 'currency'),
+    'MANUFACTURER': _region(('Manufacturer', 'x', -2), ('Manufacturer', 'bottom', 1), ('Purchase', 'x', -4), ('Manufacturer', 'bottom', 17)),
+    'DELIVERY_TERMS': _region(('Order#', 'x1', 2), ('Currency', 'bottom', 1), PAGE_RIGHT, ('Item', 'y', -1)),
+    'PAYMENT_TERMS': _region(('Order#', 'x1', 2), ('Date', 'bottom', 1), PAGE_RIGHT, ('Origin', 'y', -1)),
+    'ORDER_DATE': _row('Date'),
+}
+
+# HRV and NHG orders come from the same generator, and may share a page size, so
+# a match is named after the issuer whose letterhead it carries (see format_for)
+LAYOUT_SPECS = {
+    'hrv_po': {
+        'coordinates_file': 'pdf_coordinates.json',
+        'issuer': 'HRV',
+        'anchor': 'Order#',
+        'fingerprint': ['Purchase', 'Order#', 'Date', 'Transaction', 'Currency'],
+        'fields': PO_FIELDS
+    },
+    'nhg_po': {
+        'coordinates_file': 'nhg_pdf_coordinates.json',
+        'issuer': 'NHG',
+        'anchor': 'Order#',
+        'fingerprint': ['Purchase', 'Order#', 'Date', 'Transaction', 'Currency'],
+        'fields': PO_FIELDS
+    }
+}
+
+COMPANY_SUFFIX = re.compile(r'(LIMITED|LTD\.?|LLC|FZE|INC\.?)$', re.IGNORECASE)
+GSTIN_LINE = re.compile(r'GSTI?N\s*:?\s*([0-9A-Z]{15})', re.IGNORECASE)
+NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+PHONE = re.compile(r'\+?\d[\d\s\-/]{5,}\d')
+CURRENCY_CODE = re.compile(r'^([A-Z]{3})\b')
+
+
+def _group_lines(words: List[Tuple]) -> List[str]:
+    """Join word boxes into text lines, top to bottom and left to right"""
+    lines = []
+    for word in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        centre = (word[1] + word[3]) / 2
+        if lines and abs(lines[-1][0] - centre) <= LINE_TOLERANCE:
+            lines[-1][1].append(word)
+        else:
+            lines.append([centre, [word]])
+    return [' '.join(w[4] for w in sorted(line_words, key=lambda w: w[0])) for _, line_words in lines]
+
+
+def _split_issuer_block(lines: List[str]) -> Tuple[Optional[str], List[str], Optional[str]]:
+    """Split the letterhead into company name, address lines and GSTIN"""
+    gstin = None
+    remaining = []
+    for line in lines:
+        match = GSTIN_LINE.search(line)
+        if match:
+            gstin = match.group(1)
+        else:
+            remaining.append(line)
+
+    if not remaining:
+        return None, [], gstin
+
+    # The company name runs until the line that ends with its legal suffix
+    name_end = 1
+    for index, line in enumerate(remaining):
+        if COMPANY_SUFFIX.search(line.strip()):
+            name_end = index + 1
+            break
+    name = ' '.join(remaining[:name_end])
+    return name, remaining[name_end:], gstin
+
+
+def _parse_value(kind: str, lines: List[str]):
+    """Convert the text lines of a region into a field value"""
+    text = ' '.join(line.strip() for line in lines if line.strip())
+    if not text:
+        return None
+
+    if kind == 'text':
+        return text
+    if kind == 'first_line':
+        return next(line.strip() for line in lines if line.strip())
+    if kind in ('issuer_name', 'issuer_address', 'gstin'):
+        name, address, gstin = _split_issuer_block(lines)
+        if kind == 'issuer_name':
+            return name
+        if kind == 'issuer_address':
+            return '\n'.join(address) or None
+        return gstin
+    if kind == 'int':
+        match = NUMBER.search(text)
+        return int(float(match.group(0).replace(',', ''))) if match else None
+    if kind == 'amount':
+        match = NUMBER.search(text)
+        return match.group(0).replace(',', '') if match else None
+    if kind == 'currency':
+        match = CURRENCY_CODE.search(text.upper())
+        return match.group(1) if match else None
+    if kind == 'phone':
+        match = PHONE.search(text)
+        return match.group(0).strip() if match else None
+    raise ValueError(f"Unknown template value kind: {kind}")
+
+
+class LayoutTemplate:
+    """A known PO layout with field regions anchored on its label words"""
+
+    def __init__(self, name: str, spec: Dict, coordinates: Dict):
+        self.name = name
+        self.issuer = spec['issuer']
+        self.anchor = spec['anchor']
+        self.fingerprint = spec['fingerprint']
+        self.fields = spec['fields']
+        self.page_width = coordinates['page_dimensions']['width']
+        self.page_height = coordinates['page_dimensions']['height']
+
+        # Keep only the recorded boxes this template actually references
+        elements = coordinates['all_text_elements']
+        referenced = set(self.fingerprint) | {self.anchor}
+        for region in self.fields.values():
+            for edge in ('x0', 'y0', 'x1', 'y1'):
+                ref = region[edge]
+                if ref[0] != 'page':
+                    referenced.add(ref[0])
+        missing = sorted(word for word in referenced if word not in elements)
+        if missing:
+            raise ValueError(f"Template {name} references words missing from its coordinate map: {missing}")
+        self.labels = {word: elements[word] for word in referenced}
+
+    def matches_page_size(self, width: float, height: float) -> bool:
+        return (abs(width - self.page_width) <= PAGE_SIZE_TOLERANCE and
+                abs(height - self.page_height) <= PAGE_SIZE_TOLERANCE)
+
+    def _locate(self, word: str, words_by_text: Dict, x_tolerance: float, dy_hint: float) -> Optional[Tuple]:
+        """Find the page word closest to where the template expects a label"""
+        expected = self.labels[word]
+        best = None
+        best_distance = None
+        for candidate in words_by_text.get(word, ()):
+            dx = abs(candidate[0] - expected['x'])
+            if dx > x_tolerance:
+                continue
+            distance = dx + abs(candidate[1] - (expected['y'] + dy_hint))
+            if best is None or distance < best_distance:
+                best, best_distance = candidate, distance
+        return best
+
+    def extract(self, words: List[Tuple], page_width: float) -> Optional[Dict]:
+        """
+        Read every template field from its region.
+
+        Returns None when the page does not carry this layout's label column.
+        """
+        words_by_text = {}
+        for word in words:
+            words_by_text.setdefault(word[4], []).append(word)
+
+        anchor = self._locate(self.anchor, words_by_text, LABEL_COLUMN_TOLERANCE, 0.0)
+        if anchor is None:
+            return None
+        dy_hint = anchor[1] - self.labels[self.anchor]['y']
+
+        located = {}
+        for word in self.fingerprint:
+            found = self._locate(word, words_by_text, LABEL_COLUMN_TOLERANCE, dy_hint)
+            if found is None:
+                return None
+            located[word] = found
+
+        for word in self.labels:
+            if word not in located:
+                located[word] = self._locate(word, words_by_text, ANCHOR_SEARCH_RADIUS, dy_hint)
+
+        def resolve(ref) -> Optional[float]:
+            label, edge, offset = ref
+            if label == 'page':
+                return (page_width if edge == 'width' else 0.0) + offset
+            box = located.get(label)
+            if box is None:
+                return None
+            return {'x': box[0], 'y': box[1], 'x1': box[2], 'bottom': box[3]}[edge] + offset
+
+        entities = {}
+        for field, region in self.fields.items():
+            x0, y0, x1, y1 = (resolve(region[edge]) for edge in ('x0', 'y0', 'x1', 'y1'))
+            if None in (x0, y0, x1, y1):
+                entities[field] = None
+                continue
+            inside = [
+                word for word in words
+                if x0 <= (word[0] + word[2]) / 2 <= x1 and y0 <= (word[1] + word[3]) / 2 <= y1
+            ]
+            entities[field] = _parse_value(region['parse'], _group_lines(inside))
+        return entities
+
+
+def format_for(templates: List[LayoutTemplate], matched: LayoutTemplate, entities: Dict) -> str:
+    """Name of the layout whose issuer heads the extracted letterhead, else of the template that matched"""
+    issuer_name = entities.get('PO_ISSUER_NAME') or ''
+    first_word = issuer_name.split()[0].upper() if issuer_name.split() else None
+    for template in templates:
+        if template.issuer.upper() == first_word:
+            return template.name
+    return matched.name
+
+
+def load_layout_templates(template_dir: Path = TEMPLATE_DIR) -> List[LayoutTemplate]:
+    """Build every layout template whose coordinate file is available"""
+    templates = []
+    for name, spec in LAYOUT_SPECS.items():
+        path = Path(template_dir) / spec['coordinates_file']
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                coordinates = json.load(f)
+            templates.append(LayoutTemplate(name, spec, coordinates))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Layout template {name} unavailable: {e}")
+    return templates
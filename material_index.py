@@ -0,0 +1,195 @@
+"""
+Material Index over the HRV Global Items Master
+
+Resolves extracted material names to rows of "HRV GLobal Items Master file.csv"
+with a character-trigram inverted index and Dice-coefficient ranking. The
+built index is saved as JSON next to the CSV together with the CSV's hash, so
+a process start loads it in a few milliseconds and an edited CSV triggers a
+rebuild on the next load. The saved file is plain data: one that cannot be
+read, or does not have the expected shape, is rebuilt like a stale one.
+"""
+
+import os
+import re
+import csv
+import json
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from itertools import chain
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MASTER_CSV = Path(__file__).resolve().parent / 'HRV GLobal Items Master file.csv'
+
+# Bump when the index layout or normalization changes
+INDEX_VERSION = 2
+
+# Matches scoring below this are reported as unresolved
+DEFAULT_MIN_SCORE = 0.45
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def _normalize(text: str) -> str:
+    return NON_ALNUM.sub(' ', text.casefold()).strip()
+
+
+def _trigrams(text: str) -> set:
+    """Character trigrams of the normalized text, padded so short words still count"""
+    padded = f"  {_normalize(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class MaterialIndex:
+    """Trigram inverted index over item names in the items master"""
+
+    def __init__(self, items: List[Dict], csv_digest: str, postings: Optional[Dict[str, List[int]]] = None,
+                 sizes: Optional[List[int]] = None):
+        self.items = items
+        self.csv_digest = csv_digest
+        if postings is not None and sizes is not None:
+            self.postings, self.sizes = postings, sizes
+            return
+        self.postings = {}
+        self.sizes = []
+        for item_number, item in enumerate(items):
+            grams = _trigrams(item['item_name'])
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(item_number)
+
+    def to_dict(self) -> Dict:
+        return {'version': INDEX_VERSION, 'csv_digest': self.csv_digest, 'items': self.items,
+                'postings': self.postings, 'sizes': self.sizes}
+
+    @classmethod
+    def from_dict(cls, stored: Dict, csv_digest: str) -> Optional['MaterialIndex']:
+        """The index saved by to_dict, or None if it is for another version or CSV"""
+        if stored.get('version') != INDEX_VERSION or stored.get('csv_digest') != csv_digest:
+            return None
+        items, postings, sizes = stored['items'], stored['postings'], stored['sizes']
+        if len(sizes) != len(items) or any(
+                not 0 <= number < len(items) for numbers in postings.values() for number in numbers):
+            raise ValueError("saved material index is inconsistent")
+        return cls(items, csv_digest, postings, sizes)
+
+    @classmethod
+    def from_csv(cls, csv_path: Path, csv_digest: str) -> 'MaterialIndex':
+        items = []
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                name = (row.get('Item Name') or '').strip()
+                if not name:
+                    continue
+                items.append({
+                    'item_id': row.get('Item ID'),
+                    'item_name': name,
+                    'sku': row.get('SKU'),
+                    'hsn_sac': row.get('HSN/SAC') or None,
+                    'vendor': row.get('Vendor') or None,
+                    'intra_state_tax_rate': row.get('Intra State Tax Rate') or None,
+                    'inter_state_tax_rate': row.get('Inter State Tax Rate') or None,
+                })
+        return cls(items, csv_digest)
+
+    def resolve(self, material: str, vendor: Optional[str] = None,
+                min_score: float = DEFAULT_MIN_SCORE) -> Optional[Dict]:
+        """
+        Return the best master row for a material name, or None below min_score.
+
+        Rows with the same name score equally; the one whose vendor best
+        matches the given vendor (e.g. the extracted manufacturer) wins.
+        """
+        query = _trigrams(material)
+        if not query:
+            return None
+
+        postings = self.postings
+        shared = Counter(chain.from_iterable(postings[gram] for gram in query if gram in postings))
+        if not shared:
+            return None
+
+        query_size = len(query)
+        scored = [
+            (2 * count / (query_size + self.sizes[item_number]), item_number)
+            for item_number, count in shared.items()
+        ]
+        best_score = max(score for score, _ in scored)
+        if best_score < min_score:
+            return None
+
+        candidates = [item_number for score, item_number in scored if score == best_score]
+        if vendor and len(candidates) > 1:
+            vendor_grams = _trigrams(vendor)
+            candidates.sort(key=lambda n: -_dice(vendor_grams, _trigrams(self.items[n]['vendor'] or '')))
+        else:
+            candidates.sort()
+
+        match = dict(self.items[candidates[0]])
+        match['score'] = round(best_score, 4)
+        return match
+
+
+def _file_digest(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def default_index_path(csv_path: Path) -> Path:
+    return csv_path.with_name(f".{csv_path.stem}.index.json")
+
+
+def load_material_index(csv_path: Optional[str] = None,
+                        index_path: Optional[str] = None) -> Optional[MaterialIndex]:
+    """
+    Load the serialized index, rebuilding it when missing or stale.
+
+    Returns None when the items master itself is not available.
+    """
+    csv_path = Path(csv_path) if csv_path else DEFAULT_MASTER_CSV
+    index_path = Path(index_path) if index_path else default_index_path(csv_path)
+
+    try:
+        csv_digest = _file_digest(csv_path)
+    except OSError as e:
+        logger.warning(f"Items master unavailable, material resolution disabled: {e}")
+        return None
+
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = MaterialIndex.from_dict(json.load(f), csv_digest)
+        if index is not None:
+            return index
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring unreadable material index {index_path}: {e}")
+
+    logger.info(f"Building material index from {csv_path.name}")
+    index = MaterialIndex.from_csv(csv_path, csv_digest)
+
+    # Written atomically so concurrent workers never read a partial index
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=index_path.parent, prefix='.tmp-', suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logger.warning(f"Could not save material index to {index_path}: {e}")
+        if tmp_path:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    return index
@@ -0,0 +1,254 @@
+"""
+Near-Duplicate PO Detection
+
+Suppliers re-send the same PO with a new scan timestamp or an edited date
+line; the bytes differ, so content-hash caches miss. This module signs the
+extracted text with a one-permutation MinHash over word shingles and keeps
+the signatures in a local SQLite LSH index (16 bands of 8 rows), so a
+document whose shingle sets overlap a known one by about the threshold or
+more is found with a few indexed lookups. The earlier text and extraction
+result are stored alongside, so the extractor can return that result with
+only the fields around changed lines re-extracted, and flag the document as
+a likely duplicate order. The index keeps at most DEFAULT_MAX_DOCUMENTS
+documents, none older than DEFAULT_MAX_AGE_DAYS; older ones are pruned as
+new ones are added.
+"""
+
+import re
+import json
+import time
+import zlib
+import difflib
+import hashlib
+import logging
+import sqlite3
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Consecutive words per shingle
+SHINGLE_SIZE = 3
+
+# Signature bins (a power of two); split into LSH_BANDS bands of SIGNATURE_BINS // LSH_BANDS rows
+SIGNATURE_BINS = 128
+BIN_BITS = 7
+LSH_BANDS = 16
+
+# Estimated shingle-set similarity at or above which documents are near-duplicates
+DEFAULT_THRESHOLD = 0.9
+
+# Retention: newest documents kept, and the age after which a document is dropped
+DEFAULT_MAX_DOCUMENTS = 20000
+DEFAULT_MAX_AGE_DAYS = 90.0
+
+# Documents added between retention passes
+PRUNE_INTERVAL = 100
+
+WORD = re.compile(r'\w+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id INTEGER PRIMARY KEY,
+    version TEXT NOT NULL,
+    source TEXT,
+    signature BLOB NOT NULL,
+    text BLOB NOT NULL,
+    result TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket);
+CREATE INDEX IF NOT EXISTS bands_doc ON bands (doc_id);
+CREATE INDEX IF NOT EXISTS documents_added ON documents (added_at);
+"""
+
+
+def shingle_hashes(text: str) -> set:
+    """32-bit hashes of the overlapping word shingles of the case-folded text"""
+    words = WORD.findall(text.casefold())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [' '.join(words)] if words else []
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return {
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+        for shingle in shingles
+    }
+
+
+def minhash_signature(text: str) -> Optional[Tuple[int, ...]]:
+    """
+    One-permutation MinHash signature of a text, or None when it has no words.
+
+    The low bits of each shingle hash pick a bin and each bin keeps its
+    smallest remaining bits, so the text is hashed once rather than once per
+    permutation. An empty bin borrows the value of the next filled bin,
+    tagged with the distance it was borrowed from, so two texts only agree
+    on it when they agree on the bin it came from.
+    """
+    hashes = shingle_hashes(text)
+    if not hashes:
+        return None
+    bins = [None] * SIGNATURE_BINS
+    for value in hashes:
+        index, rank = value & (SIGNATURE_BINS - 1), value >> BIN_BITS
+        if bins[index] is None or rank < bins[index]:
+            bins[index] = rank
+
+    signature = []
+    rank_bits = 32 - BIN_BITS
+    for index in range(SIGNATURE_BINS):
+        distance = 0
+        while bins[(index + distance) % SIGNATURE_BINS] is None:
+            distance += 1
+        signature.append((distance << rank_bits) | bins[(index + distance) % SIGNATURE_BINS])
+    return tuple(signature)
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _band_buckets(signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+    rows = len(signature) // LSH_BANDS
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows_bytes = array('I', signature[band * rows:(band + 1) * rows]).tobytes()
+        bucket = int.from_bytes(hashlib.blake2b(rows_bytes, digest_size=8).digest(), 'little', signed=True)
+        buckets.append((band, bucket))
+    return buckets
+
+
+class NearDuplicateIndex:
+    """
+    SQLite-backed LSH index of MinHash signatures, with the text and
+    extraction result of each indexed document. Documents indexed under
+    another version (extractor release or text engine policy) never match.
+    At most max_documents documents are kept, none older than max_age_days;
+    either limit is off when None.
+    """
+
+    def __init__(self, db_path: str, threshold: float = DEFAULT_THRESHOLD, version: str = '',
+                 max_documents: Optional[int] = DEFAULT_MAX_DOCUMENTS,
+                 max_age_days: Optional[float] = DEFAULT_MAX_AGE_DAYS):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.version = version
+        self.max_documents = max_documents
+        self.max_age_days = max_age_days
+        # Worker mode builds the index on the main thread and extracts on an executor thread
+        self.connection = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self._added_since_prune = 0
+        self.prune()
+
+    def close(self):
+        self.connection.close()
+
+    def find(self, signature: Tuple[int, ...]) -> Optional[Dict]:
+        """Return the most similar stored document at or above the threshold"""
+        buckets = _band_buckets(signature)
+        clauses = ' OR '.join(['(band = ? AND bucket = ?)'] * len(buckets))
+        params = [value for bucket in buckets for value in bucket]
+        candidates = [row[0] for row in self.connection.execute(
+            f'SELECT DISTINCT doc_id FROM bands WHERE {clauses}', params)]
+        if not candidates:
+            return None
+
+        best, best_score = None, self.threshold
+        placeholders = ','.join('?' * len(candidates))
+        for row in self.connection.execute(
+                f'SELECT doc_id, source, signature, text, result FROM documents '
+                f'WHERE version = ? AND doc_id IN ({placeholders})', [self.version] + candidates):
+            stored = array('I')
+            stored.frombytes(row[2])
+            score = similarity(signature, tuple(stored))
+            # Ties go to the earliest document, the one the others duplicate
+            if score > best_score or (score == best_score and (best is None or row[0] < best[0])):
+                best, best_score = row, score
+        if best is None:
+            return None
+        return {
+            'doc_id': best[0],
+            'source': best[1],
+            'similarity': round(best_score, 4),
+            'text': zlib.decompress(best[3]).decode('utf-8'),
+            'result': json.loads(best[4]),
+        }
+
+    def add(self, signature: Tuple[int, ...], source: Optional[str], text: str, result: Dict) -> int:
+        """Store a document's signature, text and extraction result"""
+        with self.connection:
+            self.connection.execute('BEGIN')
+            cursor = self.connection.execute(
+                'INSERT INTO documents (version, source, signature, text, result, added_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (self.version, source, array('I', signature).tobytes(), zlib.compress(text.encode('utf-8')),
+                 json.dumps(result, default=str), time.time()))
+            doc_id = cursor.lastrowid
+            self.connection.executemany(
+                'INSERT INTO bands (band, bucket, doc_id) VALUES (?, ?, ?)',
+                [(band, bucket, doc_id) for band, bucket in _band_buckets(signature)])
+        self._added_since_prune += 1
+        if self._added_since_prune >= PRUNE_INTERVAL:
+            self.prune()
+        return doc_id
+
+    def prune(self) -> int:
+        """Drop documents past the age limit or beyond the newest max_documents, with their bands"""
+        self._added_since_prune = 0
+        with self.connection:
+            self.connection.execute('BEGIN')
+            doc_ids = []
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                doc_ids += [row[0] for row in self.connection.execute(
+                    'SELECT doc_id FROM documents WHERE added_at < ?', (cutoff,))]
+            if self.max_documents is not None:
+                doc_ids += [row[0] for row in self.connection.execute(
+                    'SELECT doc_id FROM documents ORDER BY doc_id DESC LIMIT -1 OFFSET ?', (self.max_documents,))]
+            doc_ids = sorted(set(doc_ids))
+            self.connection.executemany('DELETE FROM bands WHERE doc_id = ?', [(doc_id,) for doc_id in doc_ids])
+            self.connection.executemany('DELETE FROM documents WHERE doc_id = ?', [(doc_id,) for doc_id in doc_ids])
+        if doc_ids:
+            logger.info(f"Pruned {len(doc_ids)} document(s) from the near-duplicate index")
+        return len(doc_ids)
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+
+def changed_lines(previous_text: str, text: str) -> Tuple[List[str], List[str]]:
+    """
+    Lines of the previous text that were removed or replaced, and the new
+    lines around every change. Each changed block of new lines is widened by
+    one unchanged line on either side, so a label on the line above a
+    changed value is seen together with it.
+    """
+    previous_lines = previous_text.splitlines()
+    lines = text.splitlines()
+    removed, added = [], []
+    matcher = difflib.SequenceMatcher(None, previous_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        removed.extend(previous_lines[i1:i2])
+        added.extend(lines[max(j1 - 1, 0):j2 + 1])
+    return removed, added
+
+
+def diff_fields(previous: Dict, current: Dict) -> Dict[str, Dict]:
+    """Fields whose values differ, as {field: {"previous": ..., "current": ...}}"""
+    return {
+        field: {'previous': previous.get(field), 'current': current.get(field)}
+        for field in sorted(set(previous) | set(current))
+        if previous.get(field) != current.get(field)
+    }
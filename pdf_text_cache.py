@@ -0,0 +1,158 @@
+"""
+Content-Addressed PDF Text Cache
+
+Stores the per-page text extracted from a PDF on disk, keyed by a hash of the
+PDF bytes and the extractor version, so repeat extractions of the same file
+skip PyMuPDF entirely. An entry may also hold the size and word boxes of the
+first page, which coordinate templates are matched on. The cache is bounded by
+total size and evicts the least recently used entries first. Entries are
+written atomically, so several worker processes can share one cache directory.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default size cap for the whole cache directory
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+ENTRY_SUFFIX = '.json'
+
+
+class PDFTextCache:
+    """Size-bounded LRU cache of extracted page text on disk"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, version: str = '1'):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Running estimate of the directory size; None until first scanned
+        self._approx_bytes = None
+        # The last entry read, so the layout and page lookups of one document read it once
+        self._last = (None, None)
+
+    def key_for(self, pdf_bytes: bytes) -> str:
+        """Content address for a PDF under the current extractor version"""
+        digest = hashlib.sha256()
+        digest.update(self.version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(pdf_bytes)
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        # Shard by the first two hex digits to keep directories small
+        return self.cache_dir / key[:2] / (key + ENTRY_SUFFIX)
+
+    def _read(self, key: str) -> Optional[Dict]:
+        if self._last[0] == key:
+            return self._last[1]
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path, None)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        if entry.get('version') != self.version:
+            return None
+        self._last = (key, entry)
+        return entry
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return cached page texts for a key, or None on a miss"""
+        entry = self._read(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry['pages']
+
+    def get_layout(self, key: str) -> Optional[Dict]:
+        """Return the stored first-page layout for a key, or None; not counted as a lookup"""
+        entry = self._read(key)
+        return entry.get('layout') if entry is not None else None
+
+    def put(self, key: str, pages: List[str], layout: Optional[Dict] = None):
+        """Atomically store page texts, and the first-page layout if given, then enforce the size cap"""
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        entry = {'version': self.version, 'pages': pages}
+        if layout is not None:
+            entry['layout'] = layout
+        self._last = (key, entry)
+        payload = json.dumps(entry, separators=(',', ':'))
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-', suffix=ENTRY_SUFFIX)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write text cache entry {key}: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        if self._approx_bytes is None:
+            self._approx_bytes = self._scan_size()
+        else:
+            self._approx_bytes += len(payload)
+
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def _iter_entries(self):
+        for shard in self.cache_dir.iterdir():
+            if not shard.is_dir():
+                continue
+            for path in shard.iterdir():
+                if path.suffix == ENTRY_SUFFIX and not path.name.startswith('.tmp-'):
+                    try:
+                        stat = path.stat()
+                    except FileNotFoundError:
+                        # Evicted concurrently by another worker
+                        continue
+                    yield path, stat
+
+    def _scan_size(self) -> int:
+        return sum(stat.st_size for _, stat in self._iter_entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its cap"""
+        entries = sorted(self._iter_entries(), key=lambda entry: entry[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+
+        for path, stat in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
+
+        self._approx_bytes = total
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
@@ -3,52 +3,136 @@ Standalone PDF Text Extractor
 Reads a Purchase Order PDF and extracts all text content.
 """
 
+import io
 import sys
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from text_engines import ENGINE_POLICIES, EngineTimings, build_page_reader
 
-def extract_text_from_pdf(pdf_path):
+# Pages handed to a pool process at a time in parallel mode
+DEFAULT_CHUNK_PAGES = 8
+
+# Page reader owned by each pool process, built once by the initializer
+_page_reader = None
+
+
+def print_engine_timings(timings, file=None):
+    """Print pages read and time spent per text engine"""
+    usage = timings.to_dict()
+    for engine, stats in usage['engines'].items():
+        print(f"{engine}: {stats['pages']} page(s) in {stats['ms']:.1f} ms", file=file)
+    for reason, count in usage['fallbacks'].items():
+        print(f"Fallback ({reason}): {count} page(s)", file=file)
+
+
+def _init_page_worker(engine):
+    global _page_reader
+    _page_reader = build_page_reader(engine)
+
+
+def _read_page_range(pdf_path, start, stop):
+    """Read pages start..stop inside a pool process"""
+    timings = EngineTimings()
+    pages = [(page_index, page_text)
+             for page_index, _, page_text in _page_reader.iter_pages(pdf_path, timings, start, stop)]
+    return pages, timings
+
+
+def iter_pages_parallel(pdf_path, engine, page_count, workers, chunk_pages=DEFAULT_CHUNK_PAGES, timings=None):
     """
-    Extract text from a PDF file.
-    
+    Yield (page_index, page_count, page_text) in page order while a process pool reads
+    page ranges ahead. At most two ranges per worker are in flight, so memory
+    stays bounded however long the document is.
+    """
+    timings = timings if timings is not None else EngineTimings()
+    ranges = ((start, min(start + chunk_pages, page_count)) for start in range(0, page_count, chunk_pages))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker,
+                             initargs=(engine,)) as executor:
+        in_flight = deque()
+
+        def next_range():
+            # Ranges were submitted in page order, so the oldest one is next in the output
+            pages, range_timings = in_flight.popleft().result()
+            timings.merge(range_timings)
+            return ((page_index, page_count, page_text) for page_index, page_text in pages)
+
+        for start, stop in ranges:
+            if len(in_flight) >= workers * 2:
+                yield from next_range()
+            in_flight.append(executor.submit(_read_page_range, pdf_path, start, stop))
+
+        while in_flight:
+            yield from next_range()
+
+
+def write_text_from_pdf(pdf_path, output, engine='auto', workers=1,
+                        chunk_pages=DEFAULT_CHUNK_PAGES, progress=True, status=None):
+    """
+    Extract text from a PDF file, writing each page to output as soon as it
+    and every page before it are read.
+
     Args:
         pdf_path (str): Path to the PDF file
-        
-    Returns:
-        str: Extracted text content from the PDF
+        output: Text stream the extracted content is written to
+        engine (str): Text engine policy: 'auto' reads with PyMuPDF and
+            re-reads badly extracted pages with pdfplumber; 'pymupdf' or
+            'pdfplumber' use that engine for every page
+        workers (int): Processes reading page ranges in parallel; 1 reads
+            the pages in this process
+        chunk_pages (int): Pages per range handed to a worker process
+        progress (bool): Print a line per page
+        status: Stream for progress and timing messages (default: stdout)
     """
     try:
-        import pdfplumber
-        
-        text_content = []
-        
-        with pdfplumber.open(pdf_path) as pdf:
-            print(f"Processing PDF: {pdf_path}")
-            print(f"Total pages: {len(pdf.pages)}\n")
-            
-            for page_num, page in enumerate(pdf.pages, start=1):
-                print(f"Extracting text from page {page_num}...")
-                page_text = page.extract_text()
-                
-                if page_text:
-                    text_content.append(f"\n--- Page {page_num} ---\n")
-                    text_content.append(page_text)
-                else:
-                    text_content.append(f"\n--- Page {page_num} (No text found) ---\n")
-        
-        return "\n".join(text_content)
-        
+        reader = build_page_reader(engine)
+        timings = EngineTimings()
+
+        print(f"Processing PDF: {pdf_path}", file=status)
+        if workers > 1:
+            pages = iter_pages_parallel(pdf_path, engine, reader.page_count(pdf_path), workers,
+                                        chunk_pages, timings)
+        else:
+            pages = reader.iter_pages(pdf_path, timings)
+
+        first_piece = True
+
+        def write_piece(piece):
+            nonlocal first_piece
+            if not first_piece:
+                output.write("\n")
+            output.write(piece)
+            first_piece = False
+
+        for page_index, page_count, page_text in pages:
+            page_num = page_index + 1
+            if page_num == 1:
+                print(f"Total pages: {page_count}\n", file=status)
+            if progress:
+                print(f"Extracting text from page {page_num}...", file=status)
+
+            if page_text:
+                write_piece(f"\n--- Page {page_num} ---\n")
+                write_piece(page_text)
+            else:
+                write_piece(f"\n--- Page {page_num} (No text found) ---\n")
+
+        print(f"\nText engines ({reader.name}):", file=status)
+        print_engine_timings(timings, file=status)
+
     except ImportError as e:
-        print("Error: pdfplumber library is not installed.")
+        print(f"Error: the {engine} text engine is not installed.")
         print(f"Import error details: {str(e)}")
         print(f"\nPython executable: {sys.executable}")
         print(f"Python version: {sys.version}")
         print(f"\nTo fix this issue:")
         print(f"1. Make sure you're using the same Python interpreter where pdfplumber is installed")
-        print(f"2. Install pdfplumber using: {sys.executable} -m pip install pdfplumber")
-        print(f"3. Or if using pip directly: pip install pdfplumber")
-        print(f"\nTo verify installation, run: {sys.executable} -m pip show pdfplumber")
+        print(f"2. Install the engines using: {sys.executable} -m pip install -r requirements_pdf_extractor.txt")
+        print(f"3. Or if using pip directly: pip install pdfplumber PyMuPDF")
+        print(f"\nTo verify installation, run: {sys.executable} -m pip show pdfplumber PyMuPDF")
         sys.exit(1)
     except FileNotFoundError:
         print(f"Error: File not found: {pdf_path}")
@@ -58,6 +142,23 @@ def extract_text_from_pdf(pdf_path):
         sys.exit(1)
 
 
+def extract_text_from_pdf(pdf_path, engine='auto', workers=1):
+    """
+    Extract text from a PDF file.
+
+    Args:
+        pdf_path (str): Path to the PDF file
+        engine (str): Text engine policy, see write_text_from_pdf
+        workers (int): Processes reading page ranges in parallel
+
+    Returns:
+        str: Extracted text content from the PDF
+    """
+    output = io.StringIO()
+    write_text_from_pdf(pdf_path, output, engine, workers)
+    return output.getvalue()
+
+
 def main():
     """Main function to handle command line arguments and execute text extraction."""
     parser = argparse.ArgumentParser(
@@ -73,41 +174,67 @@ def main():
         type=str,
         help="Output file path to save extracted text (optional)"
     )
-    
+    parser.add_argument(
+        "--engine",
+        choices=ENGINE_POLICIES,
+        default="auto",
+        help="Text engine: PyMuPDF with per-page pdfplumber fallback (auto), or one engine for every page"
+    )
+    parser.add_argument(
+        "-j", "--workers",
+        type=int,
+        default=1,
+        help="Processes reading page ranges in parallel (default: 1)"
+    )
+    parser.add_argument(
+        "--chunk_pages",
+        type=int,
+        default=DEFAULT_CHUNK_PAGES,
+        help=f"Pages per range handed to a worker process (default: {DEFAULT_CHUNK_PAGES})"
+    )
+    parser.add_argument(
+        "-y", "--yes",
+        action="store_true",
+        help="Process files without a .pdf extension without asking"
+    )
+
     args = parser.parse_args()
-    
+
     # Validate PDF file exists
     pdf_path = Path(args.pdf_path)
     if not pdf_path.exists():
         print(f"Error: PDF file not found: {pdf_path}")
         sys.exit(1)
-    
+
     if not pdf_path.suffix.lower() == '.pdf':
         print(f"Warning: File does not have .pdf extension: {pdf_path}")
-        response = input("Continue anyway? (y/n): ")
-        if response.lower() != 'y':
-            sys.exit(1)
-    
-    # Extract text from PDF
-    extracted_text = extract_text_from_pdf(str(pdf_path))
-    
+        # Only ask when someone can answer; scripts and pipes continue
+        if not args.yes and sys.stdin.isatty():
+            response = input("Continue anyway? (y/n): ")
+            if response.lower() != 'y':
+                sys.exit(1)
+
+    workers = max(1, args.workers)
+    chunk_pages = max(1, args.chunk_pages)
+
     # Output results
     if args.output:
-        # Save to file
+        # Stream to file
         output_path = Path(args.output)
         output_path.parent.mkdir(parents=True, exist_ok=True)
         with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(extracted_text)
+            write_text_from_pdf(str(pdf_path), f, args.engine, workers, chunk_pages)
         print(f"\nText extracted successfully and saved to: {output_path}")
     else:
-        # Print to console
+        # Stream to console, keeping status messages out of the text
         print("\n" + "="*80)
         print("EXTRACTED TEXT CONTENT")
         print("="*80)
-        print(extracted_text)
+        write_text_from_pdf(str(pdf_path), sys.stdout, args.engine, workers, chunk_pages,
+                            progress=False, status=sys.stderr)
+        print()
         print("="*80)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,148 @@
+"""
+Merged PO Segmentation
+
+Purchasing often forwards one PDF holding many POs. This module finds where
+each PO starts from a cheap fingerprint of every page: only the text in the
+top band of the page is read, and searched for a labeled PO number, a
+"Page 1 of N" marker and a purchase order title. Pages the size of one of
+our own layouts are also tried against its coordinate template, whose
+label column puts the PO number away from its label. A page starts a new
+segment when it carries a different PO number than the pages before it, or
+restarts the page count; repeated headers on continuation pages keep their
+segment. Each segment can be cut into a PDF of its own and extracted like
+any single PO.
+"""
+
+import re
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from text_engines import PDFSource, import_pymupdf, open_pdf
+
+logger = logging.getLogger(__name__)
+
+# Share of the page height, from the top, read for the fingerprint
+HEADER_FRACTION = 0.3
+
+# Labeled PO numbers only; bare digit runs also match phone numbers and totals
+PO_NUMBER_LABELS = [
+    re.compile(r'V/Rio/SIM/([^\n\s]+)'),
+    re.compile(r'(?:Purchase\s*Order|\bP\.?\s?O\.?)\s*(?:No\.?|Number|#)\s*[:.]?\s*'
+               r'((?=[A-Z\-/]*\d)[A-Z0-9][A-Z0-9\-/]{2,})', re.IGNORECASE),
+]
+PAGE_ONE = re.compile(r'\bPage\s*1\s*(?:of|/)\s*\d+', re.IGNORECASE)
+PO_TITLE = re.compile(r'\bPurchase\s+Order\b', re.IGNORECASE)
+
+
+class PageFingerprint:
+    """What the top of one page says about where it belongs"""
+
+    __slots__ = ('page_index', 'po_number', 'page_one', 'title')
+
+    def __init__(self, page_index: int, header_text: str, layout_po_number: Optional[str] = None):
+        self.page_index = page_index
+        self.po_number = layout_po_number
+        if self.po_number is None:
+            for pattern in PO_NUMBER_LABELS:
+                match = pattern.search(header_text)
+                if match:
+                    self.po_number = match.group(1).strip()
+                    break
+        self.page_one = PAGE_ONE.search(header_text) is not None
+        # A layout's first page is a PO title page however it is worded
+        self.title = layout_po_number is not None or PO_TITLE.search(header_text) is not None
+
+
+def _layout_po_number(page, header_text: str, layout_templates: Sequence) -> Optional[str]:
+    """PO number read by the first coordinate template that fits the page"""
+    rect = page.rect
+    # Word boxes are only read for pages of the right size showing the template's anchor label
+    candidates = [template for template in layout_templates
+                  if template.anchor in header_text and template.matches_page_size(rect.width, rect.height)]
+    if not candidates:
+        return None
+    words = page.get_text('words')
+    for template in candidates:
+        entities = template.extract(words, rect.width)
+        if entities and entities.get('PO_NUMBER'):
+            return entities['PO_NUMBER']
+    return None
+
+
+def read_fingerprints(pdf_source: PDFSource, layout_templates: Sequence = ()) -> List[PageFingerprint]:
+    """Fingerprint every page from the text in its top band and any matching layout template"""
+    pymupdf = import_pymupdf()
+    doc = open_pdf(pdf_source)
+    try:
+        fingerprints = []
+        for page in doc:
+            rect = page.rect
+            header = page.get_text(clip=pymupdf.Rect(rect.x0, rect.y0, rect.x1,
+                                                      rect.y0 + rect.height * HEADER_FRACTION))
+            fingerprints.append(PageFingerprint(page.number, header, _layout_po_number(page, header, layout_templates)))
+        return fingerprints
+    finally:
+        doc.close()
+
+
+def find_segments(fingerprints: List[PageFingerprint]) -> List[Dict]:
+    """
+    Group pages into POs, as [{"start", "stop", "po_number"}] with stop
+    exclusive. A segment without a PO number of its own takes the first one
+    found on its pages; it is only split there when both pages look like the
+    first page of a PO.
+    """
+    segments = []
+    current = None
+    for fingerprint in fingerprints:
+        if current is None:
+            starts = True
+        elif fingerprint.page_one:
+            starts = True
+        elif fingerprint.po_number is None or fingerprint.po_number == current['po_number']:
+            starts = False
+        elif current['po_number'] is not None:
+            starts = True
+        else:
+            starts = fingerprint.title and current['title']
+
+        if starts:
+            current = {'start': fingerprint.page_index, 'stop': fingerprint.page_index + 1,
+                       'po_number': fingerprint.po_number, 'title': fingerprint.title}
+            segments.append(current)
+        else:
+            current['stop'] = fingerprint.page_index + 1
+            if current['po_number'] is None:
+                current['po_number'] = fingerprint.po_number
+
+    return [{key: segment[key] for key in ('start', 'stop', 'po_number')} for segment in segments]
+
+
+def segment_pdf(pdf_source: PDFSource, layout_templates: Sequence = ()) -> List[Dict]:
+    """Page ranges of the POs in a possibly merged PDF"""
+    segments = find_segments(read_fingerprints(pdf_source, layout_templates))
+    logger.info(f"Found {len(segments)} PO segment(s)")
+    return segments
+
+
+def slice_pdf(pdf_source: PDFSource, start: int, stop: int) -> bytes:
+    """Pages start..stop of a PDF as a PDF of their own, built in memory"""
+    pymupdf = import_pymupdf()
+    doc = open_pdf(pdf_source)
+    part = pymupdf.open()
+    try:
+        part.insert_pdf(doc, from_page=start, to_page=stop - 1)
+        # A fixed file ID keeps the bytes, and so the text cache key, the same on every run
+        return part.tobytes(no_new_id=True)
+    finally:
+        part.close()
+        doc.close()
+
+
+def describe_segment(segment: Dict, index: int) -> Dict:
+    """The segment block attached to each result: 1-based, inclusive page numbers"""
+    return {
+        'index': index,
+        'pages': [segment['start'] + 1, segment['stop']],
+        'po_number_hint': segment['po_number'],
+    }
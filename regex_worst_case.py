@@ -0,0 +1,177 @@
+"""
+Worst-Case Regex Corpus
+
+Checks the field patterns of the Universal PDF Extractor against text built
+to make backtracking patterns explode: long runs of name characters with no
+company or grade suffix, labels followed by nothing but whitespace, repeated
+labels and digit runs. Three checks, each failing the run when violated:
+
+  * every pattern searches each adversarial input within --limit_ms;
+  * each rewritten pattern finds exactly what its unbounded original found,
+    on random text built from the sample POs and from suffix-heavy tokens;
+  * a whole document of adversarial text extracts within the regex budget.
+
+Usage:
+    python regex_worst_case.py
+    python regex_worst_case.py --size 100000 --limit_ms 250 --samples 5000
+"""
+
+import sys
+import glob
+import time
+import random
+import logging
+import argparse
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import regex
+
+from universal_pdf_extractor import DOCUMENT_REGEX_BUDGET_SECONDS, FIELD_PATTERNS, UniversalPDFExtractor
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+# Patterns rewritten to stop quadratic backtracking: (field, index, original pattern)
+UNBOUNDED_PATTERNS = [
+    ('PO_ISSUER_NAME', 9, r'For\s+([A-Z][a-zA-Z\s&.,]+(?:FZE|Ltd\.?|Inc\.?|Corp\.?|Pvt\.?\s*Ltd\.?))'),
+    ('PO_ISSUER_NAME', 10, r'([A-Z][a-zA-Z\s&.,]+(?:FZE|Ltd\.?|Inc\.?|Corp\.?|Pvt\.?\s*Ltd\.?))'),
+    ('MATERIAL', 5, r'([A-Za-z\s]+(?:BP|USP|EP|IP|Grade))'),
+    ('MATERIAL', 6, r'([A-Za-z\s]+(?:USP|BP|EP|IP))'),
+]
+
+# Tokens that put suffixes, separators and near misses close together
+SUFFIX_TOKENS = [
+    'For', 'for', 'Acme', 'Pharma', 'Ltd', 'Ltd.', 'Lt', 'Pvt', 'Pvt.', 'FZE', 'Inc', 'Inc.', 'Corp',
+    'USP', 'BP', 'EP', 'IP', 'Grade', 'shipping', 'receipt', '&', ',', '.', ' ', '  ', '\n', '\n\n',
+    '12', ':', '-', 'Address:', 'Tel:', '+91', 'Dapsone',
+]
+
+
+def _repeat(unit: str, size: int) -> str:
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+ADVERSARIAL_INPUTS: Dict[str, Callable[[int], str]] = {
+    # Name characters with no suffix: every start position retried the whole run
+    'prose_run': lambda size: _repeat('abc def ', size),
+    'prose_lines': lambda size: _repeat('Abc def\n', size),
+    'repeated_for': lambda size: _repeat('for abc ', size),
+    'suffix_near_miss': lambda size: _repeat('Acme Lt Pvt U S P ', size),
+    # Labels followed by whitespace or fragments only
+    'label_whitespace': lambda size: 'Address:' + _repeat(' \n', size),
+    'address_lines': lambda size: 'Address: x\n' + _repeat('a\n', size),
+    'repeated_labels': lambda size: _repeat('Tel: Contact: Phone: ', size),
+    # Runs for the number and phone patterns
+    'digit_run': lambda size: _repeat('1 ', size),
+    'phone_run': lambda size: _repeat('+9 1-', size),
+    'decimal_run': lambda size: _repeat('1,0.', size),
+}
+
+
+def time_patterns(size: int, limit_ms: float) -> List[Dict]:
+    """Search every field pattern in every adversarial input; return the searches over the limit"""
+    slow = []
+    for name, build in ADVERSARIAL_INPUTS.items():
+        text = build(size)
+        for field, (flags, patterns) in FIELD_PATTERNS.items():
+            for index, pattern in enumerate(patterns):
+                compiled = regex.compile(pattern, flags)
+                started = time.perf_counter()
+                try:
+                    compiled.search(text, timeout=limit_ms / 1000 * 10)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                except TimeoutError:
+                    elapsed_ms = float('inf')
+                if elapsed_ms > limit_ms:
+                    slow.append({'input': name, 'field': field, 'index': index, 'ms': round(elapsed_ms, 1)})
+    return slow
+
+
+def _corpus_lines(pdf_paths: List[str]) -> List[str]:
+    extractor = UniversalPDFExtractor(use_templates=False)
+    lines = []
+    for pdf_path in pdf_paths:
+        lines += extractor.extract_text_from_pdf(pdf_path).split('\n')
+    return lines
+
+
+def _capture(match):
+    if match is None:
+        return None
+    return match.span(1), match.group(1)
+
+
+def check_rewrites(pdf_paths: List[str], samples: int, seed: int) -> List[Dict]:
+    """Compare each rewritten pattern with its unbounded original on random texts"""
+    rng = random.Random(seed)
+    lines = _corpus_lines(pdf_paths) or ['']
+    texts = [build(300) for build in ADVERSARIAL_INPUTS.values()]
+    for _ in range(samples):
+        texts.append('\n'.join(rng.choice(lines) for _ in range(rng.randint(1, 20))))
+        texts.append(''.join(rng.choice(SUFFIX_TOKENS) + rng.choice(['', ' ']) for _ in range(rng.randint(1, 60))))
+
+    mismatches = []
+    for field, index, original in UNBOUNDED_PATTERNS:
+        flags, patterns = FIELD_PATTERNS[field]
+        unbounded, rewritten = regex.compile(original, flags), regex.compile(patterns[index], flags)
+        for text in texts:
+            expected, found = _capture(unbounded.search(text)), _capture(rewritten.search(text))
+            if expected != found:
+                mismatches.append({'field': field, 'index': index, 'text': text[:200],
+                                   'expected': expected, 'found': found})
+    return mismatches
+
+
+def time_documents(size: int) -> List[Dict]:
+    """Extract each adversarial input as a whole document under the default budgets"""
+    extractor = UniversalPDFExtractor(use_templates=False)
+    reports = []
+    for name, build in ADVERSARIAL_INPUTS.items():
+        started = time.perf_counter()
+        result = extractor.extract_from_text(build(size))
+        skipped = result.get('model_info', {}).get('regex_budget', {}).get('skipped_patterns', [])
+        reports.append({'input': name, 'ms': round((time.perf_counter() - started) * 1000, 1),
+                        'skipped_patterns': len(skipped)})
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check extraction patterns against worst-case input")
+    parser.add_argument("--size", type=int, default=20000, help="Characters per adversarial input")
+    parser.add_argument("--limit_ms", type=float, default=100.0,
+                        help="Longest a single pattern search may take on an adversarial input")
+    parser.add_argument("--samples", type=int, default=2000,
+                        help="Random texts of each kind used to compare rewritten patterns")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for the random texts")
+    parser.add_argument("--pdfs", nargs="*", default=[str(REPO_ROOT / '*.pdf')],
+                        help="PDF files or glob patterns whose text seeds the comparison")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    failed = False
+
+    slow = time_patterns(args.size, args.limit_ms)
+    print(f"Pattern searches over {args.limit_ms:g} ms on {args.size}-character inputs: {len(slow)}")
+    for entry in slow:
+        print(f"  {entry['input']:<18} {entry['field']:<18} #{entry['index']:<3} {entry['ms']} ms")
+    failed |= bool(slow)
+
+    pdf_paths = sorted({path for pattern in args.pdfs for path in glob.glob(pattern)})
+    mismatches = check_rewrites(pdf_paths, args.samples, args.seed)
+    print(f"Rewritten patterns differing from their originals: {len(mismatches)}")
+    for entry in mismatches[:10]:
+        print(f"  {entry['field']} #{entry['index']}: {entry['expected']} != {entry['found']} in {entry['text']!r}")
+    failed |= bool(mismatches)
+
+    print(f"Whole-document extraction (budget {DOCUMENT_REGEX_BUDGET_SECONDS:g} s):")
+    for entry in time_documents(args.size):
+        print(f"  {entry['input']:<18} {entry['ms']:>9} ms, {entry['skipped_patterns']} pattern(s) skipped")
+        failed |= entry['ms'] > DOCUMENT_REGEX_BUDGET_SECONDS * 1000 * 1.2
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Columnar Export of Extraction Results
+
+Turns batch records ({"path", "ok", "result" | "error", "elapsed_ms"}, the
+NDJSON of --batch) into flat rows with one fixed schema, and streams them to
+Parquet or Arrow IPC files when pyarrow is installed, or to CSV files of a
+bounded number of rows otherwise. The schema is the reported fields of
+ENTITY_LABELS, lower-cased, plus routing, timing and status columns; it does
+not change with what a document happens to contain. Rows are held in a
+slots-only record type and written one row group or CSV row at a time, so
+memory stays flat however many documents are exported.
+
+Batch mode exports as it extracts (--export); this script converts stored
+NDJSON results.
+
+Usage:
+    python result_export.py results-*.ndjson --output month.parquet
+    python result_export.py results.ndjson --output month.csv --chunk_rows 200000
+
+Quantities are exported as floats, read from the first number in the value,
+so "300 kg" is 300.0 and 0.5 stays 0.5; a quantity with no finite number is
+left empty rather than guessed.
+"""
+
+import re
+import csv
+import sys
+import json
+import math
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from universal_pdf_extractor import ENTITY_LABELS
+
+logger = logging.getLogger(__name__)
+
+# (column, type) in file order; types are pyarrow type names
+STATUS_COLUMNS = [('path', 'string'), ('ok', 'bool_'), ('error', 'string')]
+# Quantities can be fractional (0.5 kg line items), so they are floats, not integers
+ENTITY_COLUMNS = [(field.lower(), 'float64' if field == 'QUANTITY' else 'string') for field in ENTITY_LABELS]
+METADATA_COLUMNS = [
+    ('detected_format', 'string'),
+    ('route', 'string'),
+    ('confidence', 'float64'),
+    ('entities_found', 'int64'),
+    ('text_length', 'int64'),
+    ('pages_read', 'int64'),
+    ('material_sku', 'string'),
+    ('material_score', 'float64'),
+    ('near_duplicate', 'bool_'),
+    ('rules_version', 'string'),
+    ('segment_pages', 'string'),
+    ('detect_ms', 'float64'),
+    ('elapsed_ms', 'float64'),
+]
+SCHEMA: List[Tuple[str, str]] = STATUS_COLUMNS + ENTITY_COLUMNS + METADATA_COLUMNS
+COLUMN_NAMES = tuple(name for name, _ in SCHEMA)
+
+# Rows per Parquet row group or Arrow record batch, the unit held in memory
+DEFAULT_ROW_GROUP_ROWS = 20000
+
+# Rows per CSV file
+DEFAULT_CSV_CHUNK_ROWS = 100000
+
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+
+# The number in a quantity such as "1,300 kg"
+NUMBER = re.compile(r'[-+]?(?:\d[\d,]*(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?')
+
+
+def _text(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _number(value) -> Optional[float]:
+    """A quantity as a float, without units or thousands separators; None when it has no finite number"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            number = float(value)
+        else:
+            match = NUMBER.search(str(value))
+            if match is None:
+                return None
+            number = float(match.group(0).replace(',', ''))
+    except (ValueError, OverflowError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class ExtractionRecord:
+    """One document's row, one slot per column of SCHEMA"""
+
+    __slots__ = COLUMN_NAMES
+
+    def __init__(self, values: Tuple):
+        for name, value in zip(COLUMN_NAMES, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_batch_record(cls, record: Dict) -> 'ExtractionRecord':
+        """Flatten a batch record; fields outside ENTITY_LABELS are left out"""
+        result = record.get('result') or {}
+        data = result.get('data') or {}
+        model_info = result.get('model_info') or {}
+        routing = model_info.get('routing') or {}
+        material_match = result.get('material_match')
+        segment = result.get('segment')
+        entities = tuple(
+            _number(data.get(field)) if field == 'QUANTITY' else _text(data.get(field))
+            for field in ENTITY_LABELS
+        )
+        return cls((record.get('path'), bool(record.get('ok')), record.get('error') or result.get('error'))
+                   + entities
+                   + (model_info.get('detected_format'),
+                      routing.get('route'),
+                      result.get('confidence'),
+                      result.get('entities_found'),
+                      result.get('text_length'),
+                      result.get('pages_read'),
+                      _text(material_match.get('sku')) if material_match else None,
+                      material_match.get('score') if material_match else None,
+                      bool(result.get('near_duplicate')),
+                      (model_info.get('rules') or {}).get('version'),
+                      '-'.join(map(str, segment['pages'])) if segment else None,
+                      routing.get('detect_ms'),
+                      record.get('elapsed_ms')))
+
+    def values(self) -> Tuple:
+        return tuple(getattr(self, name) for name in COLUMN_NAMES)
+
+
+class CsvChunkWriter:
+    """Rows as CSV files of at most chunk_rows rows, each with the header: out-00000.csv, out-00001.csv, ..."""
+
+    format = 'csv'
+
+    def __init__(self, path: str, chunk_rows: int = DEFAULT_CSV_CHUNK_ROWS):
+        path = Path(path)
+        self.stem = path.with_suffix('')
+        self.chunk_rows = chunk_rows
+        self.paths = []
+        self.rows = 0
+        self._file = None
+        self._writer = None
+        self._chunk_rows = 0
+
+    def _next_chunk(self):
+        if self._file is not None:
+            self._file.close()
+        chunk_path = f"{self.stem}-{len(self.paths):05d}.csv"
+        self.paths.append(chunk_path)
+        self._file = open(chunk_path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMN_NAMES)
+        self._chunk_rows = 0
+
+    def write(self, row: ExtractionRecord):
+        if self._file is None or self._chunk_rows >= self.chunk_rows:
+            self._next_chunk()
+        self._writer.writerow(row.values())
+        self._chunk_rows += 1
+        self.rows += 1
+
+    def close(self) -> Dict:
+        if self._file is None:
+            # An empty export still leaves a header-only file behind
+            self._next_chunk()
+        self._file.close()
+        return {"format": self.format, "rows": self.rows, "paths": self.paths}
+
+
+class ArrowWriter:
+    """Rows as a Parquet file, or an Arrow IPC file, written one row group at a time"""
+
+    def __init__(self, path: str, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS):
+        import pyarrow
+
+        self.pyarrow = pyarrow
+        self.path = str(path)
+        self.format = 'arrow' if Path(path).suffix.lower() in ARROW_SUFFIXES else 'parquet'
+        self.schema = pyarrow.schema([(name, getattr(pyarrow, kind)()) for name, kind in SCHEMA])
+        self.row_group_rows = row_group_rows
+        self.rows = 0
+        self._columns = [[] for _ in SCHEMA]
+        if self.format == 'parquet':
+            import pyarrow.parquet
+            self._sink = None
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+        else:
+            import pyarrow.ipc
+            self._sink = pyarrow.OSFile(self.path, 'wb')
+            self._writer = pyarrow.ipc.new_file(self._sink, self.schema)
+
+    def write(self, row: ExtractionRecord):
+        for column, value in zip(self._columns, row.values()):
+            column.append(value)
+        self.rows += 1
+        if len(self._columns[0]) >= self.row_group_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._columns[0]:
+            return
+        batch = self.pyarrow.record_batch(
+            [self.pyarrow.array(column, type=field.type) for column, field in zip(self._columns, self.schema)],
+            schema=self.schema)
+        self._writer.write_batch(batch)
+        self._columns = [[] for _ in SCHEMA]
+
+    def close(self) -> Dict:
+        self._flush()
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+        return {"format": self.format, "rows": self.rows, "paths": [self.path]}
+
+
+def open_exporter(path: str, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS,
+                  chunk_rows: int = DEFAULT_CSV_CHUNK_ROWS):
+    """
+    A writer for the output path: Parquet (.parquet) or Arrow IPC (.arrow,
+    .feather, .ipc) when pyarrow is installed, CSV chunks (.csv) otherwise
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == '.csv':
+        return CsvChunkWriter(path, chunk_rows)
+    if suffix != '.parquet' and suffix not in ARROW_SUFFIXES:
+        raise ValueError(f"Unknown export format for {path}: use .parquet, .arrow or .csv")
+    try:
+        return ArrowWriter(path, row_group_rows)
+    except ImportError:
+        logger.warning(f"pyarrow is not installed (pip install -r requirements_export.txt); "
+                       f"exporting CSV chunks instead of {path}")
+        return CsvChunkWriter(path, chunk_rows)
+
+
+def export_ndjson(input_paths: List[str], writer) -> Dict:
+    """Stream stored batch records into a writer; returns the writer's summary"""
+    skipped = 0
+    try:
+        for input_path in input_paths:
+            with open(input_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        skipped += 1
+                        continue
+                    writer.write(ExtractionRecord.from_batch_record(record))
+    finally:
+        summary = writer.close()
+    if skipped:
+        logger.warning(f"Skipped {skipped} line(s) that are not JSON")
+    return {**summary, "skipped_lines": skipped}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert batch extraction results (NDJSON) to columnar files")
+    parser.add_argument("inputs", nargs="+", help="NDJSON files written by --batch")
+    parser.add_argument("--output", required=True,
+                        help="Output path: .parquet or .arrow (needs pyarrow), or .csv for CSV chunks")
+    parser.add_argument("--row_group_rows", type=int, default=DEFAULT_ROW_GROUP_ROWS,
+                        help="Rows per Parquet row group / Arrow record batch")
+    parser.add_argument("--chunk_rows", type=int, default=DEFAULT_CSV_CHUNK_ROWS, help="Rows per CSV file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        writer = open_exporter(args.output, args.row_group_rows, args.chunk_rows)
+    except ValueError as e:
+        parser.error(str(e))
+    summary = export_ndjson(args.inputs, writer)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+"""
+Shadow Extraction Runner
+
+Runs a candidate extractor next to the current one on the same documents,
+so an optimized or re-ruled version can ship with evidence that its output
+did not change. The candidate is another copy of universal_pdf_extractor.py
+(loaded from a file path; it imports the rest of this tree), the current
+module with another rule file, or both.
+
+The current (primary) extractor reads each PDF's text once. Its pages are
+handed to the candidate, which runs in a separate low-priority process, so
+the primary result is returned without waiting on the candidate. A
+candidate crash cannot take the primary down with it. Every pair of results
+is compared field by field, and the extraction time of each version is
+recorded with the shared text read kept out of both.
+
+Shadowing runs over a directory (this script, one document at a time, so
+timings do not compete) or over live traffic mirrored by a worker started
+with --shadow_candidate / --shadow_rules.
+
+Usage:
+    python shadow_runner.py ./pos --candidate /path/to/universal_pdf_extractor.py --report shadow.json
+    python shadow_runner.py "./pos/*.pdf" --candidate_rules new_rules.json
+"""
+
+import os
+import sys
+import json
+import time
+import inspect
+import hashlib
+import logging
+import threading
+import importlib.util
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from text_engines import PDFSource, in_memory
+from universal_pdf_extractor import (
+    UniversalPDFExtractor, _percentile, build_extractor, describe_source, iter_batch_inputs
+)
+
+logger = logging.getLogger(__name__)
+
+# Niceness of the candidate process in live shadowing, so it yields the CPU to live jobs
+CANDIDATE_NICENESS = 10
+
+# Candidate jobs waiting at most; further documents are not shadowed until the candidate catches up
+DEFAULT_MAX_PENDING = 32
+
+# Disagreements kept in full in the report
+DEFAULT_MAX_EXAMPLES = 50
+
+# Leading documents left out of the latencies: each version pays for its lazy imports and pattern compiles there
+DEFAULT_WARMUP_DOCUMENTS = 1
+
+# Primary options the candidate never shares, so it cannot write to the primary's caches or index
+PRIMARY_ONLY_OPTIONS = ('cache_dir', 'cache_max_bytes', 'duplicate_db', 'duplicate_threshold', 'instrument')
+
+
+class SharedPageText:
+    """
+    Text cache stand-in that holds the pages of the document being
+    extracted: the primary's extractor leaves the pages it read here, and
+    the candidate's is served them instead of parsing the PDF again.
+    Lookups and stores go through to a wrapped cache, if any. The time from
+    a missed lookup to the store is the time the engines spent reading
+    pages, which is kept out of each version's extraction time.
+    """
+
+    def __init__(self, backing=None):
+        self.backing = backing
+        self.pages = None
+        self.layout = None
+        self.read_ms = 0.0
+        self._missed_at = None
+
+    def begin(self, pages: Optional[List[str]] = None):
+        """Start a document, with its pages when they are already known"""
+        self.pages = pages
+        self.layout = None
+        self.read_ms = 0.0
+        self._missed_at = None
+
+    def key_for(self, pdf_bytes) -> str:
+        # The extractor only stores pages under a key; without a backing cache any key will do
+        return self.backing.key_for(pdf_bytes) if self.backing is not None else ''
+
+    def get(self, key: str) -> Optional[List[str]]:
+        if self.pages is None and self.backing is not None:
+            self.pages = self.backing.get(key)
+        if self.pages is None:
+            self._missed_at = time.perf_counter()
+        return self.pages
+
+    def get_layout(self, key: str) -> Optional[Dict]:
+        if self.layout is None and self.backing is not None:
+            self.layout = self.backing.get_layout(key)
+        return self.layout
+
+    def put(self, key: str, pages: List[str], layout: Optional[Dict] = None):
+        if self._missed_at is not None:
+            self.read_ms = (time.perf_counter() - self._missed_at) * 1000
+            self._missed_at = None
+        self.pages = pages
+        self.layout = layout if layout is not None else self.layout
+        if self.backing is not None:
+            self.backing.put(key, pages, layout)
+
+    def stats(self) -> Optional[Dict]:
+        return self.backing.stats() if self.backing is not None else None
+
+
+def load_extractor_module(module_path: Optional[str]):
+    """The candidate's extractor module: a file loaded under its own name, or this tree's"""
+    if not module_path:
+        import universal_pdf_extractor
+        return universal_pdf_extractor
+    digest = hashlib.blake2b(os.path.abspath(module_path).encode('utf-8'), digest_size=4).hexdigest()
+    spec = importlib.util.spec_from_file_location(f'shadow_candidate_{digest}', module_path)
+    if spec is None:
+        raise ImportError(f"Cannot load a candidate extractor from {module_path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def candidate_options(extractor_options: Dict, rules_path: Optional[str] = None) -> Dict:
+    """The primary's extractor options as the candidate uses them"""
+    options = {key: value for key, value in extractor_options.items() if key not in PRIMARY_ONLY_OPTIONS}
+    if rules_path:
+        options['rules_path'] = rules_path
+    return options
+
+
+def summarize(result: Dict) -> Dict:
+    """The parts of a result two versions are compared on"""
+    if "error" in result:
+        return {"error": result["error"]}
+    material_match = result.get("material_match")
+    return {
+        "data": dict(result["data"]),
+        "format": result.get("model_info", {}).get("detected_format"),
+        "material_sku": material_match.get("sku") if material_match else None,
+    }
+
+
+def compare_summaries(primary: Dict, candidate: Dict) -> Dict[str, Dict]:
+    """Disagreements between two summaries, as {field: {"primary": ..., "candidate": ...}}"""
+    if "error" in primary or "error" in candidate:
+        if primary.get("error") == candidate.get("error"):
+            return {}
+        return {"error": {"primary": primary.get("error"), "candidate": candidate.get("error")}}
+    differences = {}
+    fields = list(primary["data"]) + [field for field in candidate["data"] if field not in primary["data"]]
+    for field in fields:
+        if primary["data"].get(field) != candidate["data"].get(field):
+            differences[field] = {"primary": primary["data"].get(field), "candidate": candidate["data"].get(field)}
+    for key in ("format", "material_sku"):
+        if primary[key] != candidate[key]:
+            differences[key] = {"primary": primary[key], "candidate": candidate[key]}
+    return differences
+
+
+def _latency_stats(values: List[float]) -> Dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(_percentile(ordered, 50), 3),
+        "p90": round(_percentile(ordered, 90), 3),
+        "p99": round(_percentile(ordered, 99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class ShadowReport:
+    """Field disagreements and per-version latencies over every compared document"""
+
+    def __init__(self, max_examples: int = DEFAULT_MAX_EXAMPLES, warmup: int = DEFAULT_WARMUP_DOCUMENTS):
+        self.max_examples = max_examples
+        self.warmup = warmup
+        self.compared = 0
+        self.identical = 0
+        self.skipped = 0
+        self.errors = {"primary": 0, "candidate": 0}
+        self.candidate_failures = 0
+        self.disagreements = {}
+        self.examples = []
+        self.latency_ms = {"primary": [], "candidate": []}
+        self.text_read_ms = []
+
+    def observe(self, source: str, primary: Tuple[Dict, float, float], candidate: Tuple[Dict, float, float]):
+        """Fold in one document: (summary, extraction ms, text read ms) for each version"""
+        self.compared += 1
+        timed = self.compared > self.warmup
+        for version, (summary, extract_ms, _) in (("primary", primary), ("candidate", candidate)):
+            if timed:
+                self.latency_ms[version].append(extract_ms)
+            if "error" in summary:
+                self.errors[version] += 1
+        if timed:
+            # Text read by whichever version parsed the PDF
+            self.text_read_ms.append(primary[2] + candidate[2])
+
+        differences = compare_summaries(primary[0], candidate[0])
+        if not differences:
+            self.identical += 1
+            return
+        for field in differences:
+            self.disagreements[field] = self.disagreements.get(field, 0) + 1
+        if len(self.examples) < self.max_examples:
+            self.examples.append({"source": source, "fields": differences})
+
+    def to_dict(self) -> Dict:
+        primary, candidate = (_latency_stats(self.latency_ms[version]) for version in ("primary", "candidate"))
+        speedup = None
+        if primary.get("p50") and candidate.get("p50"):
+            speedup = round(primary["p50"] / candidate["p50"], 3)
+        return {
+            "compared": self.compared,
+            "identical": self.identical,
+            "skipped": self.skipped,
+            "disagreements": dict(sorted(self.disagreements.items(), key=lambda item: -item[1])),
+            "errors": dict(self.errors, candidate_failures=self.candidate_failures),
+            "latency_ms": {"primary": primary, "candidate": candidate},
+            "candidate_speedup_p50": speedup,
+            "text_read_ms": _latency_stats(self.text_read_ms),
+            "examples": self.examples,
+        }
+
+
+# Candidate extractor owned by the shadow process, built once by the initializer
+_candidate = None
+
+
+def _init_candidate(module_path: Optional[str], options: Dict, niceness: int):
+    global _candidate
+    if niceness:
+        os.nice(niceness)
+    logging.getLogger().setLevel(logging.WARNING)
+    module = load_extractor_module(module_path)
+    # Older candidates may not know every option
+    accepted = inspect.signature(module.build_extractor).parameters
+    _candidate = module.build_extractor(**{key: value for key, value in options.items() if key in accepted})
+    _candidate.text_cache = SharedPageText()
+
+
+def _run_candidate(pdf_source: PDFSource, pages: Optional[List[str]]) -> Tuple[Dict, float, float]:
+    """Extract one document in the shadow process, from the primary's pages when it read any"""
+    shared = _candidate.text_cache
+    shared.begin(pages)
+    started = time.perf_counter()
+    result = _candidate.extract_from_pdf(pdf_source)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return summarize(result), elapsed_ms - shared.read_ms, shared.read_ms
+
+
+class ShadowRunner:
+    """
+    Extracts with the primary extractor and compares each document with the
+    candidate, run in a process of its own.
+
+    In the background (live traffic), extract() returns as soon as the
+    primary is done; at most max_pending candidate jobs wait, and documents
+    beyond that are counted as skipped. Otherwise extract() waits for the
+    candidate, so the two versions never compete for the CPU.
+    """
+
+    def __init__(self, primary: UniversalPDFExtractor, candidate_module: Optional[str] = None,
+                 candidate_options: Optional[Dict] = None, background: bool = True,
+                 max_pending: int = DEFAULT_MAX_PENDING, max_examples: int = DEFAULT_MAX_EXAMPLES):
+        self.primary = primary
+        self.text = SharedPageText(primary.text_cache)
+        primary.text_cache = self.text
+        self.candidate_module = candidate_module
+        self.candidate_options = candidate_options or {}
+        self.background = background
+        self.max_pending = max_pending
+        self.report = ShadowReport(max_examples)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = None
+
+    def _candidate_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            niceness = CANDIDATE_NICENESS if self.background else 0
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, initializer=_init_candidate,
+                initargs=(self.candidate_module, self.candidate_options, niceness))
+        return self._executor
+
+    def extract(self, pdf_source: PDFSource) -> Dict:
+        """The primary result for a document; the candidate runs on the same text"""
+        self.text.begin()
+        started = time.perf_counter()
+        result = self.primary.extract_from_pdf(pdf_source)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        primary = (summarize(result), elapsed_ms - self.text.read_ms, self.text.read_ms)
+        self._shadow(pdf_source, self.text.pages, primary)
+        return result
+
+    def _shadow(self, pdf_source: PDFSource, pages: Optional[List[str]], primary: Tuple[Dict, float, float]):
+        source = describe_source(pdf_source)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.report.skipped += 1
+                return
+            self._pending += 1
+        # Memory views (mmap) cannot be sent to another process
+        if in_memory(pdf_source):
+            pdf_source = bytes(pdf_source)
+        try:
+            future = self._candidate_executor().submit(_run_candidate, pdf_source, pages)
+        except Exception as e:
+            self._finish(source, primary, None, e)
+            return
+        if self.background:
+            future.add_done_callback(partial(self._finish_future, source, primary))
+        else:
+            self._finish_future(source, primary, future)
+
+    def _finish_future(self, source: str, primary: Tuple[Dict, float, float], future):
+        try:
+            self._finish(source, primary, future.result(), None)
+        except Exception as e:
+            self._finish(source, primary, None, e)
+
+    def _finish(self, source: str, primary: Tuple[Dict, float, float],
+                candidate: Optional[Tuple[Dict, float, float]], failure: Optional[Exception]):
+        with self._lock:
+            self._pending -= 1
+            if failure is not None:
+                from concurrent.futures.process import BrokenProcessPool
+                logger.error(f"Candidate extractor failed on {source}: {type(failure).__name__}: {failure}")
+                self.report.candidate_failures += 1
+                if isinstance(failure, BrokenProcessPool):
+                    # Started again for the next document
+                    self._executor = None
+                return
+            self.report.observe(source, primary, candidate)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return self.report.to_dict()
+
+    def close(self) -> Dict:
+        """Wait for the candidate jobs still pending, stop the shadow process and return the report"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.primary.text_cache = self.text.backing
+        return self.summary()
+
+
+def write_report(report: Dict, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    logger.info(f"Shadow report saved to: {path}")
+
+
+def print_report(report: Dict, stream=None):
+    stream = stream or sys.stdout
+    stream.write(f"Documents compared: {report['compared']} (identical {report['identical']}, "
+                 f"skipped {report['skipped']}, candidate failures {report['errors']['candidate_failures']})\n")
+    if report["disagreements"]:
+        stream.write("Field disagreements:\n")
+        for field, count in report["disagreements"].items():
+            stream.write(f"  {field:<20} {count}\n")
+    stream.write(f"{'Extraction ms':<14} {'p50':>9} {'p90':>9} {'p99':>9} {'mean':>9}\n")
+    for version in ("primary", "candidate"):
+        stats = report["latency_ms"][version]
+        if stats["count"]:
+            stream.write(f"  {version:<12} {stats['p50']:>9} {stats['p90']:>9} {stats['p99']:>9} {stats['mean']:>9}\n")
+    if report["candidate_speedup_p50"]:
+        stream.write(f"Candidate speedup at p50: {report['candidate_speedup_p50']}x\n")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare a candidate extractor with the current one")
+    parser.add_argument("sources", nargs="*", help="PDF files, directories or glob patterns")
+    parser.add_argument("--manifest", type=str, help="File listing one PDF path per line")
+    parser.add_argument("--candidate", type=str,
+                        help="Candidate copy of universal_pdf_extractor.py (default: this tree's)")
+    parser.add_argument("--candidate_rules", type=str, help="Rule file for the candidate")
+    parser.add_argument("--report", type=str, help="Write the full JSON report here")
+    parser.add_argument("--max_examples", type=int, default=DEFAULT_MAX_EXAMPLES,
+                        help="Disagreeing documents kept in full in the report")
+    parser.add_argument("--cache_dir", type=str, default=os.environ.get("PDF_TEXT_CACHE_DIR"),
+                        help="Extracted-text cache of the primary")
+    parser.add_argument("--rules", type=str, default=os.environ.get("PDF_EXTRACTION_RULES"),
+                        help="Rule file of the primary")
+    parser.add_argument("--no_templates", action="store_true",
+                        help="Skip coordinate templates in both versions")
+    parser.add_argument("--no_material_index", action="store_true",
+                        help="Skip resolving materials against the HRV items master in both versions")
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    if not args.sources and not args.manifest:
+        parser.error("give PDF sources or --manifest")
+    if not args.candidate and not args.candidate_rules:
+        parser.error("give --candidate, --candidate_rules or both")
+
+    extractor_options = {
+        "cache_dir": args.cache_dir,
+        "use_templates": not args.no_templates,
+        "use_material_index": not args.no_material_index,
+        "rules_path": args.rules,
+    }
+    runner = ShadowRunner(build_extractor(**extractor_options), args.candidate,
+                          candidate_options(extractor_options, args.candidate_rules),
+                          background=False, max_examples=args.max_examples)
+    try:
+        for pdf_path in iter_batch_inputs(args.sources, args.manifest):
+            runner.extract(pdf_path)
+    finally:
+        report = runner.close()
+
+    print_report(report)
+    if args.report:
+        write_report(report, args.report)
+    regressed = report["disagreements"] or report["errors"]["candidate"] > report["errors"]["primary"] \
+        or report["errors"]["candidate_failures"]
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Extractor Cold-Start Check
+
+Measures what a freshly started container pays before it can extract: the
+import of universal_pdf_extractor, read from `python -X importtime` in a new
+interpreter, and the time until a --worker process answers its first ping.
+Fails when either median goes over its budget, or when the import pulls in a
+module that only some modes need (the PDF libraries, process pools, SQLite,
+the profiler).
+
+Bytecode is compiled first, as the container image ships it; pass
+--no_compile to measure a cold start that compiles the sources as well.
+
+Usage:
+    python startup_check.py
+    python startup_check.py --runs 10 --import_budget_ms 120 --ready_budget_ms 300
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+import compileall
+import subprocess
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+ENTRY_MODULE = 'universal_pdf_extractor'
+
+# Imported on first use only; any of these at import time is a startup regression
+DEFERRED_MODULES = ('fitz', 'pymupdf', 'pdfplumber', 'multiprocessing', 'concurrent.futures.process',
+                    'sqlite3', 'cProfile', 'pstats', 'argparse', 'extraction_metrics', 'near_duplicates',
+                    'table_engine', 'material_index', 'layout_templates', 'po_segments', 'shadow_runner',
+                    'result_export', 'pyarrow')
+
+DEFAULT_IMPORT_BUDGET_MS = 150.0
+DEFAULT_READY_BUDGET_MS = 400.0
+
+
+def measure_import(module: str = ENTRY_MODULE) -> Dict:
+    """Import a module in a new interpreter and parse its -X importtime report"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    imports = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append({'name': name.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    total_us = next(entry['cumulative_us'] for entry in imports if entry['name'] == module)
+    return {'ms': total_us / 1000, 'imports': imports}
+
+
+def measure_worker_ready() -> float:
+    """Milliseconds from spawning a --worker process to its answer to a ping"""
+    started = time.perf_counter()
+    worker = subprocess.Popen([sys.executable, str(REPO_ROOT / f'{ENTRY_MODULE}.py'), '--worker'],
+                              cwd=REPO_ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True)
+    try:
+        worker.stdin.write(json.dumps({'id': 'startup', 'cmd': 'ping'}) + '\n')
+        worker.stdin.flush()
+        response = json.loads(worker.stdout.readline())
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not response.get('ok'):
+            raise RuntimeError(f"Worker did not answer the ping: {response}")
+        worker.stdin.write(json.dumps({'cmd': 'shutdown'}) + '\n')
+        worker.stdin.flush()
+        worker.wait(timeout=10)
+    finally:
+        if worker.poll() is None:
+            worker.kill()
+    return elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check extractor cold-start time against a budget")
+    parser.add_argument("--runs", type=int, default=5, help="Measurements per check; the median is compared")
+    parser.add_argument("--import_budget_ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                        help=f"Budget for importing {ENTRY_MODULE} (default: {DEFAULT_IMPORT_BUDGET_MS:g})")
+    parser.add_argument("--ready_budget_ms", type=float, default=DEFAULT_READY_BUDGET_MS,
+                        help=f"Budget until a worker answers a ping (default: {DEFAULT_READY_BUDGET_MS:g})")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--no_compile", action="store_true", help="Do not precompile bytecode first")
+    args = parser.parse_args()
+
+    if not args.no_compile:
+        compileall.compile_dir(str(REPO_ROOT), maxlevels=0, quiet=1)
+
+    failed = False
+    imports: List[Dict] = []
+    import_ms = []
+    for _ in range(args.runs):
+        report = measure_import()
+        import_ms.append(report['ms'])
+        imports = report['imports']
+    median_import = statistics.median(import_ms)
+    print(f"Import {ENTRY_MODULE}: median {median_import:.1f} ms, max {max(import_ms):.1f} ms "
+          f"(budget {args.import_budget_ms:g} ms)")
+    failed |= median_import > args.import_budget_ms
+
+    print(f"Slowest imports (self time, last run):")
+    for entry in sorted(imports, key=lambda entry: entry['self_us'], reverse=True)[:args.top]:
+        print(f"  {entry['self_us'] / 1000:7.2f} ms  {entry['name']}")
+
+    imported = {entry['name'] for entry in imports}
+    eager = [name for name in DEFERRED_MODULES if name in imported]
+    if eager:
+        print(f"Imported at startup but only needed by some modes: {', '.join(eager)}")
+        failed = True
+
+    ready_ms = [measure_worker_ready() for _ in range(args.runs)]
+    median_ready = statistics.median(ready_ms)
+    print(f"Worker ready: median {median_ready:.1f} ms, max {max(ready_ms):.1f} ms "
+          f"(budget {args.ready_budget_ms:g} ms)")
+    failed |= median_ready > args.ready_budget_ms
+
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
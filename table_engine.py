@@ -0,0 +1,269 @@
+"""
+Word-Geometry Table Engine
+
+Extracts every line item of a PO table from PyMuPDF's word list
+(page.get_text('words')) using geometry alone. Words are grouped into rows
+by their vertical centres, the header row is recognized by its column names,
+column spans come from the horizontal projection of the table body, and rows
+carrying a quantity or amount start a new item while the remaining rows
+extend the description of the nearest item. Each page's words are visited a
+constant number of times, so long tables cost linear time after the initial
+sort.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Words whose vertical centres are this close belong to one row
+ROW_TOLERANCE = 3.0
+
+# Header words further apart than this start a new header cell
+HEADER_CELL_GAP = 8.0
+
+# Body gaps narrower than this are word spacing, not a column boundary
+MIN_COLUMN_GAP = 6.0
+
+# A second header line must start within this distance below the first
+HEADER_CONTINUATION_GAP = 14.0
+
+# Column kinds in the order a header cell is classified
+COLUMN_KEYWORDS = [
+    ('hsn_sac', ('hsn', 'sac', 'hsn/sac')),
+    ('unit_price', ('rate', 'price')),
+    ('quantity', ('qty', 'quantity')),
+    ('amount', ('amount', 'value', 'total')),
+    ('unit', ('uom', 'unit', 'units')),
+    ('origin', ('origin',)),
+    ('description', ('description', 'item', 'items', 'material', 'product', 'goods', 'particulars')),
+    ('index', ('#', 'sr', 'sl', 's.no', 'no', 'sno')),
+]
+
+# Rows starting with these end the table
+TABLE_END = re.compile(r'^(sub\s*total|grand\s*total|total\b|amount\s+in\s+words|in\s+words)', re.IGNORECASE)
+
+NUMBER = re.compile(r'^[^\d\-]*(-?\d[\d,]*(?:\.\d+)?)')
+
+WORD_TOKEN = re.compile(r'[a-z#/.]+')
+
+
+def _centre_y(word: Tuple) -> float:
+    return (word[1] + word[3]) / 2
+
+
+def group_rows(words: List[Tuple]) -> List[List[Tuple]]:
+    """Group word boxes into rows, top to bottom, each sorted left to right"""
+    rows = []
+    row_centre = None
+    for word in sorted(words, key=lambda w: (_centre_y(w), w[0])):
+        centre = _centre_y(word)
+        if rows and abs(centre - row_centre) <= ROW_TOLERANCE:
+            rows[-1].append(word)
+        else:
+            rows.append([word])
+            row_centre = centre
+    for row in rows:
+        row.sort(key=lambda w: w[0])
+    return rows
+
+
+def _row_text(row: List[Tuple]) -> str:
+    return ' '.join(word[4] for word in row)
+
+
+def _classify(cell_text: str) -> Optional[str]:
+    tokens = set(WORD_TOKEN.findall(cell_text.lower()))
+    tokens |= {token.strip('.') for token in tokens}
+    for kind, keywords in COLUMN_KEYWORDS:
+        if tokens & set(keywords):
+            return kind
+    return None
+
+
+def _header_cells(row: List[Tuple]) -> List[Dict]:
+    """Split a header row into cells separated by wide horizontal gaps"""
+    cells = []
+    for word in row:
+        if cells and word[0] - cells[-1]['x1'] <= HEADER_CELL_GAP:
+            cells[-1]['x1'] = word[2]
+            cells[-1]['text'] += ' ' + word[4]
+        else:
+            cells.append({'x0': word[0], 'x1': word[2], 'text': word[4]})
+    for cell in cells:
+        cell['kind'] = _classify(cell['text'])
+    return cells
+
+
+def _find_header(rows: List[List[Tuple]]) -> Optional[Tuple[int, List[Dict]]]:
+    """Return (index of the last header row, classified header cells) or None"""
+    for index, row in enumerate(rows):
+        cells = _header_cells(row)
+        kinds = {cell['kind'] for cell in cells}
+        if 'description' not in kinds or not kinds & {'quantity', 'amount', 'unit_price'}:
+            continue
+
+        # Fold a second header line (e.g. "(In USD)") into the cells above it
+        last = index
+        if index + 1 < len(rows):
+            below = rows[index + 1]
+            if _centre_y(below[0]) - _centre_y(row[0]) <= HEADER_CONTINUATION_GAP and \
+                    not any(NUMBER.match(word[4]) for word in below):
+                for word in below:
+                    cell = _overlapping_cell(cells, word[0], word[2])
+                    if cell is not None:
+                        cell['text'] += ' ' + word[4]
+                last = index + 1
+        return last, cells
+    return None
+
+
+def _overlapping_cell(cells: List[Dict], x0: float, x1: float) -> Optional[Dict]:
+    best, best_overlap = None, 0.0
+    for cell in cells:
+        overlap = min(x1, cell['x1']) - max(x0, cell['x0'])
+        if overlap > best_overlap:
+            best, best_overlap = cell, overlap
+    return best
+
+
+def _nearest_cell(cells: List[Dict], x0: float, x1: float) -> Dict:
+    cell = _overlapping_cell(cells, x0, x1)
+    if cell is not None:
+        return cell
+    centre = (x0 + x1) / 2
+    return min(cells, key=lambda c: min(abs(centre - c['x0']), abs(centre - c['x1'])))
+
+
+def _column_spans(body: List[List[Tuple]], cells: List[Dict]) -> List[Tuple[float, float, Dict]]:
+    """
+    Map runs of horizontally overlapping body words to header cells.
+
+    Values are often wider than, or offset from, their header (right-aligned
+    numbers, left-aligned descriptions), so the body's own whitespace gaps
+    delimit the columns and the header only names them.
+    """
+    intervals = sorted((word[0], word[2]) for row in body for word in row)
+    spans = []
+    for x0, x1 in intervals:
+        if spans and x0 <= spans[-1][1] + MIN_COLUMN_GAP:
+            spans[-1][1] = max(spans[-1][1], x1)
+        else:
+            spans.append([x0, x1])
+
+    mapped = []
+    for x0, x1 in spans:
+        overlapping = [cell for cell in cells if min(x1, cell['x1']) > max(x0, cell['x0'])]
+        if len(overlapping) > 1:
+            # Columns touch in this run; fall back to the header cells themselves
+            mapped.extend((cell['x0'], cell['x1'], cell) for cell in overlapping)
+        else:
+            mapped.append((x0, x1, _nearest_cell(cells, x0, x1)))
+    return mapped
+
+
+def _parse_number(text: str):
+    match = NUMBER.match(text.replace(' ', ''))
+    if not match:
+        return None
+    value = float(match.group(1).replace(',', ''))
+    return int(value) if value.is_integer() else value
+
+
+def _parse_amount(text: str) -> Optional[str]:
+    match = NUMBER.match(text.replace(' ', ''))
+    return match.group(1).replace(',', '') if match else None
+
+
+def _build_item(line_no: int, cells: Dict[str, List[str]]) -> Dict:
+    """Turn the collected cell lines of one item into a line item record"""
+    description = [line for line in cells.get('description', []) if line]
+    item = {
+        'line': line_no,
+        'material': description[0] if description else None,
+        'description': '\n'.join(description) or None,
+    }
+
+    quantity_text = ' '.join(cells.get('quantity', []))
+    item['quantity'] = _parse_number(quantity_text) if quantity_text else None
+    unit = ' '.join(cells.get('unit', []))
+    if not unit and quantity_text:
+        # Units often sit in the quantity cell, e.g. "300.00" above "kg"
+        unit = re.sub(r'[\d,.\s]+', ' ', quantity_text).strip()
+    item['unit'] = unit or None
+
+    for kind in ('unit_price', 'amount'):
+        text = ' '.join(cells.get(kind, []))
+        item[kind] = _parse_amount(text) if text else None
+    for kind in ('hsn_sac', 'origin'):
+        if kind in cells:
+            item[kind] = ' '.join(cells[kind]) or None
+    return item
+
+
+def extract_line_items(words: List[Tuple]) -> List[Dict]:
+    """Return every line item found in one page's word list"""
+    rows = group_rows(words)
+    header = _find_header(rows)
+    if header is None:
+        return []
+    header_end, header_cells = header
+    header_cells = [cell for cell in header_cells if cell['kind']]
+
+    body = []
+    for row in rows[header_end + 1:]:
+        if TABLE_END.match(_row_text(row)):
+            break
+        body.append(row)
+    if not body:
+        return []
+
+    spans = _column_spans(body, header_cells)
+
+    def kind_of(word: Tuple) -> Optional[str]:
+        for x0, x1, cell in spans:
+            if x0 <= word[0] and word[2] <= x1:
+                return cell['kind']
+        return _nearest_cell(header_cells, word[0], word[2])['kind']
+
+    # Cell lines of each row, keyed by column kind
+    row_cells = []
+    for row in body:
+        cells = {}
+        for word in row:
+            cells.setdefault(kind_of(word), []).append(word[4])
+        row_cells.append({kind: ' '.join(texts) for kind, texts in cells.items()})
+
+    def is_anchor(cells: Dict[str, str]) -> bool:
+        return any(_parse_number(cells.get(kind, '')) is not None for kind in ('quantity', 'amount'))
+
+    anchors = [index for index, cells in enumerate(row_cells) if is_anchor(cells)]
+    if not anchors:
+        return []
+
+    # Top-aligned tables print the description on the anchor row and continue
+    # below it; vertically centred ones spread it around the anchor row
+    centred = 'description' not in row_cells[anchors[0]] and \
+        any('description' in cells for cells in row_cells[:anchors[0]])
+    centres = [_centre_y(row[0]) for row in body]
+
+    # Rows and anchors are both in vertical order, so one moving pointer
+    # assigns every row to its item
+    owners = []
+    owner = 0
+    for index in range(len(body)):
+        if centred:
+            while owner + 1 < len(anchors) and \
+                    abs(centres[anchors[owner + 1]] - centres[index]) < abs(centres[anchors[owner]] - centres[index]):
+                owner += 1
+        else:
+            while owner + 1 < len(anchors) and anchors[owner + 1] <= index:
+                owner += 1
+        owners.append(owner)
+
+    items = [dict() for _ in anchors]
+    for index, cells in enumerate(row_cells):
+        item_cells = items[owners[index]]
+        for kind, text in cells.items():
+            if kind is not None:
+                item_cells.setdefault(kind, []).append(text)
+
+    return [_build_item(line_no, cells) for line_no, cells in enumerate(items, start=1)]
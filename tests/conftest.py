@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+HRV_PDF = REPO_ROOT / 'HRVPOR2526-0106_Ubidecarenone (CO ENZYME Q 10)_300kgs.pdf'
+NHG_PDF = REPO_ROOT / 'NHGPOR2526-00024_Sumatriptan succinate EP Grad_2kgs (1).pdf'
+VORICONAZOLE_PDF = REPO_ROOT / 'PO 001-2025 Voriconazole 10 KG.pdf'
+
+
+@pytest.fixture
+def rules_file(tmp_path):
+    """A copy of the shipped rule file that a test may edit"""
+    path = tmp_path / 'extraction_rules.json'
+    path.write_text((REPO_ROOT / 'extraction_rules.json').read_text(encoding='utf-8'), encoding='utf-8')
+    return path
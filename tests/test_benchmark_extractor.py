@@ -0,0 +1,52 @@
+import os
+from pathlib import Path
+
+from benchmark_extractor import MIN_COMPARABLE_MS, compare_results, generate_synthetic_corpus
+
+
+def _results(stage_p50: float, field_p50: float, docs_per_sec: float) -> dict:
+    return {'results': {
+        'stages': {'end_to_end': {'p50_ms': stage_p50}},
+        'fields': {'PO_NUMBER': {'p50_ms': field_p50}},
+        'throughput': {'docs_per_sec': docs_per_sec},
+    }}
+
+
+def test_compare_results_within_threshold():
+    baseline = _results(10.0, 1.0, 100.0)
+    assert compare_results(baseline, _results(10.9, 1.09, 92.0), threshold=0.1) == []
+
+
+def test_compare_results_flags_regressions_past_threshold():
+    regressions = compare_results(_results(10.0, 1.0, 100.0), _results(11.5, 1.2, 80.0), threshold=0.1)
+    assert len(regressions) == 3
+    assert regressions[0].startswith('stages.end_to_end:')
+    assert regressions[1].startswith('fields.PO_NUMBER:')
+    assert regressions[2].startswith('throughput:')
+
+
+def test_compare_results_ignores_sub_noise_timings_and_new_entries():
+    baseline = _results(10.0, MIN_COMPARABLE_MS / 2, 100.0)
+    current = _results(10.0, 1.0, 100.0)
+    current['results']['stages']['template'] = {'p50_ms': 50.0}
+    assert compare_results(baseline, current, threshold=0.1) == []
+
+
+def test_corpus_is_byte_identical_across_runs(tmp_path):
+    first = generate_synthetic_corpus(str(tmp_path / 'a'), count=5, seed=3, max_pages=3)
+    second = generate_synthetic_corpus(str(tmp_path / 'b'), count=5, seed=3, max_pages=3)
+    assert [Path(path).name for path in first] == [Path(path).name for path in second]
+    for a, b in zip(first, second):
+        assert Path(a).read_bytes() == Path(b).read_bytes()
+
+
+def test_corpus_with_matching_manifest_is_reused(tmp_path):
+    paths = generate_synthetic_corpus(str(tmp_path), count=4, seed=3, max_pages=2)
+    written = {path: (os.stat(path).st_mtime_ns, Path(path).read_bytes()) for path in paths}
+
+    assert generate_synthetic_corpus(str(tmp_path), count=4, seed=3, max_pages=2) == paths
+    assert {path: os.stat(path).st_mtime_ns for path in paths} == {path: w[0] for path, w in written.items()}
+
+    # Other parameters regenerate the corpus
+    reseeded = generate_synthetic_corpus(str(tmp_path), count=4, seed=4, max_pages=2)
+    assert [Path(path).read_bytes() for path in reseeded] != [w[1] for w in written.values()]
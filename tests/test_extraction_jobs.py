@@ -0,0 +1,121 @@
+import os
+import time
+import json
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import extraction_jobs
+from extraction_jobs import FAILED, SUCCEEDED, JobService, JobStore, handle_request
+from universal_pdf_extractor import _init_batch_worker
+
+
+def _fake_extract(pdf_path):
+    name = os.path.basename(pdf_path)
+    if name == 'slow.pdf':
+        time.sleep(30)
+    if name == 'crash.pdf':
+        os._exit(3)
+    time.sleep(0.2)
+    return {'ok': True, 'result': {'data': {'PO_NUMBER': name}}, 'elapsed_ms': 1.0}
+
+
+@pytest.fixture
+def service_factory(tmp_path, rules_file, monkeypatch):
+    # Forked pool processes see the patched extraction function
+    monkeypatch.setattr(extraction_jobs, '_extract_batch_item', _fake_extract)
+    monkeypatch.setattr(JobService, '_new_executor', lambda self: ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_batch_worker, initargs=(self.extractor_options,)))
+
+    def factory(**options):
+        store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+        return JobService(store, workers=3, extractor_options={'rules_path': str(rules_file)}, **options)
+    return factory
+
+
+def _pdf(tmp_path, name):
+    path = tmp_path / f"{name}.pdf"
+    path.write_bytes(name.encode())
+    return str(path)
+
+
+def test_submissions_are_deduplicated_until_rules_change(tmp_path, rules_file, service_factory):
+    async def run():
+        service = service_factory()
+        await service.start()
+        try:
+            first = await service.submit(_pdf(tmp_path, 'a'))
+            in_flight = await service.submit(_pdf(tmp_path, 'a'))
+            assert in_flight['deduplicated'] and in_flight['job_id'] == first['job_id']
+
+            job = await service.wait(first['job_id'], 20)
+            assert job['status'] == SUCCEEDED
+            assert job['result']['data'] == {'PO_NUMBER': 'a.pdf'}
+            done = await service.submit(_pdf(tmp_path, 'a'))
+            assert done['deduplicated'] and done['job_id'] == first['job_id']
+            assert not (await service.submit(_pdf(tmp_path, 'b')))['deduplicated']
+
+            document = json.loads(rules_file.read_text(encoding='utf-8'))
+            document['fields']['PO_NUMBER']['rules'].append({'pattern': r'Ref\s+(\d+)'})
+            rules_file.write_text(json.dumps(document), encoding='utf-8')
+            stat = os.stat(rules_file)
+            os.utime(rules_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            assert not (await service.submit(_pdf(tmp_path, 'a')))['deduplicated']
+        finally:
+            await service.stop()
+    asyncio.run(run())
+
+
+def test_timeout_and_crash_fail_only_their_own_job(tmp_path, service_factory):
+    async def run():
+        service = service_factory(job_timeout=2)
+        await service.start()
+        try:
+            jobs = {name: (await service.submit(_pdf(tmp_path, name)))['job_id'] for name in ('slow', 'crash', 'b')}
+            finished = {name: await service.wait(job_id, 30) for name, job_id in jobs.items()}
+        finally:
+            await service.stop()
+
+        assert finished['slow']['status'] == FAILED
+        assert 'timed out' in finished['slow']['error']
+        assert finished['slow']['attempts'] == 1
+        assert finished['crash']['status'] == FAILED
+        assert finished['crash']['attempts'] == extraction_jobs.MAX_ATTEMPTS
+        assert finished['b']['status'] == SUCCEEDED
+        assert finished['b']['attempts'] == 1
+    asyncio.run(run())
+
+
+def test_unfinished_jobs_resume_after_restart(tmp_path, service_factory):
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    job = store.add(_pdf(tmp_path, 'c'), 'digest', 0)
+    store.mark_running(job['job_id'])
+    store.close()
+
+    async def run():
+        service = service_factory()
+        await service.start()
+        try:
+            return await service.wait(job['job_id'], 20)
+        finally:
+            await service.stop()
+    assert asyncio.run(run())['status'] == SUCCEEDED
+
+
+def test_requests_report_errors(tmp_path, service_factory):
+    async def run():
+        service = service_factory()
+        await service.start()
+        try:
+            missing = await handle_request(service, {'id': 1, 'cmd': 'submit', 'pdf_path': str(tmp_path / 'x.pdf')})
+            unknown = await handle_request(service, {'id': 2, 'cmd': 'status', 'job_id': 'nope'})
+            return missing, unknown
+        finally:
+            await service.stop()
+
+    missing, unknown = asyncio.run(run())
+    assert missing['id'] == 1 and not missing['ok']
+    assert unknown['id'] == 2 and not unknown['ok']
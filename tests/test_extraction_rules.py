@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+from extraction_rules import RuleSetError, load_rule_set
+from universal_pdf_extractor import UniversalPDFExtractor
+
+TEXT = "Purchase Order No: PO-77\nOrder Ref ZX-4410\nQty: 14 Kg\n"
+
+
+def _edit(path, change):
+    document = json.loads(path.read_text(encoding='utf-8'))
+    change(document)
+    path.write_text(json.dumps(document), encoding='utf-8')
+    # Make the edit visible to the stat check even within one timestamp tick
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_shipped_rules_compile():
+    rules = load_rule_set()
+    rules.compile_all()
+    assert rules.version
+    assert 'PO_NUMBER' in rules.field_patterns
+
+
+def test_changed_fields_lists_only_edited_fields(rules_file):
+    before = load_rule_set(rules_file)
+    _edit(rules_file, lambda document: document['fields']['PO_NUMBER']['rules'].insert(
+        0, {'pattern': r'Order Ref\s+([A-Z]{2}-\d+)'}))
+    after = load_rule_set(rules_file)
+    assert after.changed_fields(before.digests) == ['PO_NUMBER']
+
+
+def test_reload_picks_up_edited_rules(rules_file):
+    extractor = UniversalPDFExtractor(use_templates=False, rules_path=str(rules_file))
+    assert extractor.extract_from_text(TEXT)['data']['PO_NUMBER'] == 'PO-77'
+    assert not extractor.reload_rules()
+
+    _edit(rules_file, lambda document: document['fields']['PO_NUMBER']['rules'].insert(
+        0, {'pattern': r'Order Ref\s+([A-Z]{2}-\d+)'}))
+    assert extractor.reload_rules()
+    result = extractor.extract_from_text(TEXT)
+    assert result['data']['PO_NUMBER'] == 'ZX-4410'
+    assert result['model_info']['rules']['digests'] == extractor.rules.digests
+
+
+def test_bad_rule_file_keeps_current_rules(rules_file):
+    extractor = UniversalPDFExtractor(use_templates=False, rules_path=str(rules_file))
+    version = extractor.rules.version
+    _edit(rules_file, lambda document: document['fields']['PO_NUMBER']['rules'].insert(0, {'pattern': '(unclosed'}))
+
+    assert not extractor.reload_rules()
+    assert extractor.rules_error
+    assert extractor.rules.version == version
+    assert extractor.extract_from_text(TEXT)['data']['PO_NUMBER'] == 'PO-77'
+
+
+def test_missing_core_field_is_rejected(rules_file):
+    _edit(rules_file, lambda document: document['fields'].pop('PO_NUMBER'))
+    with pytest.raises(RuleSetError):
+        UniversalPDFExtractor(use_templates=False, rules_path=str(rules_file))
+
+
+def test_reextract_fields_updates_only_changed_fields(rules_file):
+    extractor = UniversalPDFExtractor(use_templates=False, rules_path=str(rules_file))
+    result = extractor.extract_from_text(TEXT)
+    _edit(rules_file, lambda document: document['fields']['PO_NUMBER']['rules'].insert(
+        0, {'pattern': r'Order Ref\s+([A-Z]{2}-\d+)'}))
+    extractor.reload_rules()
+
+    assert extractor.reextract_fields(result, TEXT) == ['PO_NUMBER']
+    assert result['data'] == extractor.extract_from_text(TEXT)['data']
+    assert result['model_info']['reextracted']['fields'] == ['PO_NUMBER']
@@ -0,0 +1,39 @@
+import pytest
+
+from conftest import HRV_PDF, VORICONAZOLE_PDF
+from universal_pdf_extractor import CORE_FIELDS, DOCUMENT_FORMATS, GENERIC_FORMAT, FormatRegistry, UniversalPDFExtractor
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('BUYER AND CONSIGNEE\nMedist FZE', 'medist_format'),
+    ('Vana Darou Gostar Co.', 'vdg_format'),
+    ('Table 1\nMaterial  Quantity', 'table_format'),
+    ('Purchase Order\nTo: ACME', 'standard_format'),
+    ('Purchase Order\nMaterial: Foo', 'generic_format'),
+])
+def test_detect_picks_first_matching_format(text, expected):
+    detected, _ = FormatRegistry(DOCUMENT_FORMATS, GENERIC_FORMAT).detect(text)
+    assert detected.name == expected
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return UniversalPDFExtractor()
+
+
+def test_template_route(extractor):
+    routing = extractor.extract_from_pdf(str(HRV_PDF))['model_info']['routing']
+    assert routing['route'] == 'coordinate_template'
+
+
+def test_pattern_route(extractor):
+    result = extractor.extract_from_pdf(str(VORICONAZOLE_PDF))
+    data = result['data']
+    routing = result['model_info']['routing']
+    assert routing['route'] == 'strategies'
+    assert routing['format'] == result['model_info']['detected_format']
+    assert set(CORE_FIELDS) <= set(data)
+    assert data['PO_ISSUER_NAME'] == 'ION GLOBAL RAW MATERIALS TRADING LLC'
+    assert data['PO_ISSUER_ADDRESS'] == 'Office No. T-36-018'
+    assert data['QUANTITY'] == 10
+    assert data['CURRENCY'] == 'USD'
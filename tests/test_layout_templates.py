@@ -0,0 +1,67 @@
+import pytest
+
+from conftest import HRV_PDF, NHG_PDF, VORICONAZOLE_PDF
+from universal_pdf_extractor import UniversalPDFExtractor
+
+HRV_FIELDS = {
+    'PO_NUMBER': 'HRVPOR2526-0106',
+    'PO_ISSUER_NAME': 'HRV GLOBAL LIFE SCIENCES PRIVATE LIMITED',
+    'PO_ISSUER_ADDRESS': "#8-2-269/W/4, 1st Floor, Plot No. 4\nWomen's Co-operative Society, Road No. 2,\n"
+                         "Banjara Hills,\nHyderabad Telangana 500034\nIndia",
+    'GSTIN': '36AADCH6322C1Z0',
+    'CONTACT_NUMBER': '040-23554992',
+    'MATERIAL': 'Ubidecarenone (CO ENZYME Q 10)',
+    'QUANTITY': 300,
+    'UNIT_PRICE': '14750.30',
+    'TOTAL_AMOUNT': '4429515.00',
+    'CURRENCY': 'INR',
+    'MANUFACTURER': 'INDOVEDIC NUTRIENTS PRIVATE LIMITED',
+    'DELIVERY_TERMS': 'FREE DELIVERY TO WAREHOUSE',
+    'PAYMENT_TERMS': '90 days credit from the date of GRN',
+    'ORDER_DATE': '20 Sep 2025',
+}
+
+NHG_FIELDS = {
+    'PO_NUMBER': 'NHGPOR2526-00024',
+    'PO_ISSUER_NAME': 'NHG LIFE SCIENCES PRIVATE LIMITED',
+    'PO_ISSUER_ADDRESS': '1st Floor, 8/2/269/S/88, Sagar Society,\nRoad No. 2, Banjara Hills\n'
+                         'Hyderabad Telangana 500034\nIndia',
+    'GSTIN': None,
+    'CONTACT_NUMBER': '040 - 2355 4991 / 992',
+    'MATERIAL': 'Sumatriptan succinate EP Grade',
+    'QUANTITY': 2,
+    'UNIT_PRICE': '40000.00',
+    'TOTAL_AMOUNT': '94400.00',
+    'CURRENCY': 'INR',
+    'MANUFACTURER': 'SYNERGENE ACTIVE INGREDIENTS PVT LTD',
+    'DELIVERY_TERMS': 'FREE DELIVERY TO WAREHOUSE',
+    'PAYMENT_TERMS': '30 days credit from the date of GRN',
+    'ORDER_DATE': '20/09/2025',
+}
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return UniversalPDFExtractor()
+
+
+@pytest.mark.parametrize('pdf_path, expected, detected_format', [
+    (HRV_PDF, HRV_FIELDS, 'hrv_po'),
+    (NHG_PDF, NHG_FIELDS, 'nhg_po'),
+])
+def test_template_layouts(extractor, pdf_path, expected, detected_format):
+    result = extractor.extract_from_pdf(str(pdf_path))
+    assert result['data'] == expected
+    assert result['model_info']['extraction_method'] == 'Coordinate template'
+    assert result['model_info']['detected_format'] == detected_format
+
+
+def test_other_layouts_fall_back_to_patterns(extractor):
+    result = extractor.extract_from_pdf(str(VORICONAZOLE_PDF))
+    assert result['model_info']['extraction_method'] != 'Coordinate template'
+    assert result['data']['PO_NUMBER']
+
+
+def test_templates_can_be_disabled():
+    result = UniversalPDFExtractor(use_templates=False).extract_from_pdf(str(HRV_PDF))
+    assert result['model_info']['extraction_method'] != 'Coordinate template'
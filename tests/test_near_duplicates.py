@@ -0,0 +1,78 @@
+import time
+
+import fitz
+
+from near_duplicates import NearDuplicateIndex, changed_lines, diff_fields, minhash_signature
+from universal_pdf_extractor import UniversalPDFExtractor
+
+TEXT = '\n'.join(
+    [f"Line {number} of the purchase order for batch {number * 7} item code X{number}" for number in range(60)]
+    + ['Purchase Order No: PO-1001', 'Order Date: 01/02/2024'])
+
+
+def test_find_after_add(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'dup.db'))
+    signature = minhash_signature(TEXT)
+    assert index.find(signature) is None
+
+    doc_id = index.add(signature, 'first.pdf', TEXT, {'data': {'PO_NUMBER': 'PO-1001'}})
+    edited = TEXT.replace('01/02/2024', '03/02/2024')
+    match = index.find(minhash_signature(edited))
+    assert match['doc_id'] == doc_id
+    assert match['source'] == 'first.pdf'
+    assert match['text'] == TEXT
+    assert match['result'] == {'data': {'PO_NUMBER': 'PO-1001'}}
+    assert changed_lines(match['text'], edited)[0] == ['Order Date: 01/02/2024']
+
+
+def test_unrelated_text_and_other_version_do_not_match(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'dup.db'), version='1')
+    index.add(minhash_signature(TEXT), None, TEXT, {})
+    other = 'Invoice for consulting services rendered in March, payable within thirty days of receipt'
+    assert index.find(minhash_signature(other)) is None
+    index.close()
+
+    assert NearDuplicateIndex(str(tmp_path / 'dup.db'), version='2').find(minhash_signature(TEXT)) is None
+
+
+def test_prune_by_count_and_age(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'dup.db'), max_documents=3, max_age_days=None)
+    for number in range(5):
+        text = f"{TEXT}\nRevision {number}"
+        index.add(minhash_signature(text), f"{number}.pdf", text, {})
+    assert index.prune() == 2
+    assert len(index) == 3
+    assert index.connection.execute('SELECT COUNT(DISTINCT doc_id) FROM bands').fetchone()[0] == 3
+    index.close()
+
+    aged = NearDuplicateIndex(str(tmp_path / 'dup.db'), max_documents=None, max_age_days=None)
+    aged.connection.execute('UPDATE documents SET added_at = ?', (time.time() - 10 * 86400,))
+    aged.close()
+    # Opening with an age limit prunes right away
+    assert len(NearDuplicateIndex(str(tmp_path / 'dup.db'), max_age_days=7)) == 0
+
+
+def test_diff_fields():
+    assert diff_fields({'A': 1, 'B': 2}, {'A': 1, 'B': 3, 'C': None}) == {'B': {'previous': 2, 'current': 3}}
+
+
+def _po_pdf(path, quantity):
+    doc = fitz.open()
+    lines = [f"Clause {number}: goods are supplied under batch {number * 7} and code X{number}"
+             for number in range(40)]
+    page = doc.new_page()
+    page.insert_text((40, 40), f"Purchase Order No: PO-1001\nQty: {quantity} Kg\n" + '\n'.join(lines), fontsize=7)
+    doc.save(str(path))
+    return str(path)
+
+
+def test_extractor_reuses_near_duplicate_result(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'dup.db'))
+    extractor = UniversalPDFExtractor(use_templates=False, duplicate_index=index)
+    first = extractor.extract_from_pdf(_po_pdf(tmp_path / 'first.pdf', 14))
+    assert first['data']['QUANTITY'] == 14 and len(index) == 1
+
+    second = extractor.extract_from_pdf(_po_pdf(tmp_path / 'second.pdf', 25))
+    assert second['model_info']['routing']['route'] == 'near_duplicate'
+    assert second['near_duplicate']['changed_fields'] == {'QUANTITY': {'previous': 14, 'current': 25}}
+    assert second['data'] == {**first['data'], 'QUANTITY': 25}
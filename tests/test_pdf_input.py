@@ -0,0 +1,40 @@
+import sys
+import json
+import subprocess
+
+import pytest
+
+from conftest import HRV_PDF, REPO_ROOT, VORICONAZOLE_PDF
+from pdf_text_cache import PDFTextCache
+from universal_pdf_extractor import UniversalPDFExtractor, mapped_pdf
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return UniversalPDFExtractor()
+
+
+@pytest.mark.parametrize('pdf_path', [HRV_PDF, VORICONAZOLE_PDF])
+def test_memory_sources_match_path(extractor, pdf_path):
+    by_path = extractor.extract_from_pdf(str(pdf_path))
+    pdf_bytes = pdf_path.read_bytes()
+    assert extractor.extract_from_pdf(pdf_bytes)['data'] == by_path['data']
+    assert extractor.extract_from_pdf(bytearray(pdf_bytes))['data'] == by_path['data']
+    with mapped_pdf(str(pdf_path)) as view:
+        assert extractor.extract_from_pdf(view)['data'] == by_path['data']
+
+
+def test_cache_key_is_shared_by_path_and_bytes(tmp_path):
+    extractor = UniversalPDFExtractor(text_cache=PDFTextCache(str(tmp_path)), use_templates=False)
+    extractor.extract_from_pdf(str(VORICONAZOLE_PDF))
+    extractor.extract_from_pdf(VORICONAZOLE_PDF.read_bytes())
+    assert extractor.text_cache.stats()['hits'] == 1
+
+
+def test_stdin_input(extractor, tmp_path):
+    output = tmp_path / 'result.json'
+    subprocess.run([sys.executable, str(REPO_ROOT / 'universal_pdf_extractor.py'), '--pdf_path', '-',
+                    '--output_file', str(output)],
+                   input=VORICONAZOLE_PDF.read_bytes(), capture_output=True, check=True)
+    result = json.loads(output.read_text(encoding='utf-8'))
+    assert result['data'] == extractor.extract_from_pdf(str(VORICONAZOLE_PDF))['data']
@@ -0,0 +1,43 @@
+from unittest import mock
+
+import fitz
+
+from conftest import HRV_PDF, VORICONAZOLE_PDF
+from pdf_text_cache import PDFTextCache
+from universal_pdf_extractor import UniversalPDFExtractor
+
+
+def test_get_put_and_version(tmp_path):
+    cache = PDFTextCache(str(tmp_path), version='1')
+    key = cache.key_for(b'%PDF-1.4 example')
+    assert cache.get(key) is None
+    cache.put(key, ['page one', 'page two'], {'width': 1, 'height': 2, 'words': []})
+    assert cache.get(key) == ['page one', 'page two']
+    assert cache.get_layout(key) == {'width': 1, 'height': 2, 'words': []}
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    # Another version neither shares keys nor reads the entry
+    other = PDFTextCache(str(tmp_path), version='2')
+    assert other.key_for(b'%PDF-1.4 example') != key
+    assert other.get(key) is None
+
+
+def test_eviction_keeps_cache_under_cap(tmp_path):
+    cache = PDFTextCache(str(tmp_path), max_bytes=2000)
+    for number in range(20):
+        cache.put(cache.key_for(str(number).encode()), ['x' * 300])
+    assert cache.evictions > 0
+    assert cache._scan_size() <= 2000
+
+
+def test_repeat_extraction_never_opens_the_pdf(tmp_path):
+    extractor = UniversalPDFExtractor(text_cache=PDFTextCache(str(tmp_path)))
+    first = {path: extractor.extract_from_pdf(str(path)) for path in (HRV_PDF, VORICONAZOLE_PDF)}
+    assert extractor.text_cache.stats()['misses'] == 2
+
+    with mock.patch.object(fitz, 'open') as opened:
+        for path, result in first.items():
+            assert result['data']['PO_NUMBER']
+            assert extractor.extract_from_pdf(str(path))['data'] == result['data']
+    opened.assert_not_called()
+    assert extractor.text_cache.stats()['hits'] == 2
@@ -0,0 +1,61 @@
+import csv
+import json
+
+import pytest
+
+from result_export import COLUMN_NAMES, SCHEMA, CsvChunkWriter, ExtractionRecord, export_ndjson, open_exporter
+
+RECORDS = [
+    {'path': 'a.pdf', 'ok': True, 'elapsed_ms': 12.5, 'result': {
+        'data': {'PO_NUMBER': 'PO-1', 'QUANTITY': '1,250.5 Kg', 'CURRENCY': 'USD'},
+        'confidence': 0.9, 'entities_found': 3,
+        'model_info': {'detected_format': 'hrv_po', 'routing': {'route': 'template'}}}},
+    {'path': 'b.pdf', 'ok': True, 'result': {'data': {'QUANTITY': '1e999'}}},
+    {'path': 'c.pdf', 'ok': False, 'error': 'not a PDF'},
+]
+
+
+@pytest.fixture
+def ndjson(tmp_path):
+    path = tmp_path / 'batch.ndjson'
+    path.write_text('\n'.join(json.dumps(record) for record in RECORDS) + '\nnot json\n', encoding='utf-8')
+    return str(path)
+
+
+def test_quantity_is_parsed_as_float():
+    rows = [ExtractionRecord.from_batch_record(record) for record in RECORDS]
+    assert rows[0].quantity == 1250.5
+    assert rows[1].quantity is None
+    assert rows[2].quantity is None and rows[2].error == 'not a PDF'
+
+
+def test_parquet_round_trip(tmp_path, ndjson):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+
+    summary = export_ndjson([ndjson], open_exporter(str(tmp_path / 'out.parquet')))
+    assert summary['rows'] == 3 and summary['skipped_lines'] == 1
+
+    table = pyarrow.parquet.read_table(summary['paths'][0])
+    assert table.schema == pyarrow.schema([(name, getattr(pyarrow, kind)()) for name, kind in SCHEMA])
+    rows = table.to_pylist()
+    assert rows[0]['po_number'] == 'PO-1'
+    assert rows[0]['quantity'] == 1250.5
+    assert rows[0]['detected_format'] == 'hrv_po'
+    assert rows[0]['route'] == 'template'
+    assert [row['ok'] for row in rows] == [True, True, False]
+
+
+def test_csv_chunks_round_trip(tmp_path, ndjson):
+    summary = export_ndjson([ndjson], CsvChunkWriter(str(tmp_path / 'out.csv'), chunk_rows=2))
+    assert len(summary['paths']) == 2
+
+    rows = []
+    for path in summary['paths']:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            assert tuple(next(reader)) == COLUMN_NAMES
+            rows.extend(reader)
+    assert [row[0] for row in rows] == ['a.pdf', 'b.pdf', 'c.pdf']
+    quantity = COLUMN_NAMES.index('quantity')
+    assert float(rows[0][quantity]) == 1250.5 and rows[1][quantity] == ''
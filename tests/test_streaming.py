@@ -0,0 +1,59 @@
+import fitz
+import pytest
+
+from universal_pdf_extractor import UniversalPDFExtractor
+
+FIRST_PAGE = ("Purchase Order No: PO-77\nTel: +91 9876543210\nMaterial: Foo USP\nQty: 14 Kg\n"
+              "Price: USD 6.00/Kg\nTotal: USD 84\nAddress: 1 Road\nBuyer: ACME Ltd\n"
+              "Manufacturer: Foo Pharma Ltd\nDelivery Term: FOB Mumbai\n"
+              "Payment Condition: 30 days from invoice\nOrder Date: 01/02/2024")
+
+
+@pytest.fixture
+def long_pdf(tmp_path):
+    """A one-page PO followed by 40 pages of annex text"""
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 60), FIRST_PAGE, fontsize=10)
+    for page_num in range(40):
+        doc.new_page().insert_text((40, 40), f"Clause {page_num}: terms and conditions apply.", fontsize=8)
+    path = tmp_path / 'long.pdf'
+    doc.save(str(path))
+    return str(path)
+
+
+def test_streaming_stops_once_fields_resolve(long_pdf):
+    streamed = UniversalPDFExtractor(streaming=True).extract_from_pdf(long_pdf)
+    full = UniversalPDFExtractor().extract_from_pdf(long_pdf)
+    assert streamed['model_info']['page_scan']['stop_reason'] == 'stop_fields_resolved'
+    assert streamed['pages_read'] == 1
+    assert streamed['data'] == full['data']
+
+
+def test_stop_fields_are_configurable(tmp_path):
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 60), FIRST_PAGE.split('\nManufacturer')[0], fontsize=10)
+    for page_num in range(5):
+        doc.new_page().insert_text((40, 40), f"Clause {page_num}: terms and conditions apply.", fontsize=8)
+    doc[3].insert_text((40, 80), "Order Date: 05/06/2024", fontsize=8)
+    path = tmp_path / 'dated.pdf'
+    doc.save(str(path))
+
+    core = UniversalPDFExtractor(streaming=True).extract_from_pdf(str(path))
+    assert core['pages_read'] == 1 and 'ORDER_DATE' not in core['data']
+
+    dated = UniversalPDFExtractor(streaming=True, stop_fields=['ORDER_DATE']).extract_from_pdf(str(path))
+    assert dated['model_info']['page_scan']['stop_reason'] == 'stop_fields_resolved'
+    assert dated['pages_read'] == 4
+    assert dated['data']['ORDER_DATE'] == '05/06/2024'
+
+
+def test_page_budget_stops_unresolved_scan(tmp_path):
+    doc = fitz.open()
+    for page_num in range(10):
+        doc.new_page().insert_text((40, 40), f"Clause {page_num}: terms and conditions apply.", fontsize=8)
+    path = tmp_path / 'annex.pdf'
+    doc.save(str(path))
+
+    scan = UniversalPDFExtractor(max_pages=3).extract_from_pdf(str(path))['model_info']['page_scan']
+    assert scan['stop_reason'] == 'page_budget'
+    assert scan['pages_read'] == 3 and scan['page_count'] == 10
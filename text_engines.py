@@ -0,0 +1,271 @@
+"""
+Pluggable PDF Text Engines
+
+One interface over the libraries we read page text with. PyMuPDF is fast and
+reads nearly every PO correctly; pdfplumber is several times slower but copes
+better with pages whose text layer PyMuPDF returns scrambled. PageTextReader
+reads every page with the primary engine and re-reads a page with the
+fallback only when a cheap quality check on its text fails, timing each
+engine separately so the cost of the fallback stays visible.
+"""
+
+import io
+import os
+import time
+import logging
+from importlib.util import find_spec
+from typing import Callable, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# A PDF given by path, or held in memory as bytes, a bytearray or a memoryview
+PDFSource = Union[str, os.PathLike, bytes, bytearray, memoryview]
+
+# Pages with fewer words than this are re-read with the fallback engine
+MIN_PAGE_WORDS = 3
+
+# Above this share of one-letter tokens, words have been split into letters
+MAX_SINGLE_CHAR_RATIO = 0.5
+
+# Above this share of U+FFFD characters, the font encoding was not understood
+MAX_REPLACEMENT_RATIO = 0.02
+
+# This many lines averaging fewer words per line mean a cell-by-cell dump
+BROKEN_ORDER_MIN_LINES = 40
+MIN_WORDS_PER_LINE = 1.2
+
+ENGINE_POLICIES = ('auto', 'pymupdf', 'pdfplumber')
+
+
+def in_memory(pdf_source: PDFSource) -> bool:
+    return isinstance(pdf_source, (bytes, bytearray, memoryview))
+
+
+def import_pymupdf():
+    """
+    Import PyMuPDF on first use. Releases since 1.24.3 name the module
+    pymupdf and print a deprecation notice to stdout when imported as fitz,
+    which would corrupt machine-readable output.
+    """
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf
+
+
+def open_pdf(pdf_source: PDFSource):
+    """Open a PDF with PyMuPDF, straight from memory when given bytes"""
+    pymupdf = import_pymupdf()
+    if in_memory(pdf_source):
+        return pymupdf.open(stream=pdf_source, filetype='pdf')
+    return pymupdf.open(pdf_source)
+
+
+def page_quality_issue(text: str) -> Optional[str]:
+    """Name the first reason a page's text looks unusable, or None if it looks fine"""
+    words = text.split()
+    if not words:
+        # No text layer at all (a scanned page); no text engine can do better
+        return None
+    if len(words) < MIN_PAGE_WORDS:
+        return 'too_few_words'
+    if text.count('\ufffd') > MAX_REPLACEMENT_RATIO * len(text):
+        return 'unknown_glyphs'
+    single_chars = sum(1 for word in words if len(word) == 1 and word.isalpha())
+    if single_chars > MAX_SINGLE_CHAR_RATIO * len(words):
+        return 'split_words'
+    lines = sum(1 for line in text.splitlines() if line.strip())
+    if lines >= BROKEN_ORDER_MIN_LINES and len(words) < MIN_WORDS_PER_LINE * lines:
+        return 'broken_reading_order'
+    return None
+
+
+class TextEngine:
+    """Reads the plain text of PDF pages with one library"""
+
+    name = None
+
+    def available(self) -> bool:
+        return True
+
+    def open(self, pdf_source: PDFSource):
+        raise NotImplementedError
+
+    def page_count(self, doc) -> int:
+        raise NotImplementedError
+
+    def page_text(self, doc, page_num: int) -> str:
+        raise NotImplementedError
+
+    def close(self, doc):
+        doc.close()
+
+
+class PyMuPDFEngine(TextEngine):
+    name = 'pymupdf'
+
+    def available(self) -> bool:
+        # Checked without importing, so building a reader stays cheap
+        return find_spec('pymupdf') is not None or find_spec('fitz') is not None
+
+    def open(self, pdf_source: PDFSource):
+        return open_pdf(pdf_source)
+
+    def page_count(self, doc) -> int:
+        return doc.page_count
+
+    def page_text(self, doc, page_num: int) -> str:
+        return doc[page_num].get_text()
+
+
+class PdfplumberEngine(TextEngine):
+    name = 'pdfplumber'
+
+    def available(self) -> bool:
+        return find_spec('pdfplumber') is not None
+
+    def open(self, pdf_source: PDFSource):
+        import pdfplumber
+        if in_memory(pdf_source):
+            # pdfplumber needs a file object; only fallback pages pay for this copy
+            return pdfplumber.open(io.BytesIO(pdf_source))
+        return pdfplumber.open(pdf_source)
+
+    def page_count(self, doc) -> int:
+        return len(doc.pages)
+
+    def page_text(self, doc, page_num: int) -> str:
+        page = doc.pages[page_num]
+        try:
+            return page.extract_text() or ''
+        finally:
+            # Release the page's parsed objects so long documents stay flat
+            page.close()
+
+
+ENGINES = {engine.name: engine for engine in (PyMuPDFEngine, PdfplumberEngine)}
+
+
+class EngineTimings:
+    """Pages read and wall time spent per engine, plus why pages fell back"""
+
+    def __init__(self):
+        self.pages = {}
+        self.ms = {}
+        self.fallbacks = {}
+
+    def add(self, engine: str, elapsed_ms: float, pages: int = 0):
+        self.pages[engine] = self.pages.get(engine, 0) + pages
+        self.ms[engine] = self.ms.get(engine, 0.0) + elapsed_ms
+
+    def add_fallback(self, reason: str):
+        self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+
+    def merge(self, other: 'EngineTimings'):
+        for engine, elapsed_ms in other.ms.items():
+            self.add(engine, elapsed_ms, other.pages[engine])
+        for reason, count in other.fallbacks.items():
+            self.fallbacks[reason] = self.fallbacks.get(reason, 0) + count
+
+    def to_dict(self) -> Dict:
+        return {
+            'engines': {
+                engine: {'pages': self.pages[engine], 'ms': round(self.ms[engine], 3)}
+                for engine in self.ms
+            },
+            'fallbacks': dict(self.fallbacks)
+        }
+
+
+class PageTextReader:
+    """
+    Per-page engine policy: read with the primary engine and re-read a page
+    with the fallback engine when quality_check reports a problem. The
+    fallback document is only opened once a page needs it.
+    """
+
+    def __init__(self, primary: TextEngine, fallback: Optional[TextEngine] = None,
+                 quality_check: Callable[[str], Optional[str]] = page_quality_issue):
+        self.primary = primary
+        self.fallback = fallback
+        self.quality_check = quality_check
+
+    @property
+    def name(self) -> str:
+        if self.fallback is None:
+            return self.primary.name
+        return f"{self.primary.name}+{self.fallback.name}"
+
+    def page_count(self, pdf_source: PDFSource) -> int:
+        doc = self.primary.open(pdf_source)
+        try:
+            return self.primary.page_count(doc)
+        finally:
+            self.primary.close(doc)
+
+    def iter_pages(self, pdf_source: PDFSource, timings: Optional[EngineTimings] = None,
+                   start: int = 0, stop: Optional[int] = None):
+        """Yield (page_num, page_count, page_text) for pages start..stop, one at a time"""
+        timings = timings if timings is not None else EngineTimings()
+
+        started = time.perf_counter()
+        doc = self.primary.open(pdf_source)
+        fallback_doc = None
+        try:
+            page_count = self.primary.page_count(doc)
+            timings.add(self.primary.name, (time.perf_counter() - started) * 1000)
+            stop = page_count if stop is None else min(stop, page_count)
+
+            for page_num in range(start, stop):
+                started = time.perf_counter()
+                page_text = self.primary.page_text(doc, page_num)
+                timings.add(self.primary.name, (time.perf_counter() - started) * 1000, pages=1)
+
+                issue = self.quality_check(page_text) if self.fallback is not None else None
+                if issue is not None:
+                    started = time.perf_counter()
+                    try:
+                        if fallback_doc is None:
+                            fallback_doc = self.fallback.open(pdf_source)
+                        fallback_text = self.fallback.page_text(fallback_doc, page_num)
+                    except Exception as e:
+                        logger.warning(f"{self.fallback.name} could not read page {page_num + 1}: {e}")
+                        fallback_text = ''
+                    timings.add(self.fallback.name, (time.perf_counter() - started) * 1000, pages=1)
+                    timings.add_fallback(issue)
+                    # Blank pages stay blank either way, so only a better reading replaces the text
+                    if self.quality_check(fallback_text) is None or \
+                            len(fallback_text.split()) > len(page_text.split()):
+                        logger.debug(f"Page {page_num + 1}: {issue}, using {self.fallback.name} text")
+                        page_text = fallback_text
+
+                yield page_num, page_count, page_text
+        finally:
+            self.primary.close(doc)
+            if fallback_doc is not None:
+                self.fallback.close(fallback_doc)
+
+
+def build_page_reader(policy: str = 'auto') -> PageTextReader:
+    """
+    'auto' reads with PyMuPDF and falls back to pdfplumber per page, using
+    whichever one is installed if only one is; 'pymupdf' and 'pdfplumber'
+    use that engine for every page.
+    """
+    if policy not in ENGINE_POLICIES:
+        raise ValueError(f"Unknown text engine policy: {policy}")
+    if policy != 'auto':
+        engine = ENGINES[policy]()
+        if not engine.available():
+            raise ImportError(f"Text engine {policy} is not installed")
+        return PageTextReader(engine)
+
+    primary, fallback = PyMuPDFEngine(), PdfplumberEngine()
+    if not fallback.available():
+        logger.debug("pdfplumber not installed; pages are read with PyMuPDF only")
+        return PageTextReader(primary)
+    if not primary.available():
+        logger.debug("PyMuPDF not installed; pages are read with pdfplumber only")
+        return PageTextReader(fallback)
+    return PageTextReader(primary, fallback)
@@ -7,437 +7,1298 @@ multiple PDF formats using intelligent pattern matching and format detection.
 """
 
 import os
+import sys
+import mmap
 import json
+import math
+import time
 import logging
-import argparse
+import atexit
+# Only the lightweight futures API; the executors are imported by the modes that use them
+from concurrent.futures import FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+from contextlib import ExitStack, contextmanager
+from functools import partial
 from pathlib import Path
-import fitz  # PyMuPDF
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import regex
+
+from extraction_rules import DEFAULT_RULES_PATH, RuleSet, RuleSetError, file_stat, load_rule_set
+from pdf_text_cache import DEFAULT_MAX_BYTES, PDFTextCache
+from text_engines import ENGINE_POLICIES, EngineTimings, PDFSource, build_page_reader, in_memory, open_pdf
+
+# Modules only some modes need are imported on first use, so a cold start
+# pays for the PDF library, profiler, process pools and SQLite only when used
+if TYPE_CHECKING:
+    import cProfile
+    from extraction_metrics import ExtractionMetrics
+    from material_index import MaterialIndex
+    from near_duplicates import NearDuplicateIndex
+    from shadow_runner import ShadowRunner
+
+try:  # Python 3.11+
+    from re import _parser as _sre_parse
+except ImportError:
+    import sre_parse as _sre_parse
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever text extraction changes so cached page text is invalidated
+EXTRACTOR_VERSION = '2'
+
+# Wall-clock limits on pattern searches: one search, and all searches for one
+# document. Searches over the limit are abandoned and recorded in the result.
+PATTERN_TIMEOUT_SECONDS = 0.5
+DOCUMENT_REGEX_BUDGET_SECONDS = 5.0
+
+# Field patterns come from the shipped rule file (see extraction_rules). In
+# priority order, the first pattern that yields a valid value wins; each
+# entry maps an entity key to (regex flags, patterns).
+DEFAULT_RULES = load_rule_set()
+FIELD_PATTERNS = DEFAULT_RULES.field_patterns
+
+# Shortest literal worth using as a pre-filter anchor
+MIN_ANCHOR_LENGTH = 2
+
+# Characters after a label a labeled pattern may match in; a value running
+# to the edge of the window is read again without the bound
+LABEL_WINDOW = 256
+
+# Characters of the previous page probed again with each new page in streaming
+# mode, so a label and its value split by a page break are still found
+STREAM_OVERLAP = 512
+
+
+def _fold_case(text: str) -> str:
+    """Case-fold text the same way re.IGNORECASE compares ASCII literals"""
+    # re.IGNORECASE also matches dotless i against 'i', which casefold() keeps
+    return text.casefold().replace('ı', 'i')
+
+
+def _leading_literal(items) -> Tuple[str, bool]:
+    """Collect the literal characters every match must start with"""
+    chars = []
+    for op, av in items:
+        name = op.name
+        if name == 'LITERAL' and av < 128:
+            chars.append(chr(av))
+        elif name == 'AT':
+            continue
+        elif name == 'SUBPATTERN':
+            inner, complete = _leading_literal(av[-1])
+            chars.append(inner)
+            if not complete:
+                return ''.join(chars), False
+        else:
+            return ''.join(chars), False
+    return ''.join(chars), True
+
+
+def _literal_anchor(pattern: str, flags: int) -> Optional[str]:
+    """Derive the literal prefix of a pattern, or None if it has no usable one"""
+    try:
+        prefix, _ = _leading_literal(_sre_parse.parse(pattern, flags))
+    except Exception:
+        return None
+    if len(prefix) < MIN_ANCHOR_LENGTH:
+        return None
+    return _fold_case(prefix) if flags & re.IGNORECASE else prefix
+
+
+def _is_label(anchor: Optional[str]) -> bool:
+    """Literal prefixes starting with a letter are labels ("Qty:", "Date:"); others are values"""
+    return anchor is not None and anchor[0].isalpha()
+
+
+class ScanText:
+    """Document text plus the case-folded copy and label index shared by every field scan"""
+    
+    __slots__ = ('text', '_folded', '_labels')
+    
+    def __init__(self, text: str):
+        self.text = text
+        self._folded = None
+        # (label, folded) -> first offset and word-initial offsets of the label
+        self._labels = {}
+    
+    @property
+    def folded(self) -> str:
+        if self._folded is None:
+            self._folded = _fold_case(self.text)
+        return self._folded
+    
+    @property
+    def aligned(self) -> bool:
+        """True when offsets in the folded copy match offsets in the text"""
+        return len(self.folded) == len(self.text)
+    
+    def label_positions(self, label: str, fold: bool) -> Tuple[int, List[int]]:
+        """
+        The first offset of a label, or -1, and the offsets where it starts
+        a word, so "Date:" is not taken from "Update:". Each label is located
+        once per document, on first use, and shared by every pattern anchored
+        on it.
+        """
+        key = (label, fold)
+        found = self._labels.get(key)
+        if found is None:
+            haystack = self.folded if fold else self.text
+            first = position = haystack.find(label)
+            positions = []
+            while position >= 0:
+                if position == 0 or not (haystack[position - 1].isalnum() or haystack[position - 1] == '_'):
+                    positions.append(position)
+                position = haystack.find(label, position + 1)
+            found = self._labels[key] = (first, positions)
+        return found
+
+
+class RegexBudget:
+    """Time left for the pattern searches of one document, and the searches skipped"""
+    
+    __slots__ = ('document_seconds', 'pattern_seconds', 'deadline', 'skipped')
+    
+    def __init__(self, document_seconds: Optional[float], pattern_seconds: Optional[float]):
+        self.document_seconds = document_seconds
+        self.pattern_seconds = pattern_seconds
+        self.deadline = time.perf_counter() + document_seconds if document_seconds else None
+        self.skipped = []
+    
+    def timeout(self) -> Tuple[Optional[float], str]:
+        """Seconds the next search may take, and which limit that comes from"""
+        if self.deadline is None:
+            return self.pattern_seconds, 'pattern_timeout'
+        remaining = self.deadline - time.perf_counter()
+        if self.pattern_seconds and self.pattern_seconds < remaining:
+            return self.pattern_seconds, 'pattern_timeout'
+        return remaining, 'document_budget'
+    
+    def skip(self, field: str, index: int, reason: str):
+        # Once the document budget is spent every remaining search is skipped; say so once
+        if reason == 'pattern_timeout' or not any(entry["reason"] == reason for entry in self.skipped):
+            logger.warning(f"Skipped {field} pattern {index}: {reason}")
+        self.skipped.append({"field": field, "pattern_index": index, "reason": reason})
+
+
+# Returned for a search abandoned under the regex budget; ends the pattern's label loop
+SKIPPED = object()
+
+
+class FieldPatternSet:
+    """Precompiled, priority-ordered patterns for one extraction field"""
+    
+    def __init__(self, field: str, flags: int, patterns: List[str], values: Optional[List[Optional[str]]] = None,
+                 compiled: Optional[list] = None):
+        self.field = field
+        self.flags = flags
+        self.sources = list(patterns)
+        # Value reported for a match of each pattern, None to read it from the match
+        self.values = list(values) if values is not None else [None] * len(self.sources)
+        # The regex package runs the same syntax as re, plus atomic groups and search
+        # timeouts. Patterns compile on first use: most fields resolve on an early
+        # pattern, and a cold start should not pay for the ones never reached.
+        self._compiled = list(compiled) if compiled is not None else [None] * len(self.sources)
+        self.anchors = [_literal_anchor(pattern, flags) for pattern in patterns]
+        self.labeled = [_is_label(anchor) for anchor in self.anchors]
+        self.fold = bool(flags & re.IGNORECASE)
+    
+    def compiled(self, index: int):
+        pattern = self._compiled[index]
+        if pattern is None:
+            pattern = self._compiled[index] = regex.compile(self.sources[index], self.flags)
+        return pattern
+    
+    def matches(self, scan: ScanText, budget: Optional[RegexBudget] = None):
+        """
+        Yield (index, match) for the first match of each pattern in priority order.
+        
+        Patterns with a literal prefix are checked against the case-folded text
+        first, so a pattern whose label never occurs costs one substring search
+        instead of a regex scan. A pattern that starts with a label is then
+        only tried where the document's label index has that label, each time
+        within LABEL_WINDOW characters of it; with no word-initial occurrence
+        it falls back to searching the whole text from the first one. Under a
+        budget, a search that runs out of time is skipped as if the pattern
+        had not matched.
+        """
+        text = scan.text
+        aligned = not self.fold or scan.aligned
+        for index, anchor in enumerate(self.anchors):
+            position = 0
+            starts = ()
+            if anchor is not None:
+                if aligned and self.labeled[index]:
+                    position, starts = scan.label_positions(anchor, self.fold)
+                else:
+                    position = (scan.folded if self.fold else text).find(anchor)
+                if position < 0:
+                    continue
+                if not aligned:
+                    position = 0
+            
+            pattern = self.compiled(index)
+            if starts:
+                found = None
+                for start in starts:
+                    end = min(start + LABEL_WINDOW, len(text))
+                    # The window bounds the work, so only the document budget applies
+                    found = self._run(pattern.match, index, budget, text, start, end, timed=False)
+                    if found and found is not SKIPPED and found.end() == end < len(text):
+                        found = self._run(pattern.match, index, budget, text, start)
+                    if found:
+                        break
+            else:
+                # No anchor, or a label found only inside words: search on from the first occurrence
+                found = self._run(pattern.search, index, budget, text, position)
+            if found and found is not SKIPPED:
+                yield index, found
+    
+    def _run(self, method, index: int, budget: Optional[RegexBudget], *args, timed: bool = True):
+        """
+        Call a pattern's search or match within the budget, or return SKIPPED.
+        Untimed calls skip the per-search timer, which costs more than a short
+        match, but are still refused once the document budget is spent.
+        """
+        if budget is None:
+            return method(*args)
+        timeout, limit = budget.timeout()
+        if timeout is not None and timeout <= 0:
+            budget.skip(self.field, index, limit)
+            return SKIPPED
+        if not timed:
+            return method(*args)
+        try:
+            return method(*args, timeout=timeout)
+        except TimeoutError:
+            budget.skip(self.field, index, limit)
+            return SKIPPED
+
+
+class PatternRegistry:
+    """All field patterns of one rule set, compiled once per extractor"""
+    
+    def __init__(self, rules: Optional[RuleSet] = None, compiled: Optional[Dict[str, list]] = None):
+        rules = rules or DEFAULT_RULES
+        compiled = compiled or {}
+        self.fields = {
+            field: FieldPatternSet(field, flags, patterns, rules.values.get(field), compiled.get(field))
+            for field, (flags, patterns) in rules.field_patterns.items()
+        }
+        # Single-entry cache so every field scan of a document shares one fold and label index
+        self._last_scan = ScanText('')
+        # While instrumenting: field -> (index of the last match handed out, matches handed out)
+        self.trace = None
+        # Time limits for the document being extracted, if any
+        self.budget = None
+    
+    def scan_text(self, text: str) -> ScanText:
+        scan = self._last_scan
+        if scan.text is not text:
+            scan = ScanText(text)
+            self._last_scan = scan
+        return scan
+    
+    def matches(self, field: str, text: str):
+        """Yield (index, match) pairs for a field in priority order"""
+        matches = self.fields[field].matches(self.scan_text(text), self.budget)
+        if self.trace is None:
+            return matches
+        return self._traced(field, matches)
+    
+    def _traced(self, field: str, matches):
+        count = 0
+        for index, match in matches:
+            count += 1
+            self.trace[field] = (index, count)
+            yield index, match
+    
+    @contextmanager
+    def document_budget(self, document_seconds: Optional[float], pattern_seconds: Optional[float]):
+        """
+        Apply time limits to every search until the block exits. Nested
+        blocks share the outermost budget, so a document is limited as a whole.
+        """
+        if self.budget is not None or not (document_seconds or pattern_seconds):
+            yield self.budget
+            return
+        self.budget = RegexBudget(document_seconds, pattern_seconds)
+        try:
+            yield self.budget
+        finally:
+            self.budget = None
+    
+    def fixed_value(self, field: str, index: int) -> Optional[str]:
+        """The value a rule reports whenever it matches, if it has one"""
+        return self.fields[field].values[index]
+    
+    def first_group(self, field: str, text: str) -> Optional[str]:
+        """Return the stripped first group of the highest-priority match"""
+        for index, match in self.matches(field, text):
+            value = self.fields[field].values[index]
+            return value if value is not None else match.group(1).strip()
+        return None
+
+
+class ExtractionContext:
+    """Per-document field results, so each field extractor runs at most once"""
+    
+    def __init__(self, text: str, field_extractors: Dict, values: Optional[Dict] = None):
+        self.text = text
+        self._field_extractors = field_extractors
+        # Values resolved before assembly (a streaming page scan) are not extracted again
+        self._values = dict(values) if values else {}
+        self.requests = 0
+        self.executed = 0
+    
+    def get(self, field: str):
+        """Return a field value, running its extractor on first request only"""
+        self.requests += 1
+        if field not in self._values:
+            self.executed += 1
+            self._values[field] = self._field_extractors[field](self.text)
+        return self._values[field]
+    
+    @property
+    def saved_calls(self) -> int:
+        return self.requests - self.executed
+
+
+class ExtractionStrategy:
+    """Declarative set of fields a strategy contributes when its markers are present"""
+    
+    def __init__(self, name: str, fields: List[str] = (), requires_all: Tuple[str, ...] = (),
+                 requires_any: Tuple[str, ...] = (), includes: List['ExtractionStrategy'] = ()):
+        self.name = name
+        self.fields = list(fields)
+        self.requires_all = requires_all
+        self.requires_any = requires_any
+        self.includes = list(includes)
+    
+    def applies(self, text: str) -> bool:
+        if self.requires_all and not all(marker in text for marker in self.requires_all):
+            return False
+        if self.requires_any and not any(marker in text for marker in self.requires_any):
+            return False
+        return True
+    
+    def apply(self, context: ExtractionContext) -> Dict:
+        """Collect this strategy's field values from the shared context"""
+        entities = {}
+        for strategy in self.includes:
+            entities.update(strategy.apply(context))
+        if self.fields and self.applies(context.text):
+            for field in self.fields:
+                entities[field] = context.get(field)
+        return entities
+
+
+# Table-based format (like VDG) focuses on structured table data
+TABLE_BASED_STRATEGY = ExtractionStrategy(
+    'table_based',
+    fields=['MATERIAL', 'QUANTITY', 'UNIT_PRICE', 'TOTAL_AMOUNT'],
+    requires_all=('Material', 'Quantity', 'Unit price')
+)
+
+# Structured format (like standard POs) focuses on labeled fields
+STRUCTURED_STRATEGY = ExtractionStrategy(
+    'structured',
+    fields=['PO_ISSUER_NAME', 'PO_ISSUER_ADDRESS'],
+    requires_any=('Buyer and Consignee', 'Company:')
+)
+
+# Free-form format uses general patterns
+FREE_FORM_STRATEGY = ExtractionStrategy(
+    'free_form',
+    fields=['PO_NUMBER', 'MATERIAL', 'CONTACT_NUMBER']
+)
+
+# Mixed format combines all of the above
+MIXED_STRATEGY = ExtractionStrategy(
+    'mixed',
+    includes=[TABLE_BASED_STRATEGY, STRUCTURED_STRATEGY, FREE_FORM_STRATEGY]
+)
+
+
+
+class DocumentFormat:
+    """A document format: a cheap keyword fingerprint and the strategies it routes to"""
+    
+    def __init__(self, name: str, strategies: List[ExtractionStrategy], any_keywords: Tuple[str, ...] = (),
+                 all_keywords: Tuple[str, ...] = ()):
+        self.name = name
+        self.strategies = list(strategies)
+        # Keywords are matched against lowercased text
+        self.any_keywords = any_keywords
+        self.all_keywords = all_keywords
+    
+    @property
+    def keywords(self) -> Tuple[str, ...]:
+        return self.any_keywords + self.all_keywords
+    
+    def matches(self, found: set) -> bool:
+        if not self.keywords:
+            return False
+        if self.all_keywords and not all(keyword in found for keyword in self.all_keywords):
+            return False
+        if self.any_keywords and not any(keyword in found for keyword in self.any_keywords):
+            return False
+        return True
+
+
+class FormatRegistry:
+    """Detects the document format from first-page keywords and picks its strategies"""
+    
+    def __init__(self, formats: List[DocumentFormat], fallback: DocumentFormat):
+        self.formats = list(formats)
+        self.fallback = fallback
+        # Every keyword is looked up once per document, whichever format uses it
+        self.keywords = sorted({keyword for fmt in self.formats for keyword in fmt.keywords})
+    
+    def detect(self, text: str) -> Tuple[DocumentFormat, List[str]]:
+        """Return the first format whose fingerprint matches, and the keywords found"""
+        text_lower = text.lower()
+        found = {keyword for keyword in self.keywords if keyword in text_lower}
+        for fmt in self.formats:
+            if fmt.matches(found):
+                return fmt, sorted(found)
+        return self.fallback, sorted(found)
+
+
+# Known formats in detection priority order; generic runs every strategy
+DOCUMENT_FORMATS = [
+    DocumentFormat('medist_format', [STRUCTURED_STRATEGY],
+                   any_keywords=('buyer and consignee', 'medist fze')),
+    DocumentFormat('vdg_format', [TABLE_BASED_STRATEGY, FREE_FORM_STRATEGY],
+                   any_keywords=('vana darou gostar', 'v/rio/sim')),
+    DocumentFormat('table_format', [TABLE_BASED_STRATEGY],
+                   all_keywords=('table', 'material', 'quantity')),
+    DocumentFormat('standard_format', [STRUCTURED_STRATEGY, FREE_FORM_STRATEGY],
+                   all_keywords=('purchase order', 'to:')),
+]
+
+GENERIC_FORMAT = DocumentFormat('generic_format', [
+    TABLE_BASED_STRATEGY,
+    STRUCTURED_STRATEGY,
+    FREE_FORM_STRATEGY,
+    MIXED_STRATEGY
+])
+
+# Fields every document is extracted for before strategies are applied
+CORE_FIELDS = [
+    'PO_NUMBER', 'PO_ISSUER_NAME', 'PO_ISSUER_ADDRESS', 'CONTACT_NUMBER', 'MATERIAL',
+    'QUANTITY', 'UNIT_PRICE', 'TOTAL_AMOUNT', 'CURRENCY'
+]
+
+# Optional labeled fields of the shipped rules, only reported when present
+LABELED_FIELDS = DEFAULT_RULES.labeled_fields
+
+# Reported fields and their display names, in output order
+ENTITY_LABELS = {
+    'PO_NUMBER': 'PO Number',
+    'PO_ISSUER_NAME': 'Issuer Name',
+    'PO_ISSUER_ADDRESS': 'Issuer Address',
+    'GSTIN': 'GSTIN',
+    'CONTACT_NUMBER': 'Contact Number',
+    'MATERIAL': 'Material',
+    'QUANTITY': 'Quantity',
+    'UNIT_PRICE': 'Unit Price',
+    'TOTAL_AMOUNT': 'Total Amount',
+    'CURRENCY': 'Currency',
+    'MANUFACTURER': 'Manufacturer',
+    'DELIVERY_TERMS': 'Delivery Terms',
+    'PAYMENT_TERMS': 'Payment Terms',
+    'ORDER_DATE': 'Order Date'
+}
+
+
+def describe_source(pdf_source: PDFSource) -> str:
+    if in_memory(pdf_source):
+        return f"<{memoryview(pdf_source).nbytes} bytes in memory>"
+    return str(pdf_source)
+
+
+@contextmanager
+def mapped_pdf(pdf_path: str):
+    """Map a PDF file read-only and yield a memoryview over it, without copying the file"""
+    with open(pdf_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
 class UniversalPDFExtractor:
     """Universal PDF extractor that handles multiple pharmaceutical PO formats"""
     
-    def __init__(self):
-        self.entity_labels = {
-            'PO_NUMBER': 'PO Number',
-            'PO_ISSUER_NAME': 'Issuer Name', 
-            'PO_ISSUER_ADDRESS': 'Issuer Address',
-            'GSTIN': 'GSTIN',
-            'CONTACT_NUMBER': 'Contact Number',
-            'MATERIAL': 'Material',
-            'QUANTITY': 'Quantity',
-            'UNIT_PRICE': 'Unit Price',
-            'TOTAL_AMOUNT': 'Total Amount',
-            'CURRENCY': 'Currency',
-            'MANUFACTURER': 'Manufacturer',
-            'DELIVERY_TERMS': 'Delivery Terms',
-            'PAYMENT_TERMS': 'Payment Terms',
-            'ORDER_DATE': 'Order Date'
+    def __init__(self, text_cache: Optional[PDFTextCache] = None, streaming: bool = False,
+                 max_pages: Optional[int] = None, use_templates: bool = True, instrument: bool = False,
+                 material_index: Optional['MaterialIndex'] = None, line_items: bool = False,
+                 text_engine: str = 'auto', duplicate_index: Optional['NearDuplicateIndex'] = None,
+                 pattern_timeout: Optional[float] = PATTERN_TIMEOUT_SECONDS,
+                 regex_budget: Optional[float] = DOCUMENT_REGEX_BUDGET_SECONDS,
+                 rules_path: Optional[str] = None, stop_fields: Optional[List[str]] = None):
+        # Optional on-disk cache of extracted page text
+        self.text_cache = text_cache
+        
+        # Time limits (seconds) for one pattern search and for all searches on a document
+        self.pattern_timeout = pattern_timeout
+        self.regex_budget = regex_budget
+        
+        # Optional index of earlier documents, so re-sent POs reuse their results
+        self.duplicate_index = duplicate_index
+        
+        # Page text engines: PyMuPDF, with pdfplumber for pages that read badly
+        self.page_reader = build_page_reader(text_engine)
+        
+        # Record per-stage timings and pattern hits in model_info
+        self.instrument = instrument
+        
+        # Optional lookup of extracted materials in the HRV items master
+        self.material_index = material_index
+        
+        # Read every table line item from word geometry
+        self.line_items = line_items
+        
+        # Coordinate templates for our own PO layouts, tried before regex extraction
+        self.layout_templates = []
+        if use_templates:
+            from layout_templates import load_layout_templates
+            self.layout_templates = load_layout_templates()
+        
+        # Streaming mode reads pages lazily and stops once every stop field is
+        # found (by default the core fields) or max_pages pages have been read
+        self.streaming = streaming or max_pages is not None
+        self.max_pages = max_pages
+        self.stop_fields = list(stop_fields) if stop_fields else list(CORE_FIELDS)
+        
+        self.entity_labels = dict(ENTITY_LABELS)
+        
+        # Field rules, read again whenever the rule file changes (see reload_rules)
+        self.rules_path = str(rules_path or DEFAULT_RULES_PATH)
+        rules = DEFAULT_RULES if rules_path is None else load_rule_set(rules_path)
+        rules.require(CORE_FIELDS)
+        self._rules_stat = rules.file_stat
+        self.rules_error = None
+        self._use_rules(rules, PatternRegistry(rules))
+        
+        # Detected formats route to their own strategies; generic runs them all
+        self.formats = FormatRegistry(DOCUMENT_FORMATS, GENERIC_FORMAT)
+    
+    def _use_rules(self, rules: RuleSet, patterns: PatternRegistry):
+        """Switch to a rule set and its compiled patterns, rebuilding the field extractors"""
+        # Field key -> extractor; each runs at most once per document
+        field_extractors = {
+            'PO_NUMBER': self._extract_po_number,
+            'PO_ISSUER_NAME': self._extract_company_name,
+            'PO_ISSUER_ADDRESS': self._extract_address,
+            'CONTACT_NUMBER': self._extract_contact_number,
+            'MATERIAL': self._extract_material,
+            'QUANTITY': self._extract_quantity,
+            'UNIT_PRICE': self._extract_unit_price,
+            'TOTAL_AMOUNT': self._extract_total_amount,
+            'CURRENCY': self._extract_currency,
         }
+        for field in rules.labeled_fields:
+            if field not in field_extractors:
+                field_extractors[field] = partial(patterns.first_group, field)
+        self.rules, self.patterns, self.field_extractors = rules, patterns, field_extractors
+    
+    def reload_rules(self, force: bool = False) -> bool:
+        """
+        Load the rule file again if it changed since it was last read, and
+        return whether new rules were swapped in.
+        
+        The new rules are compiled in full before they replace the current
+        ones, and callers reload between documents only, so every document is
+        extracted under one complete rule set. A file that fails to load or
+        compile is logged and kept in rules_error, and the current rules stay
+        in use until the file changes again.
+        """
+        stat = file_stat(self.rules_path)
+        if stat is None or (stat == self._rules_stat and not force):
+            return False
+        self._rules_stat = stat
+        try:
+            rules = load_rule_set(self.rules_path)
+            rules.require(CORE_FIELDS)
+            patterns = PatternRegistry(rules, rules.compile_all())
+        except RuleSetError as e:
+            self.rules_error = str(e)
+            logger.error(f"Keeping extraction rules {self.rules.version}: {e}")
+            return False
         
-        # Define multiple extraction strategies
-        self.extraction_strategies = [
-            self._extract_table_based_format,
-            self._extract_structured_format,
-            self._extract_free_form_format,
-            self._extract_mixed_format
-        ]
+        previous = self.rules
+        self._use_rules(rules, patterns)
+        self.rules_error = None
+        changed = rules.changed_fields(previous.digests)
+        logger.warning(f"Extraction rules {previous.version} -> {rules.version}; "
+                       f"changed fields: {', '.join(changed) if changed else 'none'}")
+        return True
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from PDF using PyMuPDF"""
+    def extract_text_from_pdf(self, pdf_source: PDFSource) -> str:
+        """Extract text from PDF with the configured text engines, reusing cached page text when available"""
+        return "".join(page_text + "\n" for page_text in self.extract_pages_from_pdf(pdf_source))
+    
+    def extract_pages_from_pdf(self, pdf_source: PDFSource, timings: Optional[EngineTimings] = None,
+                               layout: Optional[Dict] = None) -> List[str]:
+        """Extract the text of every page, or an empty list if the PDF cannot be read"""
         try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            
-            for page_num in range(doc.page_count):
-                page = doc[page_num]
-                text += page.get_text() + "\n"
-            
-            doc.close()
-            return text
+            return [page_text for _, _, page_text in self.iter_page_texts(pdf_source, timings, layout)]
             
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
-            return ""
+            return []
     
-    def _detect_document_format(self, text: str) -> str:
-        """Detect the document format based on content patterns"""
-        text_lower = text.lower()
+    def iter_page_texts(self, pdf_source: PDFSource, timings: Optional[EngineTimings] = None,
+                        layout: Optional[Dict] = None):
+        """
+        Yield (page_num, page_count, page_text) lazily, one page at a time.
         
-        # Format detection patterns
-        if 'buyer and consignee' in text_lower or 'medist fze' in text_lower:
-            return 'medist_format'
-        elif 'vana darou gostar' in text_lower or 'v/rio/sim' in text_lower:
-            return 'vdg_format'
-        elif 'table' in text_lower and 'material' in text_lower and 'quantity' in text_lower:
-            return 'table_format'
-        elif 'purchase order' in text_lower and 'to:' in text_lower:
-            return 'standard_format'
-        else:
-            return 'generic_format'
+        Cached documents are served without opening any text engine. A
+        document read to the end is added to the cache, with the first-page
+        layout when given; one abandoned early is not, since its page list
+        would be incomplete. Time spent in each engine is added to timings
+        when given.
+        """
+        if self.text_cache is not None and not in_memory(pdf_source):
+            # The cache key needs the bytes; hash and parse one mapping instead of a copy
+            with mapped_pdf(pdf_source) as pdf_bytes:
+                yield from self.iter_page_texts(pdf_bytes, timings, layout)
+            return
+        
+        key = None
+        if self.text_cache is not None:
+            key = self.text_cache.key_for(pdf_source)
+            pages = self.text_cache.get(key)
+            if pages is not None:
+                if layout is not None and self.text_cache.get_layout(key) is None:
+                    # An entry from before layouts were stored
+                    self.text_cache.put(key, pages, layout)
+                for page_num, page_text in enumerate(pages):
+                    yield page_num, len(pages), page_text
+                return
+        
+        pages = []
+        for page_num, page_count, page_text in self.page_reader.iter_pages(pdf_source, timings):
+            pages.append(page_text)
+            yield page_num, page_count, page_text
+        
+        if key is not None:
+            self.text_cache.put(key, pages, layout)
     
     def _extract_po_number(self, text: str) -> Optional[str]:
         """Extract PO number using multiple strategies"""
-        patterns = [
-            # VDG specific patterns (prioritize these)
-            r'V/Rio/SIM/([^\n\s]+)',
-            r'Purchase\s*Order\s*No:\s*([^\n]+)',
-            
-            # Standard patterns
-            r'Purchase\s*Order[:\s]*([A-Z0-9\-/]+)',
-            r'PO\s*[Nn]umber[:\s]*([A-Z0-9\-/]+)',
-            r'PO[:\s]*([A-Z0-9\-/]+)',
-            r'P\.O\.\s*([A-Z0-9\-/]+)',
-            r'Order\s*[Nn]umber[:\s]*([A-Z0-9\-/]+)',
-            
-            # Numeric patterns (standalone) - more specific
-            r'^(\d{7,8})\s*$',  # 7-8 digit numbers like 2504959
-            r'(\d{6,10})',
-            
-            # Format specific patterns
-            r'([A-Z]{1,3}/[A-Z]{1,3}/[A-Z]{1,3}/\d{2}-\d{2})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.MULTILINE | re.IGNORECASE)
-            if match:
-                po_num = match.group(1).strip()
-                # Validate PO number - should be numeric or alphanumeric, not common words
-                if (len(po_num) >= 3 and 
-                    po_num not in ['To', 'Box', 'date', 'Order', 'Purchase'] and
-                    not po_num.startswith(('To:', 'Address:', 'Tel:'))):
-                    return po_num
+        for index, match in self.patterns.matches('PO_NUMBER', text):
+            po_num = self.patterns.fixed_value('PO_NUMBER', index) or match.group(1).strip()
+            # Validate PO number - should be numeric or alphanumeric, not common words
+            if (len(po_num) >= 3 and 
+                po_num not in ['To', 'Box', 'date', 'Order', 'Purchase'] and
+                not po_num.startswith(('To:', 'Address:', 'Tel:'))):
+                return po_num
         
         return None
     
     def _extract_company_name(self, text: str) -> Optional[str]:
         """Extract company name using multiple strategies"""
-        patterns = [
-            # Buyer/Consignee patterns
-            r'Buyer\s+and\s+Consignee\s*:\s*([^\n]+)',
-            r'Buyer\s*:\s*([^\n]+)',
-            r'Consignee\s*:\s*([^\n]+)',
-            
-            # Company patterns
-            r'Company[:\s]*([^\n]+)',
-            r'Issuer[:\s]*([^\n]+)',
-            r'From:\s*([^\n]+)',
-            r'To:\s*([^\n]+)',
-            
-            # Specific company patterns
-            r'Vana\s+Darou\s+Gostar',
-            r'MEDIST\s+FZE',
-            
-            # Signature patterns
-            r'For\s+([A-Z][a-zA-Z\s&.,]+(?:FZE|Ltd\.?|Inc\.?|Corp\.?|Pvt\.?\s*Ltd\.?))',
-            r'([A-Z][a-zA-Z\s&.,]+(?:FZE|Ltd\.?|Inc\.?|Corp\.?|Pvt\.?\s*Ltd\.?))',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                if 'Vana' in pattern:
-                    return 'Vana Darou Gostar'
-                elif 'MEDIST' in pattern:
-                    return 'MEDIST FZE'
-                else:
-                    company_name = match.group(1).strip()
-                    # Clean up the company name
-                    company_name = re.sub(r'^\s*and\s+Consignee\s*:\s*', '', company_name)
-                    if len(company_name) > 3 and not company_name.startswith('Address'):
-                        return company_name
+        for index, match in self.patterns.matches('PO_ISSUER_NAME', text):
+            # Known issuers are reported by name
+            value = self.patterns.fixed_value('PO_ISSUER_NAME', index)
+            if value is not None:
+                return value
+            else:
+                company_name = match.group(1).strip()
+                # Clean up the company name
+                company_name = re.sub(r'^\s*and\s+Consignee\s*:\s*', '', company_name)
+                if len(company_name) > 3 and not company_name.startswith('Address'):
+                    return company_name
         
         return None
     
     def _extract_contact_number(self, text: str) -> Optional[str]:
         """Extract contact number using multiple patterns"""
-        patterns = [
-            r'Direct\s+line:\s*([+\d\s\-\.]+)',
-            r'Tel:\s*([+\d\s\-\.]+)',
-            r'Contact[:\s]*([+\d\s\-\.]+)',
-            r'Phone[:\s]*([+\d\s\-\.]+)',
-            r'Mobile[:\s]*([+\d\s\-\.]+)',
-            r'(\+91[\s\-\.]?\d{10})',
-            r'(\+98[\s\-\.]?\d{9,10})',
-            r'(\+971[\s\-\.]?\d{9,10})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
-        
-        return None
+        return self.patterns.first_group('CONTACT_NUMBER', text)
     
     def _extract_material(self, text: str) -> Optional[str]:
         """Extract material/product name"""
-        patterns = [
-            # Table format
-            r'Simethicone\s+Emulsion\s+USP[^\n]*',
-            r'Dapsone\s+USP[^\n]*',
-            
-            # Standard patterns
-            r'Product:\s*([^\n]+)',
-            r'Material:\s*([^\n]+)',
-            r'Item:\s*([^\n]+)',
-            
-            # Pharmaceutical patterns
-            r'([A-Za-z\s]+(?:BP|USP|EP|IP|Grade))',
-            r'([A-Za-z\s]+(?:USP|BP|EP|IP))',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                material = match.group(0) if 'Product' not in match.group(0) else match.group(1)
-                if len(material.strip()) > 3 and not material.strip().startswith('Qty'):
-                    return material.strip()
+        for index, match in self.patterns.matches('MATERIAL', text):
+            value = self.patterns.fixed_value('MATERIAL', index)
+            if value is not None:
+                return value
+            material = match.group(0) if 'Product' not in match.group(0) else match.group(1)
+            if len(material.strip()) > 3 and not material.strip().startswith('Qty'):
+                return material.strip()
         
         return None
     
     def _extract_quantity(self, text: str) -> Optional[int]:
         """Extract quantity using multiple strategies"""
-        patterns = [
-            # Table format (after material name)
-            r'Simethicone\s+Emulsion\s+USP[^\n]*\n(\d+)',
-            r'Dapsone\s+USP[^\n]*\n(\d+)',
-            
-            # Standard patterns
-            r'Qty:\s*(\d+)\s*Kg',
-            r'Quantity:\s*(\d+)',
-            r'Qty:\s*(\d+)',
-            r'(\d+)\s*Kg',
-            
-            # Specific values
-            r'1300',
-            r'14',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                if match.groups():
-                    return int(match.group(1))
-                else:
-                    return int(match.group(0))
+        for index, match in self.patterns.matches('QUANTITY', text):
+            value = self.patterns.fixed_value('QUANTITY', index)
+            if value is not None:
+                return int(value)
+            elif match.groups():
+                return int(match.group(1))
+            else:
+                return int(match.group(0))
         
         return None
     
     def _extract_unit_price(self, text: str) -> Optional[str]:
         """Extract unit price using multiple strategies"""
-        patterns = [
-            # Table format
-            r'6\.00',
-            r'812\.50',
-            
-            # Currency patterns
-            r'Price:\s*USD\s*([\d,]+\.?\d*)/Kg',
-            r'Price:\s*([\d,]+\.?\d*)/Kg',
-            r'Unit\s*Price:\s*USD\s*([\d,]+\.?\d*)',
-            r'Rate:\s*USD\s*([\d,]+\.?\d*)',
-            r'USD\s*([\d,]+\.?\d*)/Kg',
-            
-            # Standard patterns
-            r'Unit\s*Price[:\s]*([\d,]+)',
-            r'Rate[:\s]*([\d,]+)',
-            r'Price[:\s]*([\d,]+)',
-            r'Cost[:\s]*([\d,]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                if '6.00' in match.group(0):
-                    return '6.00'
-                elif '812.50' in match.group(0):
-                    return '812.50'
-                else:
-                    price_str = match.group(1).replace(',', '')
-                    return price_str
+        for index, match in self.patterns.matches('UNIT_PRICE', text):
+            # Known table prices are reported as written in the rules
+            value = self.patterns.fixed_value('UNIT_PRICE', index)
+            if value is not None:
+                return value
+            else:
+                price_str = match.group(1).replace(',', '')
+                return price_str
         
         return None
     
     def _extract_total_amount(self, text: str) -> Optional[str]:
         """Extract total amount using multiple strategies"""
-        patterns = [
-            # Table format
-            r'8,694\.00',
-            r'8,694',
-            r'11375\.00',
-            r'11375',
-            
-            # Currency patterns
-            r'Total:\s*USD\s*([\d,]+\.?\d*)',
-            r'Total\s*Amount:\s*USD\s*([\d,]+\.?\d*)',
-            r'USD\s*([\d,]+\.?\d*)\s*CPT',
-            r'Grand\s*Total:\s*USD\s*([\d,]+\.?\d*)',
-            r'Total:\s*([\d,]+\.?\d*)',
-            
-            # EUR patterns
-            r'Total\s*Amount[:\s]*([\d,]+\.?\d*)\s*EUR',
-            r'EUR\s*([\d,]+\.?\d*)$',
-            
-            # Standard patterns
-            r'Total\s*Amount[:\s]*([\d,]+)',
-            r'Total[:\s]*([\d,]+)',
-            r'Amount[:\s]*([\d,]+)',
-            r'Grand\s*Total[:\s]*([\d,]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-            if match:
-                if '8,694' in match.group(0):
-                    return '8694.00'
-                elif '11375' in match.group(0):
-                    return '11375.00'
-                else:
-                    total_str = match.group(1).replace(',', '')
-                    return total_str
+        for index, match in self.patterns.matches('TOTAL_AMOUNT', text):
+            value = self.patterns.fixed_value('TOTAL_AMOUNT', index)
+            if value is not None:
+                return value
+            else:
+                total_str = match.group(1).replace(',', '')
+                return total_str
         
         return None
     
     def _extract_currency(self, text: str) -> Optional[str]:
         """Extract currency from text"""
-        patterns = [
-            r'USD\s*([\d,]+\.?\d*)',
-            r'Price:\s*USD',
-            r'Total:\s*USD',
-            r'EUR\s*([\d,]+\.?\d*)',
-            r'Total:\s*EUR',
-            r'(USD|EUR|GBP|INR|JPY)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                if match.group(1) in ['USD', 'EUR', 'GBP', 'INR', 'JPY']:
-                    return match.group(1).upper()
-                elif 'USD' in match.group(0):
-                    return 'USD'
-                elif 'EUR' in match.group(0):
-                    return 'EUR'
+        for index, match in self.patterns.matches('CURRENCY', text):
+            value = self.patterns.fixed_value('CURRENCY', index)
+            if value is not None:
+                return value
+            elif match.group(1) in ['USD', 'EUR', 'GBP', 'INR', 'JPY']:
+                return match.group(1).upper()
+            elif 'USD' in match.group(0):
+                return 'USD'
+            elif 'EUR' in match.group(0):
+                return 'EUR'
         
         return None
     
-    def _extract_table_based_format(self, text: str) -> Dict:
-        """Extract from table-based format (like VDG)"""
-        entities = {}
+    def _extract_address(self, text: str) -> Optional[str]:
+        """Extract address information"""
+        for index, match in self.patterns.matches('PO_ISSUER_ADDRESS', text):
+            return self.patterns.fixed_value('PO_ISSUER_ADDRESS', index) or match.group(1).strip()
         
-        # This strategy focuses on structured table data
-        if 'Material' in text and 'Quantity' in text and 'Unit price' in text:
-            entities['MATERIAL'] = self._extract_material(text)
-            entities['QUANTITY'] = self._extract_quantity(text)
-            entities['UNIT_PRICE'] = self._extract_unit_price(text)
-            entities['TOTAL_AMOUNT'] = self._extract_total_amount(text)
+        return None
+    
+    def extract_from_pdf(self, pdf_source: PDFSource) -> Dict:
+        """
+        Main extraction method that handles any PDF format.
         
-        return entities
+        pdf_source is a file path or the PDF's bytes; bytes, bytearrays and
+        memoryviews are parsed in place, without a temporary file.
+        """
+        with self.patterns.document_budget(self.regex_budget, self.pattern_timeout) as budget:
+            result = self._extract_from_pdf(pdf_source)
+        self._record_regex_budget(result, budget)
+        return result
     
-    def _extract_structured_format(self, text: str) -> Dict:
-        """Extract from structured format (like standard POs)"""
-        entities = {}
+    def _extract_from_pdf(self, pdf_source: PDFSource) -> Dict:
+        logger.info(f"Processing PDF: {describe_source(pdf_source)}")
         
-        # This strategy focuses on labeled fields
-        if 'Buyer and Consignee' in text or 'Company:' in text:
-            entities['PO_ISSUER_NAME'] = self._extract_company_name(text)
-            entities['PO_ISSUER_ADDRESS'] = self._extract_address(text)
+        stages_ms = {}
+        timings = EngineTimings()
+        result = None
+        text = signature = layout = None
+        if self.layout_templates:
+            started = time.perf_counter()
+            layout = self._first_page_layout(pdf_source)
+            result = self._extract_with_template(layout) if layout is not None else None
+            stages_ms["template"] = _elapsed_ms(started)
         
-        return entities
+        if result is not None and not self.streaming and (self.text_cache is not None
+                                                          or self.duplicate_index is not None):
+            # Template results still fill the text cache and the near-duplicate index
+            started = time.perf_counter()
+            pages = self.extract_pages_from_pdf(pdf_source, timings, layout)
+            stages_ms["text_extraction"] = _elapsed_ms(started)
+            text = "".join(page_text + "\n" for page_text in pages)
+            if self.duplicate_index is not None and text:
+                from near_duplicates import minhash_signature
+                signature = minhash_signature(text)
+                if signature and self.duplicate_index.find(signature) is not None:
+                    # Already indexed; the template reads the document afresh anyway
+                    signature = None
+        
+        if result is None:
+            started = time.perf_counter()
+            if self.streaming:
+                result = self._extract_streaming(pdf_source, timings, layout)
+                stages_ms["page_scan"] = _elapsed_ms(started)
+            else:
+                # Formats are fingerprinted on the first page only
+                pages = self.extract_pages_from_pdf(pdf_source, timings, layout)
+                stages_ms["text_extraction"] = _elapsed_ms(started)
+                text = "".join(page_text + "\n" for page_text in pages)
+                
+                if self.duplicate_index is not None and text:
+                    from near_duplicates import minhash_signature
+                    started = time.perf_counter()
+                    signature = minhash_signature(text)
+                    match = self.duplicate_index.find(signature) if signature else None
+                    stages_ms["near_duplicate_lookup"] = _elapsed_ms(started)
+                    if match is not None:
+                        result = self._reuse_near_duplicate(pdf_source, match, text)
+                        self._add_instrumentation(result, stages_ms, {})
+                        if self.instrument and timings.ms:
+                            self._instrumentation(result)["text_engines"] = timings.to_dict()
+                        return result
+                
+                result = self.extract_from_text(text, first_page=pages[0] if pages else None)
+            
+            if "template" in stages_ms and "error" not in result:
+                result["model_info"]["routing"]["template_probe_ms"] = stages_ms["template"]
+        
+        if "error" in result:
+            return result
+        
+        if self.line_items:
+            started = time.perf_counter()
+            # A streaming scan that stopped early only reads tables on the pages it read
+            self._attach_line_items(result, self.extract_line_items_from_pdf(pdf_source, result.get("pages_read")))
+            stages_ms["line_items"] = _elapsed_ms(started)
+        
+        budget = self.patterns.budget
+        if signature is not None and not (budget and budget.skipped):
+            # Stored before this run's timings are added; a reuse reports its own
+            model_info = {key: value for key, value in result["model_info"].items() if key != "instrumentation"}
+            self.duplicate_index.add(signature, describe_source(pdf_source), text,
+                                     {**result, "model_info": model_info})
+        
+        self._add_instrumentation(result, stages_ms, {})
+        if self.instrument and timings.ms:
+            self._instrumentation(result)["text_engines"] = timings.to_dict()
+        return result
     
-    def _extract_free_form_format(self, text: str) -> Dict:
-        """Extract from free-form format"""
-        entities = {}
+    def extract_segment(self, pdf_source: PDFSource, segment: Dict, index: int = 0) -> Dict:
+        """
+        Extract the pages of one PO segment (see po_segments) as a document of
+        their own, tagging the result with the segment's page range
+        """
+        from po_segments import describe_segment, slice_pdf
+        started = time.perf_counter()
+        part = slice_pdf(pdf_source, segment["start"], segment["stop"])
+        slice_ms = _elapsed_ms(started)
+        result = self.extract_from_pdf(part)
+        result["segment"] = describe_segment(segment, index)
+        if "error" not in result:
+            self._add_instrumentation(result, {"segment_slice": slice_ms}, {})
+        return result
+    
+    def _reuse_near_duplicate(self, pdf_source: PDFSource, match: Dict, text: str) -> Dict:
+        """
+        Build a result from the stored result of a near-duplicate document.
         
-        # This strategy uses general patterns
-        entities['PO_NUMBER'] = self._extract_po_number(text)
-        entities['MATERIAL'] = self._extract_material(text)
-        entities['CONTACT_NUMBER'] = self._extract_contact_number(text)
+        Only fields whose extractors find something in the changed lines of
+        either text, each seen with one line of context, or whose rules have
+        changed since the stored result, are re-extracted from the new text;
+        every other value is carried over as it was.
+        """
+        from near_duplicates import changed_lines, diff_fields
+        started = time.perf_counter()
+        logger.warning(f"Near-duplicate of indexed document {match['doc_id']} ({match['source']}), "
+                       f"similarity {match['similarity']}")
+        result = match["result"]
+        data = result["data"]
+        previous_data = dict(data)
         
-        return entities
+        removed, added = changed_lines(match["text"], text)
+        stale = self._stale_fields(result)
+        reextracted = []
+        if removed or added or stale:
+            removed_text = "\n".join(removed) + "\n"
+            added_text = "\n".join(added) + "\n"
+            for field, extractor in self.field_extractors.items():
+                if field not in stale and extractor(removed_text) is None and extractor(added_text) is None:
+                    continue
+                reextracted.append(field)
+                self._set_field(data, field, extractor(text))
+            # Fields the current rules no longer extract
+            for field in stale:
+                if field not in self.field_extractors:
+                    data.pop(field, None)
+            result["model_info"]["rules"] = self.rules.describe()
+        
+        if (removed or added) and self.line_items:
+            self._attach_line_items(result, self.extract_line_items_from_pdf(pdf_source))
+        
+        changed_fields = diff_fields(previous_data, data)
+        if changed_fields:
+            result["entities_found"] = len([v for v in data.values() if v is not None])
+            if 'MATERIAL' in changed_fields or 'MANUFACTURER' in changed_fields:
+                self._attach_material_match(result)
+        
+        result["text_length"] = len(text)
+        result["model_info"]["routing"]["route"] = "near_duplicate"
+        result["near_duplicate"] = {
+            "doc_id": match["doc_id"],
+            "source": match["source"],
+            "similarity": match["similarity"],
+            "changed_lines": {"removed": len(removed), "added": len(added)},
+            "reextracted_fields": reextracted,
+            "changed_fields": changed_fields,
+            "reuse_ms": _elapsed_ms(started)
+        }
+        return result
     
-    def _extract_mixed_format(self, text: str) -> Dict:
-        """Extract from mixed format using all strategies"""
-        entities = {}
+    def _stale_fields(self, result: Dict) -> List[str]:
+        """Fields of a stored pattern-route result whose rules have changed since it was extracted"""
+        stored = result.get("model_info", {}).get("rules")
+        if stored is None:
+            # Template results do not depend on the rules
+            return []
+        return self.rules.changed_fields(stored["digests"])
+    
+    @staticmethod
+    def _set_field(data: Dict, field: str, value):
+        """Store a re-extracted value; labeled fields are only reported when found"""
+        if field in CORE_FIELDS or value is not None:
+            data[field] = value
+        else:
+            data.pop(field, None)
+    
+    def cached_pages(self, pdf_path: str) -> Optional[List[str]]:
+        """The stored page text of a PDF file, without parsing it, or None if it is not cached"""
+        if self.text_cache is None or not Path(pdf_path).is_file():
+            return None
+        with mapped_pdf(pdf_path) as pdf_bytes:
+            return self.text_cache.get(self.text_cache.key_for(pdf_bytes))
+    
+    def reextract_fields(self, result: Dict, text: str, fields: Optional[List[str]] = None) -> List[str]:
+        """
+        Bring a stored pattern-route result up to the current rules in place,
+        from the document's stored text.
+        
+        Only the given fields, by default those whose rules changed since the
+        result was extracted, are run again: each field extractor reads its
+        own rules only, so every other value is what a full extraction would
+        give. Returns the fields whose values changed.
+        """
+        from near_duplicates import diff_fields
+        started = time.perf_counter()
+        stored_rules = result["model_info"].get("rules", {})
+        fields = self._stale_fields(result) if fields is None else fields
+        data = result["data"]
+        previous_data = dict(data)
         
-        # Combine all extraction methods
-        entities.update(self._extract_table_based_format(text))
-        entities.update(self._extract_structured_format(text))
-        entities.update(self._extract_free_form_format(text))
+        with self.patterns.document_budget(self.regex_budget, self.pattern_timeout) as budget:
+            for field in fields:
+                extractor = self.field_extractors.get(field)
+                self._set_field(data, field, extractor(text) if extractor is not None else None)
+        self._record_regex_budget(result, budget)
         
-        return entities
+        changed_fields = diff_fields(previous_data, data)
+        if changed_fields:
+            result["entities_found"] = len([v for v in data.values() if v is not None])
+            if 'MATERIAL' in changed_fields or 'MANUFACTURER' in changed_fields:
+                self._attach_material_match(result)
+        result["model_info"]["rules"] = self.rules.describe()
+        result["model_info"]["reextracted"] = {
+            "from_version": stored_rules.get("version"),
+            "fields": list(fields),
+            "changed_fields": changed_fields,
+            "ms": _elapsed_ms(started)
+        }
+        return list(changed_fields)
     
-    def _extract_address(self, text: str) -> Optional[str]:
-        """Extract address information"""
-        patterns = [
-            r'Address:\s*([^\n]+(?:\n[^\n]+)*?)(?=\n[A-Z]|$)',
-            r'Add:\s*([^\n]+(?:\n[^\n]+)*?)(?=\n[A-Z]|$)',
-            r'3rd\s+floor,No\.178[^\n]*',
-            r'Ghanbarzadeh\s+St[^\n]*',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-            if match:
-                return match.group(1).strip()
+    def extract_line_items_from_pdf(self, pdf_source: PDFSource, max_pages: Optional[int] = None) -> List[Dict]:
+        """Read every table line item, with one word-list pass per page"""
+        from table_engine import extract_line_items
+        items = []
+        try:
+            doc = open_pdf(pdf_source)
+        except Exception as e:
+            logger.error(f"Error opening PDF for line items: {e}")
+            return items
+        
+        try:
+            page_count = doc.page_count if max_pages is None else min(max_pages, doc.page_count)
+            for page_num in range(page_count):
+                for item in extract_line_items(doc[page_num].get_text('words')):
+                    # Number lines across the whole document, not per page
+                    item["line"] = len(items) + 1
+                    item["page"] = page_num + 1
+                    items.append(item)
+        finally:
+            doc.close()
+        return items
+    
+    def _attach_line_items(self, result: Dict, items: List[Dict]):
+        """Add line items to a result and fill item fields the patterns missed"""
+        result["line_items"] = items
+        if not items:
+            return
+        
+        data = result["data"]
+        filled = False
+        for field, key in (('MATERIAL', 'material'), ('QUANTITY', 'quantity'), ('UNIT_PRICE', 'unit_price')):
+            if data.get(field) is None and items[0].get(key) is not None:
+                data[field] = items[0][key]
+                filled = True
+        
+        if filled:
+            result["entities_found"] = len([v for v in data.values() if v is not None])
+            if 'material_match' in result:
+                self._attach_material_match(result)
+    
+    def _add_instrumentation(self, result: Dict, stages_ms: Dict, pattern_traces: Dict):
+        """Merge stage timings and pattern traces into model_info when instrumenting"""
+        if not self.instrument:
+            return
+        instrumentation = self._instrumentation(result)
+        # Outer stages first, so the report reads in pipeline order
+        instrumentation["stages_ms"] = {**stages_ms, **instrumentation["stages_ms"]}
+        instrumentation["patterns"].update(pattern_traces)
+    
+    @staticmethod
+    def _instrumentation(result: Dict) -> Dict:
+        return result["model_info"].setdefault("instrumentation", {"stages_ms": {}, "patterns": {}})
+    
+    def _traced_extractor(self, field: str, extractor, pattern_traces: Dict):
+        """Wrap a field extractor to record its time and which pattern produced the value"""
+        pattern_count = len(self.patterns.fields[field].sources)
+        
+        def run(text: str):
+            self.patterns.trace = {}
+            started = time.perf_counter()
+            try:
+                value = extractor(text)
+            finally:
+                last_index, handed_out = self.patterns.trace.get(field, (None, 0))
+                self.patterns.trace = None
+            matched_index = last_index if value is not None else None
+            pattern_traces[field] = {
+                "matched_index": matched_index,
+                # Patterns are tried in priority order, so a hit at index i tried i + 1
+                "tried": matched_index + 1 if matched_index is not None else pattern_count,
+                "rejected_matches": handed_out - (matched_index is not None),
+                "elapsed_ms": _elapsed_ms(started)
+            }
+            return value
+        
+        return run
+    
+    def _first_page_layout(self, pdf_source: PDFSource) -> Optional[Dict]:
+        """
+        The size and word boxes of the first page, which templates are
+        matched on, or None if the PDF cannot be read. They are stored with
+        the document's cached text, so a cached document is not opened.
+        """
+        if self.text_cache is not None and not in_memory(pdf_source):
+            with mapped_pdf(pdf_source) as pdf_bytes:
+                return self._first_page_layout(pdf_bytes)
+        
+        if self.text_cache is not None:
+            layout = self.text_cache.get_layout(self.text_cache.key_for(pdf_source))
+            if layout is not None:
+                return layout
+        
+        try:
+            doc = open_pdf(pdf_source)
+        except Exception as e:
+            logger.error(f"Error opening PDF for template matching: {e}")
+            return None
+        
+        try:
+            if doc.page_count == 0:
+                return None
+            page = doc[0]
+            # One word-box pass serves every field region on the page
+            return {
+                "width": page.rect.width,
+                "height": page.rect.height,
+                "words": [list(word[:5]) for word in page.get_text('words')]
+            }
+        finally:
+            doc.close()
+    
+    def _extract_with_template(self, layout: Dict) -> Optional[Dict]:
+        """
+        Read a known layout directly from the word boxes of its first page.
+        
+        Returns None when no template matches, so the caller falls back to
+        text extraction and pattern matching.
+        """
+        from layout_templates import format_for
+        started = time.perf_counter()
+        page_width, page_height, words = layout["width"], layout["height"], layout["words"]
+        candidates = [template for template in self.layout_templates
+                      if template.matches_page_size(page_width, page_height)]
+        if not candidates:
+            return None
+        detect_ms = _elapsed_ms(started)
+        
+        for template in candidates:
+            entities = template.extract(words, page_width)
+            if entities is None or entities.get('PO_NUMBER') is None:
+                continue
+            
+            # Our layouts share one geometry; the format is named after the issuer found on it
+            format_name = format_for(self.layout_templates, template, entities)
+            logger.info(f"Matched layout template: {template.name} ({format_name})")
+            result = {
+                "success": True,
+                "data": entities,
+                "confidence": 0.95,
+                "model_info": {
+                    "name": "Universal PDF Extractor",
+                    "detected_format": format_name,
+                    "extraction_method": "Coordinate template",
+                    "routing": {
+                        "format": format_name,
+                        "template": template.name,
+                        "fingerprint": ["page_size", "label_column", "issuer"],
+                        "route": "coordinate_template",
+                        "detect_ms": detect_ms,
+                        "extract_ms": _elapsed_ms(started)
+                    }
+                },
+                "text_length": sum(len(word[4]) + 1 for word in words),
+                "entities_found": len([v for v in entities.values() if v is not None])
+            }
+            self._attach_material_match(result)
+            return result
         
         return None
     
-    def extract_from_pdf(self, pdf_path: str) -> Dict:
-        """Main extraction method that handles any PDF format"""
-        logger.info(f"Processing PDF: {pdf_path}")
+    def _extract_streaming(self, pdf_source: PDFSource, timings: Optional[EngineTimings] = None,
+                           layout: Optional[Dict] = None) -> Dict:
+        """
+        Extract page by page, probing unresolved fields as each page arrives.
+        
+        Each page is probed together with the last STREAM_OVERLAP characters
+        of the page before it, so the work per page does not grow with the
+        pages already read, and the first value found for a field is kept and
+        handed to the final assembly rather than extracted again. Reading
+        stops once every field in stop_fields has a value or the page budget
+        is spent, so long annexes after the first page are never opened.
+        Fields are resolved on the first page window that yields a value, so
+        a value can differ from full-document extraction.
+        """
+        pending = list(self.field_extractors)
+        found = {}
+        page_texts = []
+        page_count = 0
+        stop_reason = "end_of_document"
+        
+        try:
+            for page_num, page_count, page_text in self.iter_page_texts(pdf_source, timings, layout):
+                tail = page_texts[-1][-STREAM_OVERLAP:] if page_texts else ""
+                page_texts.append(page_text + "\n")
+                window = tail + page_texts[-1]
+                still_pending = []
+                for field in pending:
+                    value = self.field_extractors[field](window)
+                    if value is None:
+                        still_pending.append(field)
+                    else:
+                        found[field] = value
+                pending = still_pending
+                
+                if all(field in found for field in self.stop_fields if field in self.field_extractors):
+                    stop_reason = "stop_fields_resolved"
+                    break
+                if (self.max_pages is not None and len(page_texts) >= self.max_pages
+                        and page_num + 1 < page_count):
+                    stop_reason = "page_budget"
+                    break
+        except Exception as e:
+            logger.error(f"Error extracting text from PDF: {e}")
+            page_texts = []
+        
+        # Every field was probed on the pages read; those still pending stay unresolved
+        known = {**dict.fromkeys(pending), **found}
+        result = self.extract_from_text("".join(page_texts), first_page=page_texts[0] if page_texts else None,
+                                        known=known)
+        if "error" not in result:
+            result["pages_read"] = len(page_texts)
+            result["model_info"]["page_scan"] = {
+                "pages_read": len(page_texts),
+                "page_count": page_count,
+                "stop_reason": stop_reason,
+                "unresolved_fields": pending
+            }
+        return result
+    
+    def _record_regex_budget(self, result: Dict, budget: Optional[RegexBudget]):
+        """Note the pattern searches that were skipped for running out of time"""
+        if budget is None or not budget.skipped or "error" in result:
+            return
+        result["model_info"]["regex_budget"] = {
+            "skipped_patterns": list(budget.skipped),
+            "pattern_timeout_s": budget.pattern_seconds,
+            "document_budget_s": budget.document_seconds
+        }
+    
+    def extract_from_text(self, text: str, first_page: Optional[str] = None,
+                          known: Optional[Dict] = None) -> Dict:
+        """
+        Run format detection and field extraction on already extracted text.
         
-        # Extract text from PDF
-        text = self.extract_text_from_pdf(pdf_path)
+        The format is fingerprinted on first_page when given, otherwise on the
+        whole text, and only the strategies of the detected format are applied.
+        Fields in known already have their values and are not extracted again.
+        """
+        with self.patterns.document_budget(self.regex_budget, self.pattern_timeout) as budget:
+            result = self._extract_from_text(text, first_page, known)
+        self._record_regex_budget(result, budget)
+        return result
+    
+    def _extract_from_text(self, text: str, first_page: Optional[str] = None,
+                           known: Optional[Dict] = None) -> Dict:
         if not text:
             return {"error": "Failed to extract text from PDF"}
         
         # Detect document format
-        format_type = self._detect_document_format(text)
+        started = time.perf_counter()
+        document_format, keywords_found = self.formats.detect(first_page if first_page is not None else text)
+        detect_ms = _elapsed_ms(started)
+        format_type = document_format.name
         logger.info(f"Detected format: {format_type}")
         
-        # Initialize entities with universal extractions
-        entities = {}
+        # Every field extractor runs at most once for this document
+        field_extractors = self.field_extractors
+        pattern_traces = {}
+        if self.instrument:
+            field_extractors = {
+                field: self._traced_extractor(field, extractor, pattern_traces)
+                for field, extractor in field_extractors.items()
+            }
+        context = ExtractionContext(text, field_extractors, known)
         
         # Always extract these core fields
-        entities['PO_NUMBER'] = self._extract_po_number(text)
-        entities['PO_ISSUER_NAME'] = self._extract_company_name(text)
-        entities['PO_ISSUER_ADDRESS'] = self._extract_address(text)
-        entities['CONTACT_NUMBER'] = self._extract_contact_number(text)
-        entities['MATERIAL'] = self._extract_material(text)
-        entities['QUANTITY'] = self._extract_quantity(text)
-        entities['UNIT_PRICE'] = self._extract_unit_price(text)
-        entities['TOTAL_AMOUNT'] = self._extract_total_amount(text)
-        entities['CURRENCY'] = self._extract_currency(text)
+        entities = {field: context.get(field) for field in CORE_FIELDS}
         
         # Apply format-specific strategies
-        for strategy in self.extraction_strategies:
-            strategy_entities = strategy(text)
+        strategies_started = time.perf_counter()
+        for strategy in document_format.strategies:
+            strategy_entities = strategy.apply(context)
             # Update entities with non-None values from strategy
             for key, value in strategy_entities.items():
                 if value is not None and entities.get(key) is None:
                     entities[key] = value
+        strategies_ms = _elapsed_ms(strategies_started)
         
         # Add additional fields if available
-        manufacturer_match = re.search(r'Manufacturer:\s*([^\n]+)', text, re.IGNORECASE)
-        if manufacturer_match:
-            entities['MANUFACTURER'] = manufacturer_match.group(1).strip()
-        
-        delivery_match = re.search(r'Delivery\s+Term:\s*([^\n]+)', text, re.IGNORECASE)
-        if delivery_match:
-            entities['DELIVERY_TERMS'] = delivery_match.group(1).strip()
-        
-        payment_match = re.search(r'Payment\s+Condition:\s*([^\n]+)', text, re.IGNORECASE)
-        if payment_match:
-            entities['PAYMENT_TERMS'] = payment_match.group(1).strip()
-        
-        date_match = re.search(r'Date:\s*([^\n]+)', text, re.IGNORECASE)
-        if date_match:
-            entities['ORDER_DATE'] = date_match.group(1).strip()
+        for field in self.rules.labeled_fields:
+            value = context.get(field)
+            if value is not None:
+                entities[field] = value
         
         # Create result
         result = {
@@ -447,33 +1308,685 @@ class UniversalPDFExtractor:
             "model_info": {
                 "name": "Universal PDF Extractor",
                 "detected_format": format_type,
-                "extraction_method": "Multi-strategy pattern matching"
+                "extraction_method": "Multi-strategy pattern matching",
+                "routing": {
+                    "format": format_type,
+                    "fingerprint": keywords_found,
+                    "route": "strategies",
+                    "strategies": [strategy.name for strategy in document_format.strategies],
+                    "detect_ms": detect_ms
+                },
+                "extractor_calls": {
+                    "executed": context.executed,
+                    "saved": context.saved_calls
+                },
+                "rules": self.rules.describe()
             },
             "text_length": len(text),
             "entities_found": len([v for v in entities.values() if v is not None])
         }
         
-        # Output JSON result for API consumption
-        print("\n" + "="*50)
-        print("JSON_RESULT_START")
-        print(json.dumps(result, indent=2))
-        print("JSON_RESULT_END")
-        print("="*50)
+        self._add_instrumentation(result, {
+            "format_detection": detect_ms,
+            "field_extraction": round(sum(trace["elapsed_ms"] for trace in pattern_traces.values()), 3),
+            "strategies": strategies_ms
+        }, pattern_traces)
+        self._attach_material_match(result)
         
         return result
+    
+    def _attach_material_match(self, result: Dict):
+        """Resolve the extracted material to its items master row, if an index is loaded"""
+        if self.material_index is None:
+            return
+        started = time.perf_counter()
+        data = result["data"]
+        material = data.get('MATERIAL')
+        result["material_match"] = (
+            self.material_index.resolve(material, vendor=data.get('MANUFACTURER')) if material else None
+        )
+        if self.instrument:
+            self._instrumentation(result)["stages_ms"]["material_resolution"] = _elapsed_ms(started)
+
+def build_extractor(cache_dir: Optional[str] = None, cache_max_bytes: int = DEFAULT_MAX_BYTES,
+                    streaming: bool = False, max_pages: Optional[int] = None,
+                    use_templates: bool = True, instrument: bool = False,
+                    use_material_index: bool = True, line_items: bool = False,
+                    text_engine: str = 'auto', duplicate_db: Optional[str] = None,
+                    duplicate_threshold: Optional[float] = None,
+                    pattern_timeout: Optional[float] = PATTERN_TIMEOUT_SECONDS,
+                    regex_budget: Optional[float] = DOCUMENT_REGEX_BUDGET_SECONDS,
+                    rules_path: Optional[str] = None,
+                    stop_fields: Optional[List[str]] = None) -> UniversalPDFExtractor:
+    """
+    Create an extractor, with an on-disk text cache when a directory is given
+    and a near-duplicate index when a database path is given
+    """
+    text_cache = None
+    if cache_dir:
+        # Engine policies read some pages differently, so each caches its own text
+        text_cache = PDFTextCache(cache_dir, max_bytes=cache_max_bytes,
+                                  version=f"{EXTRACTOR_VERSION}:{text_engine}")
+    duplicate_index = None
+    if duplicate_db:
+        from near_duplicates import DEFAULT_THRESHOLD, NearDuplicateIndex
+        if streaming or max_pages is not None:
+            # Signatures cover the whole text, which a streaming scan may not read
+            logger.warning("Near-duplicate detection is skipped in streaming mode")
+        duplicate_index = NearDuplicateIndex(duplicate_db, version=f"{EXTRACTOR_VERSION}:{text_engine}",
+                                             threshold=DEFAULT_THRESHOLD if duplicate_threshold is None
+                                             else duplicate_threshold)
+    material_index = None
+    if use_material_index:
+        from material_index import load_material_index
+        material_index = load_material_index()
+    return UniversalPDFExtractor(text_cache=text_cache, streaming=streaming, max_pages=max_pages,
+                                 use_templates=use_templates, instrument=instrument,
+                                 material_index=material_index, line_items=line_items,
+                                 text_engine=text_engine, duplicate_index=duplicate_index,
+                                 pattern_timeout=pattern_timeout, regex_budget=regex_budget,
+                                 rules_path=rules_path, stop_fields=stop_fields)
+
+
+# Exit code used when a worker abandons a job that overran its timeout
+WORKER_TIMEOUT_EXIT_CODE = 75
+
+
+def _dump_compact(payload: Dict) -> str:
+    """Serialize a payload as single-line JSON for machine consumers"""
+    return json.dumps(payload, separators=(',', ':'), default=str)
+
+
+def _handle_worker_request(extractor: UniversalPDFExtractor, request: Dict, stats: Dict,
+                           profiler: Optional['cProfile.Profile'] = None,
+                           shadow: Optional['ShadowRunner'] = None) -> Dict:
+    """Execute a single worker command and build its response"""
+    request_id = request.get("id")
+    command = request.get("cmd", "extract")
+    
+    if command == "metrics":
+        return {"id": request_id, "ok": True, "format": "prometheus", "metrics": stats["metrics"].to_prometheus()}
+    
+    if command == "ping":
+        return {
+            "id": request_id,
+            "ok": True,
+            "status": "ready",
+            "pid": os.getpid(),
+            "uptime_s": round(time.monotonic() - stats["started"], 3),
+            "jobs_completed": stats["jobs_completed"],
+            "jobs_failed": stats["jobs_failed"],
+            "text_cache": extractor.text_cache.stats() if extractor.text_cache else None,
+            "rules_version": extractor.rules.version
+        }
+    
+    if command == "shadow_report":
+        if shadow is None:
+            return {"id": request_id, "ok": False, "error": "Shadow mode is not enabled"}
+        return {"id": request_id, "ok": True, "report": shadow.summary()}
+    
+    if command == "reload_rules":
+        reloaded = extractor.reload_rules(force=True)
+        response = {"id": request_id, "ok": extractor.rules_error is None, "reloaded": reloaded,
+                    "rules_version": extractor.rules.version}
+        if extractor.rules_error is not None:
+            response["error"] = extractor.rules_error
+        return response
+    
+    if command != "extract":
+        return {"id": request_id, "ok": False, "error": f"Unknown command: {command}"}
+    
+    pdf_path = request.get("pdf_path")
+    if not pdf_path or not Path(pdf_path).exists():
+        return {"id": request_id, "ok": False, "error": f"PDF file does not exist: {pdf_path}"}
+    
+    # An edited rule file takes effect from the next job
+    extractor.reload_rules()
+    # In shadow mode the candidate gets the same document once this result is in
+    extract = extractor.extract_from_pdf if shadow is None else shadow.extract
+    started = time.perf_counter()
+    if profiler is None:
+        result = extract(pdf_path)
+    else:
+        # Jobs run on the executor thread, so profiling is switched on here
+        result = profiler.runcall(extract, pdf_path)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    stats["metrics"].observe(result, elapsed_ms)
+    
+    if "error" in result:
+        return {"id": request_id, "ok": False, "error": result["error"], "elapsed_ms": elapsed_ms}
+    return {"id": request_id, "ok": True, "result": result, "elapsed_ms": elapsed_ms}
+
+
+def run_worker(extractor: UniversalPDFExtractor, input_stream=None, output_stream=None,
+               default_timeout: float = 30.0, metrics_file: Optional[str] = None,
+               profiler: Optional['cProfile.Profile'] = None, shadow: Optional['ShadowRunner'] = None,
+               shadow_report: Optional[str] = None) -> int:
+    """
+    Serve extraction requests over newline-delimited JSON on stdin/stdout.
+    
+    Each request is one JSON object per line, e.g.
+    {"id": "42", "cmd": "extract", "pdf_path": "/tmp/po.pdf", "timeout": 20}
+    or {"id": "1", "cmd": "ping"}; {"cmd": "metrics"} returns the aggregated
+    counters in Prometheus text format. The rule file is checked for edits
+    before each job; {"cmd": "reload_rules"} reloads it at once and reports
+    whether the new rules compiled. With a shadow runner, every job is also
+    run by the candidate extractor in the background and {"cmd":
+    "shadow_report"} returns the comparison so far; the final report is
+    written to shadow_report on exit. Each response is one compact JSON line
+    carrying the same id. A job that overruns its timeout is reported and the
+    worker exits with WORKER_TIMEOUT_EXIT_CODE so the supervisor can respawn it.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from extraction_metrics import ExtractionMetrics
+    
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    # Anything printed by libraries must not corrupt the protocol stream
+    sys.stdout = sys.stderr
+    
+    stats = {"started": time.monotonic(), "jobs_completed": 0, "jobs_failed": 0,
+             "metrics": ExtractionMetrics(FIELD_PATTERNS)}
+    executor = ThreadPoolExecutor(max_workers=1)
+    
+    def respond(payload: Dict):
+        output_stream.write(_dump_compact(payload) + "\n")
+        output_stream.flush()
+    
+    logger.info(f"Extractor worker ready (pid {os.getpid()})")
+    
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            respond({"id": None, "ok": False, "error": f"Invalid request: {e}"})
+            continue
+        
+        if request.get("cmd") == "shutdown":
+            respond({"id": request.get("id"), "ok": True, "status": "shutting_down"})
+            break
+        
+        timeout = request.get("timeout") or default_timeout
+        future = executor.submit(_handle_worker_request, extractor, request, stats, profiler, shadow)
+        try:
+            response = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            respond({"id": request.get("id"), "ok": False, "error": f"Extraction timed out after {timeout}s"})
+            logger.error("Job exceeded its timeout; restarting worker")
+            os._exit(WORKER_TIMEOUT_EXIT_CODE)
+        except Exception as e:
+            logger.error(f"Worker job failed: {e}")
+            response = {"id": request.get("id"), "ok": False, "error": str(e)}
+        
+        if response.get("ok"):
+            stats["jobs_completed"] += 1
+        else:
+            stats["jobs_failed"] += 1
+        respond(response)
+    
+    executor.shutdown(wait=False)
+    if metrics_file:
+        stats["metrics"].write_prometheus(metrics_file)
+    if shadow is not None:
+        report = shadow.close()
+        if shadow_report:
+            from shadow_runner import write_report
+            write_report(report, shadow_report)
+    return 0
+
+
+# Extractor owned by each batch pool process, built once by the initializer
+_batch_extractor = None
+
+
+def iter_batch_inputs(sources: List[str], manifest: Optional[str] = None):
+    """Expand directories, glob patterns and an optional manifest into PDF paths"""
+    for source in sources:
+        source_path = Path(source)
+        if source_path.is_dir():
+            for path in sorted(source_path.rglob('*')):
+                if path.suffix.lower() == '.pdf':
+                    yield str(path)
+        elif any(char in source for char in '*?['):
+            import glob
+            yield from sorted(glob.glob(source, recursive=True))
+        else:
+            yield source
+    
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+
+
+def _init_batch_worker(extractor_options: Dict):
+    """Build the warm extractor for one pool process"""
+    global _batch_extractor
+    _batch_extractor = build_extractor(**extractor_options)
+
+
+def _extract_batch_item(pdf_path: str) -> Dict:
+    """Extract one PDF inside a pool process, isolating any failure to this file"""
+    started = time.perf_counter()
+    try:
+        if not Path(pdf_path).exists():
+            raise FileNotFoundError(f"PDF file does not exist: {pdf_path}")
+        _batch_extractor.reload_rules()
+        result = _batch_extractor.extract_from_pdf(pdf_path)
+        record = {"path": pdf_path, "ok": "error" not in result}
+        if record["ok"]:
+            record["result"] = result
+        else:
+            record["error"] = result["error"]
+    except Exception as e:
+        record = {"path": pdf_path, "ok": False, "error": f"{type(e).__name__}: {e}"}
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+def _percentile(sorted_values: List[float], percent: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _run_batch_pool(pdf_paths, workers: int, extractor_options: Dict, record_result):
+    """Feed paths to a process pool with bounded in-flight jobs, reporting each record"""
+    from concurrent.futures import ProcessPoolExecutor
+    
+    max_in_flight = workers * 4
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(extractor_options,)) as executor:
+        in_flight = {}
+        
+        def drain():
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                pdf_path = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # The pool process itself died (e.g. a crash inside PyMuPDF)
+                    record = {"path": pdf_path, "ok": False, "error": f"{type(e).__name__}: {e}",
+                              "elapsed_ms": 0.0}
+                record_result(record)
+        
+        for pdf_path in pdf_paths:
+            if len(in_flight) >= max_in_flight:
+                drain()
+            in_flight[executor.submit(_extract_batch_item, pdf_path)] = pdf_path
+        
+        while in_flight:
+            drain()
+
+
+def run_batch(pdf_paths, output_stream, workers: Optional[int] = None,
+              extractor_options: Optional[Dict] = None, metrics: Optional['ExtractionMetrics'] = None,
+              in_process: bool = False, exporter=None) -> Dict:
+    """
+    Extract many PDFs over a process pool, writing one NDJSON line per document
+    as soon as it finishes. At most a few jobs per worker are in flight, so
+    memory stays flat however many paths are fed in. Returns the summary.
+    
+    in_process runs every job in this process instead, so a profiler attached
+    here sees the extraction work. An exporter (see result_export) also gets
+    every document as a flat row; output_stream may then be None.
+    """
+    if exporter is not None:
+        from result_export import ExtractionRecord
+    workers = 1 if in_process else workers or os.cpu_count() or 1
+    extractor_options = extractor_options or {}
+    latencies = []
+    succeeded = failed = 0
+    started = time.perf_counter()
+    
+    def record_result(record: Dict):
+        nonlocal succeeded, failed
+        latencies.append(record["elapsed_ms"])
+        if record["ok"]:
+            succeeded += 1
+        else:
+            failed += 1
+        if metrics is not None:
+            metrics.observe(record.get("result"), record["elapsed_ms"])
+        if exporter is not None:
+            exporter.write(ExtractionRecord.from_batch_record(record))
+        if output_stream is not None:
+            output_stream.write(_dump_compact(record) + "\n")
+            output_stream.flush()
+    
+    try:
+        if in_process:
+            _init_batch_worker(extractor_options)
+            for pdf_path in pdf_paths:
+                record_result(_extract_batch_item(pdf_path))
+        else:
+            _run_batch_pool(pdf_paths, workers, extractor_options, record_result)
+    finally:
+        export = exporter.close() if exporter is not None else None
+    
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    documents = succeeded + failed
+    summary = {
+        "documents": documents,
+        "succeeded": succeeded,
+        "failed": failed,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_sec": round(documents / elapsed, 2) if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95)
+        }
+    }
+    if export is not None:
+        summary["export"] = export
+    return summary
+
+def run_reextraction(records, output_stream, extractor_options: Optional[Dict] = None) -> Dict:
+    """
+    Bring stored batch records (the NDJSON of --batch) up to the current
+    rules, writing one updated record per line. Only the fields whose rules
+    changed since a record was extracted are run again, on the page text
+    kept in the text cache, so no PDF is parsed. A document whose text is
+    not cached is extracted again in full; failed and template records, which
+    the rules do not affect, are passed through. Returns the summary.
+    """
+    _init_batch_worker(extractor_options or {})
+    extractor = _batch_extractor
+    counts = {"records": 0, "unchanged": 0, "reextracted": 0, "reparsed": 0, "failed": 0}
+    fields_rerun, fields_changed = {}, {}
+    started = time.perf_counter()
+    
+    for line in records:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        counts["records"] += 1
+        result = record.get("result")
+        stale = extractor._stale_fields(result) if record.get("ok") and result else []
+        if not stale:
+            counts["unchanged"] += 1
+            output_stream.write(_dump_compact(record) + "\n")
+            continue
+        
+        try:
+            pages = extractor.cached_pages(record["path"])
+            if pages is None:
+                record = _extract_batch_item(record["path"])
+                counts["reparsed" if record["ok"] else "failed"] += 1
+            else:
+                changed = extractor.reextract_fields(result, "".join(page_text + "\n" for page_text in pages), stale)
+                counts["reextracted"] += 1
+                for field in stale:
+                    fields_rerun[field] = fields_rerun.get(field, 0) + 1
+                for field in changed:
+                    fields_changed[field] = fields_changed.get(field, 0) + 1
+        except Exception as e:
+            # The stored record is kept as it was
+            logger.error(f"Re-extraction failed for {record.get('path')}: {type(e).__name__}: {e}")
+            counts["failed"] += 1
+        output_stream.write(_dump_compact(record) + "\n")
+    
+    elapsed = time.perf_counter() - started
+    return {
+        **counts,
+        "rules_version": extractor.rules.version,
+        "fields_rerun": fields_rerun,
+        "fields_changed": fields_changed,
+        "elapsed_s": round(elapsed, 3),
+        "records_per_sec": round(counts["records"] / elapsed, 2) if elapsed > 0 else None
+    }
+
+def _extract_segment_item(pdf_source: PDFSource, segment: Dict, index: int) -> Dict:
+    """Extract one PO segment inside a pool process, isolating any failure to it"""
+    try:
+        return _batch_extractor.extract_segment(pdf_source, segment, index)
+    except Exception as e:
+        from po_segments import describe_segment
+        return {"error": f"{type(e).__name__}: {e}", "segment": describe_segment(segment, index)}
+
+
+def extract_merged_pdf(pdf_source: PDFSource, workers: Optional[int] = None,
+                       extractor_options: Optional[Dict] = None, in_process: bool = False) -> List[Dict]:
+    """
+    Extract every PO in a PDF that may hold several, one result per PO in
+    page order. PO boundaries come from per-page header fingerprints (see
+    po_segments); the segments are then extracted in a process pool, so a
+    merged file takes about as long as its slowest PO. A PDF holding a single
+    PO is extracted as is, in this process.
+    """
+    from po_segments import describe_segment, segment_pdf
+    
+    extractor_options = extractor_options or {}
+    layout_templates = []
+    if extractor_options.get("use_templates", True):
+        from layout_templates import load_layout_templates
+        layout_templates = load_layout_templates()
+    segments = segment_pdf(pdf_source, layout_templates)
+    workers = 1 if in_process else min(workers or os.cpu_count() or 1, len(segments))
+    
+    if len(segments) == 1:
+        result = build_extractor(**extractor_options).extract_from_pdf(pdf_source)
+        result["segment"] = describe_segment(segments[0], 0)
+        return [result]
+    
+    if workers == 1:
+        _init_batch_worker(extractor_options)
+        return [_extract_segment_item(pdf_source, segment, index) for index, segment in enumerate(segments)]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    # Memory views (mmap) cannot be sent to another process; paths are reopened there
+    if in_memory(pdf_source):
+        pdf_source = bytes(pdf_source)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(extractor_options,)) as executor:
+        futures = [executor.submit(_extract_segment_item, pdf_source, segment, index)
+                   for index, segment in enumerate(segments)]
+        for index, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # The pool process itself died (e.g. a crash inside PyMuPDF)
+                results.append({"error": f"{type(e).__name__}: {e}",
+                                "segment": describe_segment(segments[index], index)})
+    return results
+
+def _write_profile(profiler: 'cProfile.Profile', path: str):
+    """Save cProfile stats and print the most expensive calls to stderr"""
+    import pstats
+    profiler.disable()
+    profiler.dump_stats(path)
+    report = pstats.Stats(profiler, stream=sys.stderr)
+    report.sort_stats('cumulative').print_stats(25)
+    logger.info(f"Profile saved to: {path}")
+
 
 def main():
     """Main extraction function"""
+    import argparse
+    
     parser = argparse.ArgumentParser(description="Universal PDF Extractor for Pharmaceutical POs")
-    parser.add_argument("--pdf_path", type=str, required=True, help="Path to PDF file")
+    parser.add_argument("--pdf_path", type=str, help="Path to PDF file, or - to read the PDF bytes from stdin")
     parser.add_argument("--output_file", type=str, help="Output file to save results (JSON format)")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    parser.add_argument("--json", action="store_true",
+                        help="Machine mode: print only the result as one compact JSON line, log warnings only")
     parser.add_argument("--show_raw_text", action="store_true", help="Show raw extracted text")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Map the PDF file into memory once and parse it from the mapping")
+    parser.add_argument("--worker", action="store_true",
+                        help="Run as a long-lived worker serving JSON requests on stdin/stdout")
+    parser.add_argument("--job_timeout", type=float, default=30.0,
+                        help="Default per-job timeout in seconds for worker mode")
+    parser.add_argument("--shadow_candidate", type=str, metavar="MODULE",
+                        help="Worker mode: also run every job through this candidate copy of "
+                             "universal_pdf_extractor.py, in the background, and compare the results")
+    parser.add_argument("--shadow_rules", type=str,
+                        help="Worker mode: rule file of the shadow candidate (implies shadow mode)")
+    parser.add_argument("--shadow_report", type=str,
+                        help="Worker mode: write the shadow comparison report here on exit")
+    parser.add_argument("--batch", nargs="+", metavar="PATH",
+                        help="Batch mode: PDF files, directories or glob patterns to extract")
+    parser.add_argument("--manifest", type=str,
+                        help="Batch mode: file listing one PDF path per line")
+    parser.add_argument("--export", type=str, metavar="PATH",
+                        help="Batch mode: also write flat rows to PATH, Parquet (.parquet) or Arrow (.arrow) "
+                             "with pyarrow, else CSV chunks; NDJSON then goes to --output_file only")
+    parser.add_argument("--workers", type=int,
+                        help="Batch and split modes: number of worker processes (default: CPU count)")
+    parser.add_argument("--split", action="store_true",
+                        help="The PDF may hold several merged POs: split it at PO boundaries and "
+                             "extract each one, in parallel")
+    parser.add_argument("--reextract", type=str, metavar="RESULTS",
+                        help="Bring the records of an earlier --batch run (NDJSON) up to the current rules, "
+                             "re-running only fields whose rules changed on cached page text")
+    parser.add_argument("--cache_dir", type=str, default=os.environ.get("PDF_TEXT_CACHE_DIR"),
+                        help="Directory for the extracted-text cache (default: $PDF_TEXT_CACHE_DIR, disabled if unset)")
+    parser.add_argument("--rules", type=str, default=os.environ.get("PDF_EXTRACTION_RULES"),
+                        help="Extraction rule file, reloaded by workers when it changes "
+                             "(default: $PDF_EXTRACTION_RULES, or the shipped extraction_rules.json)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Read pages lazily and stop once the stop fields are found")
+    parser.add_argument("--max_pages", type=int,
+                        help="Page budget for streaming extraction (implies --streaming)")
+    parser.add_argument("--stop_fields", type=str,
+                        help="Comma-separated fields whose values end a streaming scan early "
+                             "(default: the core fields)")
+    parser.add_argument("--cache_max_mb", type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="Size cap for the extracted-text cache in megabytes")
+    parser.add_argument("--no_templates", action="store_true",
+                        help="Skip coordinate templates and always use pattern matching")
+    parser.add_argument("--no_material_index", action="store_true",
+                        help="Skip resolving materials against the HRV items master")
+    parser.add_argument("--line_items", action="store_true",
+                        help="Extract every table line item from word geometry")
+    parser.add_argument("--text_engine", choices=ENGINE_POLICIES, default="auto",
+                        help="Page text engine: PyMuPDF with per-page pdfplumber fallback (auto), or one engine for every page")
+    parser.add_argument("--duplicate_db", type=str, default=os.environ.get("PDF_DUPLICATE_DB"),
+                        help="SQLite index of earlier POs; near-duplicates reuse their results and are flagged "
+                             "(default: $PDF_DUPLICATE_DB, disabled if unset)")
+    parser.add_argument("--duplicate_threshold", type=float,
+                        help="Estimated text similarity for a near-duplicate (default: 0.9)")
+    parser.add_argument("--pattern_timeout", type=float, default=PATTERN_TIMEOUT_SECONDS,
+                        help=f"Seconds one pattern search may take before it is skipped (default: "
+                             f"{PATTERN_TIMEOUT_SECONDS}, 0 for no limit)")
+    parser.add_argument("--regex_budget", type=float, default=DOCUMENT_REGEX_BUDGET_SECONDS,
+                        help=f"Seconds all pattern searches on one document may take (default: "
+                             f"{DOCUMENT_REGEX_BUDGET_SECONDS}, 0 for no limit)")
+    parser.add_argument("--instrument", action="store_true",
+                        help="Record per-stage timings and pattern hits in model_info")
+    parser.add_argument("--metrics_file", type=str,
+                        help="Worker/batch mode: write aggregated Prometheus metrics here on exit (implies --instrument)")
+    parser.add_argument("--profile", type=str, metavar="PATH",
+                        help="Write cProfile stats to PATH and print the top functions to stderr")
     
     args = parser.parse_args()
     
-    if args.verbose:
-        logging.getLogger().setLevel(logging.DEBUG)
+    # Configured here rather than at import, so importing the module leaves logging alone
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING if args.json else logging.INFO)
+    
+    extractor_options = {
+        "cache_dir": args.cache_dir,
+        "cache_max_bytes": int(args.cache_max_mb * 1024 * 1024),
+        "streaming": args.streaming,
+        "max_pages": args.max_pages,
+        "use_templates": not args.no_templates,
+        "instrument": args.instrument or bool(args.metrics_file),
+        "use_material_index": not args.no_material_index,
+        "line_items": args.line_items,
+        "text_engine": args.text_engine,
+        "duplicate_db": args.duplicate_db,
+        "duplicate_threshold": args.duplicate_threshold,
+        "pattern_timeout": args.pattern_timeout or None,
+        "regex_budget": args.regex_budget or None,
+        "rules_path": args.rules,
+        "stop_fields": args.stop_fields.split(",") if args.stop_fields else None
+    }
+    
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        atexit.register(_write_profile, profiler, args.profile)
+    
+    if args.worker:
+        extractor = build_extractor(**extractor_options)
+        shadow = None
+        if args.shadow_candidate or args.shadow_rules:
+            from shadow_runner import ShadowRunner, candidate_options
+            shadow = ShadowRunner(extractor, args.shadow_candidate,
+                                  candidate_options(extractor_options, args.shadow_rules))
+        return run_worker(extractor, default_timeout=args.job_timeout, metrics_file=args.metrics_file,
+                          profiler=profiler, shadow=shadow, shadow_report=args.shadow_report)
+    
+    if profiler is not None:
+        profiler.enable()
+    
+    if args.reextract:
+        with ExitStack() as streams:
+            records = streams.enter_context(open(args.reextract, 'r', encoding='utf-8'))
+            output_stream = (streams.enter_context(open(args.output_file, 'w', encoding='utf-8'))
+                             if args.output_file else sys.stdout)
+            summary = run_reextraction(records, output_stream, extractor_options)
+        sys.stderr.write(_dump_compact({"summary": summary}) + "\n")
+        return 1 if summary["failed"] else 0
+    
+    if args.batch or args.manifest:
+        pdf_paths = iter_batch_inputs(args.batch or [], args.manifest)
+        metrics = None
+        if args.metrics_file:
+            from extraction_metrics import ExtractionMetrics
+            metrics = ExtractionMetrics(FIELD_PATTERNS)
+        exporter = None
+        if args.export:
+            from result_export import open_exporter
+            try:
+                exporter = open_exporter(args.export)
+            except ValueError as e:
+                parser.error(str(e))
+        # Pool processes are invisible to the profiler, so profiled batches run here
+        batch_options = {"workers": args.workers, "extractor_options": extractor_options,
+                         "metrics": metrics, "in_process": profiler is not None, "exporter": exporter}
+        if args.output_file:
+            with open(args.output_file, 'w', encoding='utf-8') as output_stream:
+                summary = run_batch(pdf_paths, output_stream, **batch_options)
+        else:
+            summary = run_batch(pdf_paths, None if exporter is not None else sys.stdout, **batch_options)
+        if metrics is not None:
+            metrics.write_prometheus(args.metrics_file)
+        sys.stderr.write(_dump_compact({"summary": summary}) + "\n")
+        return 0
+    
+    if not args.pdf_path:
+        parser.error("--pdf_path is required unless --worker, --batch or --reextract is given")
+    
+    machine_output = None
+    if args.json:
+        # Anything printed by libraries must not corrupt the one-line result
+        machine_output, sys.stdout = sys.stdout, sys.stderr
+    
+    def emit_machine_result(payload: Dict):
+        if args.output_file:
+            with open(args.output_file, 'w', encoding='utf-8') as f:
+                f.write(_dump_compact(payload) + "\n")
+        else:
+            machine_output.write(_dump_compact(payload) + "\n")
     
     logger.info("="*60)
     logger.info("Universal PDF Extractor for Pharmaceutical Purchase Orders")
@@ -481,17 +1994,71 @@ def main():
     
     # Validate input
     pdf_path = Path(args.pdf_path)
-    if not pdf_path.exists():
+    if args.pdf_path != "-" and not pdf_path.exists():
         logger.error(f"PDF file does not exist: {pdf_path}")
+        if args.json:
+            emit_machine_result({"error": f"PDF file does not exist: {pdf_path}"})
         return 1
     
+    # Keeps an mmap-ed PDF open until the extractor is done with it
+    mapping = ExitStack()
     try:
+        if args.pdf_path == "-":
+            pdf_source = sys.stdin.buffer.read()
+        elif args.mmap:
+            pdf_source = mapping.enter_context(mapped_pdf(str(pdf_path)))
+        else:
+            pdf_source = str(pdf_path)
+        
+        if args.split:
+            # Pool processes are invisible to the profiler, so profiled splits run here
+            results = extract_merged_pdf(pdf_source, args.workers, extractor_options,
+                                         in_process=profiler is not None)
+            failed = any("error" in result for result in results)
+            if args.json:
+                emit_machine_result({"results": results})
+                return 1 if failed else 0
+            
+            print("\n" + "="*50)
+            print("JSON_RESULT_START")
+            print(json.dumps(results, indent=2))
+            print("JSON_RESULT_END")
+            print("="*50)
+            
+            print(f"\nPurchase orders found: {len(results)}")
+            for result in results:
+                first_page, last_page = result["segment"]["pages"]
+                pages = f"Pages {first_page}-{last_page}"
+                if "error" in result:
+                    print(f"{pages:<20}: Error: {result['error']}")
+                    continue
+                data = result["data"]
+                print(f"{pages:<20}: {data.get('PO_NUMBER', 'N/A')} | {data.get('MATERIAL', 'N/A')} | "
+                      f"qty {data.get('QUANTITY', 'N/A')} | confidence {(result['confidence'] * 100):.1f}%")
+            
+            if args.output_file:
+                with open(args.output_file, 'w') as f:
+                    json.dump(results, f, indent=2)
+                logger.info(f"Results saved to: {args.output_file}")
+            return 1 if failed else 0
+        
         # Initialize extractor
-        extractor = UniversalPDFExtractor()
+        extractor = build_extractor(**extractor_options)
         
         # Extract data from PDF
         logger.info("Extracting data from PDF...")
-        result = extractor.extract_from_pdf(str(pdf_path))
+        result = extractor.extract_from_pdf(pdf_source)
+        
+        if args.json:
+            emit_machine_result(result)
+            return 1 if "error" in result else 0
+        
+        # Output JSON result for API consumption
+        print("\n" + "="*50)
+        print("JSON_RESULT_START")
+        print(json.dumps(result, indent=2))
+        print("JSON_RESULT_END")
+        print("="*50)
         
         # Display results
         print("\n" + "="*50)
@@ -509,19 +2076,32 @@ def main():
             value = data.get(field_key, 'N/A')
             print(f"{field_name:<20}: {value}")
         
+        material_match = result.get("material_match")
+        if material_match:
+            print(f"{'Master Item':<20}: {material_match['item_name']} "
+                  f"(SKU {material_match['sku']}, score {material_match['score']})")
+        
+        for item in result.get("line_items") or []:
+            print(f"{'Line ' + str(item['line']):<20}: {item['material']} | qty {item['quantity']} "
+                  f"{item['unit'] or ''} | rate {item['unit_price']} | amount {item['amount']}")
+        
         print("="*50)
         print(f"Confidence: {(result['confidence'] * 100):.1f}%")
         print(f"Detected Format: {result['model_info']['detected_format']}")
         print(f"Entities Found: {result['entities_found']}")
         print(f"Text Length: {result['text_length']} characters")
         
+        near_duplicate = result.get("near_duplicate")
+        if near_duplicate:
+            print(f"Near-duplicate of: {near_duplicate['source']} (similarity {near_duplicate['similarity']})")
+            for field, change in near_duplicate["changed_fields"].items():
+                print(f"  {field}: {change['previous']} -> {change['current']}")
+        
         if args.show_raw_text:
             print("\n" + "="*50)
             print("RAW EXTRACTED TEXT")
             print("="*50)
-            # Extract text again for display
-            text = extractor.extract_text_from_pdf(str(pdf_path))
-            print(text)
+            print(extractor.extract_text_from_pdf(pdf_source))
         
         # Save to file if requested
         if args.output_file:
@@ -536,7 +2116,11 @@ def main():
         logger.error(f"Extraction failed: {e}")
         import traceback
         logger.error(traceback.format_exc())
+        if args.json:
+            emit_machine_result({"error": f"Extraction failed: {e}"})
         return 1
+    finally:
+        mapping.close()
 
 if __name__ == "__main__":
     exit(main())